@@ -1,13 +1,15 @@
+import asyncio
 import json
-from fastapi import APIRouter, HTTPException, status, Depends, Query
+import time
+from fastapi import APIRouter, HTTPException, status, Depends, Query, Request, Response
 from fastapi.responses import StreamingResponse
 from datetime import datetime
 from bson import ObjectId
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
 
 from app.config import get_settings
 from app.models.chat import (
-    ChatRequest, ChatResponse, ChatHistoryResponse,
+    ChatRequest, MultiChatRequest, ChatResponse, ChatHistoryResponse,
     SummarizeRequest, SummarizeResponse,
     TimestampQuery, TimestampResponse, ChatMessage
 )
@@ -17,14 +19,55 @@ from app.api.middleware.auth import get_current_user
 from app.api.middleware.rate_limiter import moderate_rate_limit
 from app.services.rag_pipeline import RAGPipeline
 from app.services.llm_service import LLMService
+from app.services.answer_cache import answer_cache, answer_scope
+from app.services.vector_store import vector_store
 
 settings = get_settings()
 router = APIRouter()
 
 
+async def _answer_cache_key(
+    rag: RAGPipeline,
+    request: ChatRequest,
+    filters: Optional[Dict],
+    user_id: str
+) -> Optional[Tuple]:
+    if not settings.ANSWER_CACHE_ENABLED:
+        return None
+    
+    version = await vector_store.index_version(request.document_id, user_id=user_id)
+    if version is None:
+        return None
+    
+    scope = answer_scope(
+        retrieval_mode=request.retrieval_mode or settings.RETRIEVAL_MODE,
+        filters=filters,
+        nprobe=request.nprobe,
+        ef_search=request.ef_search,
+        rerank=settings.RERANK_ENABLED if request.rerank is None else request.rerank
+    )
+    return request.document_id, version, scope, await rag.embed_query(request.message)
+
+
+async def _llm_cache_scope(document_ids: List[str], user_id: str) -> Optional[str]:
+    if not settings.LLM_CACHE_ENABLED:
+        return None
+    
+    # Appends, removals and rebuilds bump the index version, which retires
+    # every response cached against the old content.
+    versions = await asyncio.gather(*(
+        vector_store.index_version(document_id, user_id=user_id)
+        for document_id in document_ids
+    ))
+    return ",".join(
+        f"{document_id}@{version}" for document_id, version in zip(document_ids, versions)
+    )
+
+
 @router.post("/", response_model=ChatResponse)
 async def chat(
     request: ChatRequest,
+    response: Response,
     current_user: dict = Depends(get_current_user),
     _: bool = Depends(moderate_rate_limit)
 ):
@@ -54,24 +97,47 @@ async def chat(
         )
     
     rag = RAGPipeline()
+    filters = request.filters.to_ranges() if request.filters else None
     
-    context_chunks = await rag.retrieve_context(
-        request.document_id,
-        request.message
-    )
+    cache_key = await _answer_cache_key(rag, request, filters, current_user["id"])
+    cached = answer_cache.lookup(*cache_key) if cache_key else None
     
-    llm = LLMService()
-    response_text, sources = await llm.generate_response(
-        question=request.message,
-        context_chunks=context_chunks,
-        document_type=doc["document_type"]
-    )
+    if cached is not None:
+        response_text, sources = cached["answer"], cached["sources"]
+    else:
+        context_chunks = await rag.retrieve_context(
+            request.document_id,
+            request.message,
+            nprobe=request.nprobe,
+            ef_search=request.ef_search,
+            retrieval_mode=request.retrieval_mode,
+            filters=filters,
+            user_id=current_user["id"],
+            rerank=request.rerank
+        )
+        
+        llm = LLMService(
+            cache_scope=await _llm_cache_scope([request.document_id], current_user["id"]),
+            allow_cached=request.allow_cached
+        )
+        started = time.perf_counter()
+        response_text, sources = await llm.generate_response(
+            question=request.message,
+            context_chunks=context_chunks,
+            document_type=doc["document_type"]
+        )
+        rag.record_timing("llm", started)
+        if cache_key and not llm.used_fallback:
+            answer_cache.store(
+                *cache_key, response_text, sources, time.perf_counter() - started
+            )
     
     timestamps = []
     if doc["document_type"] in ["audio", "video"] and doc.get("timestamps"):
         timestamps = await rag.find_relevant_timestamps(
             request.message,
-            doc.get("timestamps", [])
+            doc.get("timestamps", []),
+            document_id=request.document_id
         )
     
     chat_collection = get_collection("chat_history")
@@ -109,6 +175,8 @@ async def chat(
         upsert=True
     )
     
+    response.headers["Server-Timing"] = rag.server_timing()
+    
     return ChatResponse(
         message=response_text,
         sources=sources,
@@ -116,9 +184,91 @@ async def chat(
     )
 
 
+@router.post("/multi", response_model=ChatResponse)
+async def chat_multi(
+    request: MultiChatRequest,
+    current_user: dict = Depends(get_current_user),
+    _: bool = Depends(moderate_rate_limit)
+):
+    document_ids = list(dict.fromkeys(request.document_ids))
+    
+    if len(document_ids) > settings.MULTI_DOC_MAX_DOCUMENTS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.MULTI_DOC_MAX_DOCUMENTS} documents per question"
+        )
+    
+    if not all(ObjectId.is_valid(document_id) for document_id in document_ids):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid document ID"
+        )
+    
+    documents_collection = get_collection("documents")
+    cursor = documents_collection.find({
+        "_id": {"$in": [ObjectId(document_id) for document_id in document_ids]},
+        "user_id": current_user["id"]
+    })
+    docs = {str(doc["_id"]): doc async for doc in cursor}
+    
+    missing = [document_id for document_id in document_ids if document_id not in docs]
+    if missing:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Documents not found: {', '.join(missing)}"
+        )
+    
+    not_ready = [
+        document_id for document_id in document_ids
+        if docs[document_id]["status"] != DocumentStatus.COMPLETED.value
+    ]
+    if not_ready:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Documents are not ready: {', '.join(not_ready)}"
+        )
+    
+    rag = RAGPipeline()
+    
+    context_chunks = await rag.retrieve_context_many(
+        document_ids,
+        request.message,
+        top_k=request.top_k,
+        nprobe=request.nprobe,
+        ef_search=request.ef_search,
+        retrieval_mode=request.retrieval_mode,
+        filters=request.filters.to_ranges() if request.filters else None,
+        user_id=current_user["id"]
+    )
+    
+    # Only a uniformly audio/video selection gets timestamp-style prompting.
+    document_types = {docs[document_id]["document_type"] for document_id in document_ids}
+    document_type = document_types.pop() if len(document_types) == 1 else "pdf"
+    
+    llm = LLMService(
+        cache_scope=await _llm_cache_scope(document_ids, current_user["id"]),
+        allow_cached=request.allow_cached
+    )
+    response_text, sources = await llm.generate_response(
+        question=request.message,
+        context_chunks=context_chunks,
+        document_type=document_type
+    )
+    
+    # Sources are the leading context chunks, in order.
+    for source, chunk in zip(sources, context_chunks):
+        source["document_id"] = chunk["document_id"]
+    
+    return ChatResponse(
+        message=response_text,
+        sources=sources
+    )
+
+
 @router.post("/stream")
 async def chat_stream(
     request: ChatRequest,
+    http_request: Request,
     current_user: dict = Depends(get_current_user),
     _: bool = Depends(moderate_rate_limit)
 ):
@@ -148,29 +298,66 @@ async def chat_stream(
         )
     
     rag = RAGPipeline()
+    filters = request.filters.to_ranges() if request.filters else None
     
-    context_chunks = await rag.retrieve_context(
-        request.document_id,
-        request.message
-    )
+    cache_key = await _answer_cache_key(rag, request, filters, current_user["id"])
+    cached = answer_cache.lookup(*cache_key) if cache_key else None
     
-    llm = LLMService()
+    context_chunks = []
+    if cached is None:
+        context_chunks = await rag.retrieve_context(
+            request.document_id,
+            request.message,
+            nprobe=request.nprobe,
+            ef_search=request.ef_search,
+            retrieval_mode=request.retrieval_mode,
+            filters=filters,
+            user_id=current_user["id"],
+            rerank=request.rerank
+        )
+    
+    llm = LLMService(
+        cache_scope=await _llm_cache_scope([request.document_id], current_user["id"]),
+        allow_cached=request.allow_cached
+    )
     
     async def generate():
         full_response = ""
-        async for chunk in llm.generate_response_stream(
-            question=request.message,
-            context_chunks=context_chunks,
-            document_type=doc["document_type"]
-        ):
-            full_response += chunk
-            yield f"data: {json.dumps({'content': chunk})}\n\n"
+        if cached is not None:
+            full_response = cached["answer"]
+            yield f"data: {json.dumps({'content': full_response})}\n\n"
+        else:
+            started = time.perf_counter()
+            tokens = llm.generate_response_stream(
+                question=request.message,
+                context_chunks=context_chunks,
+                document_type=doc["document_type"]
+            )
+            try:
+                async for chunk in tokens:
+                    # A client that left stops generation instead of
+                    # letting the backend run to max_new_tokens.
+                    if await http_request.is_disconnected():
+                        return
+                    full_response += chunk
+                    yield f"data: {json.dumps({'content': chunk})}\n\n"
+            finally:
+                await tokens.aclose()
+            
+            if cache_key and not llm.used_fallback:
+                answer_cache.store(
+                    *cache_key,
+                    full_response,
+                    llm.build_sources(context_chunks),
+                    time.perf_counter() - started
+                )
         
         timestamps = []
         if doc["document_type"] in ["audio", "video"] and doc.get("timestamps"):
             timestamps = await rag.find_relevant_timestamps(
                 request.message,
-                doc.get("timestamps", [])
+                doc.get("timestamps", []),
+                document_id=request.document_id
             )
         
         yield f"data: {json.dumps({'done': True, 'timestamps': timestamps})}\n\n"
@@ -201,7 +388,9 @@ async def chat_stream(
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
-            "Connection": "keep-alive"
+            "Connection": "keep-alive",
+            # Covers the stages that ran before the first byte.
+            "Server-Timing": rag.server_timing()
         }
     )
 
@@ -279,7 +468,10 @@ async def summarize_document(
             word_count=len(doc["summary"].split())
         )
     
-    llm = LLMService()
+    llm = LLMService(
+        cache_scope=await _llm_cache_scope([request.document_id], current_user["id"]),
+        allow_cached=request.allow_cached
+    )
     summary = await llm.generate_summary(
         text=doc.get("text_content", ""),
         max_length=request.max_length
@@ -337,7 +529,8 @@ async def find_timestamps(
     rag = RAGPipeline()
     timestamps = await rag.find_relevant_timestamps(
         request.query,
-        doc.get("timestamps", [])
+        doc.get("timestamps", []),
+        document_id=request.document_id
     )
     
     return TimestampResponse(
@@ -9,6 +9,8 @@ from app.models.document import DocumentResponse, DocumentListResponse, Document
 from app.db.mongodb import get_collection
 from app.api.middleware.auth import get_current_user
 from app.api.middleware.rate_limiter import relaxed_rate_limit
+from app.services.vector_store import vector_store
+from app.services.answer_cache import answer_cache
 
 settings = get_settings()
 router = APIRouter()
@@ -45,6 +47,7 @@ async def list_documents(
             summary=doc.get("summary"),
             duration=doc.get("duration"),
             timestamps=doc.get("timestamps", []),
+            indexing_progress=doc.get("indexing_progress"),
             created_at=doc["created_at"]
         ))
     
@@ -91,6 +94,7 @@ async def get_document(
         summary=doc.get("summary"),
         duration=doc.get("duration"),
         timestamps=doc.get("timestamps", []),
+        indexing_progress=doc.get("indexing_progress"),
         created_at=doc["created_at"]
     )
 
@@ -182,6 +186,8 @@ async def delete_document(
         os.remove(file_path)
     
     await documents_collection.delete_one({"_id": ObjectId(document_id)})
+    await vector_store.delete_index(document_id, user_id=current_user["id"])
+    answer_cache.invalidate(document_id)
     
     chat_collection = get_collection("chat_history")
     await chat_collection.delete_many({"document_id": document_id})
@@ -133,7 +133,13 @@ async def _upload_file(
     result = await documents_collection.insert_one(doc)
     doc_id = str(result.inserted_id)
     
-    background_tasks.add_task(process_document_sync, doc_id, file_path, expected_type)
+    background_tasks.add_task(
+        process_document_sync,
+        doc_id,
+        file_path,
+        expected_type,
+        current_user["id"]
+    )
     
     return DocumentResponse(
         id=doc_id,
@@ -22,10 +22,40 @@ class Settings(BaseSettings):
     
     HUGGINGFACE_API_KEY: Optional[str] = None
     HUGGINGFACE_MODEL: str = "mistralai/Mistral-7B-Instruct-v0.2"
+    HUGGINGFACE_API_URL: str = "https://api-inference.huggingface.co/models"
+    # One pooled client per process talks to the inference endpoint.
+    LLM_HTTP2: bool = True
+    LLM_MAX_CONNECTIONS: int = 20
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = 10
+    LLM_KEEPALIVE_EXPIRY: float = 60.0
+    LLM_CONNECT_TIMEOUT: float = 5.0
+    LLM_READ_TIMEOUT: float = 60.0
+    LLM_POOL_TIMEOUT: float = 10.0
+    # Exact-prompt response cache in Redis; sampled generations are only
+    # cached for requests that set allow_cached.
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_TTL_SECONDS: int = 24 * 3600
+    LLM_CACHE_COMPRESSION_LEVEL: int = 6
+    # Prompt context is packed into this many tokens of the model's tokenizer.
+    LLM_CONTEXT_TOKEN_BUDGET: int = 1500
+    LLM_CONTEXT_TOKENIZER: Optional[str] = None
     
     WHISPER_MODEL: str = "base"
     
     EMBEDDING_MODEL: str = "sentence-transformers/all-MiniLM-L6-v2"
+    EMBEDDING_BACKEND: str = "torch"
+    EMBEDDING_ONNX_QUANTIZE: bool = False
+    EMBEDDING_ONNX_QUANTIZATION_CONFIG: str = "avx2"
+    EMBEDDING_ONNX_PATH: str = "onnx_models"
+    EMBEDDING_BATCH_ENABLED: bool = True
+    EMBEDDING_BATCH_WINDOW_MS: float = 5.0
+    EMBEDDING_BATCH_MAX_SIZE: int = 32
+    EMBEDDING_BULK_TOKEN_BUDGET: int = 8192
+    EMBEDDING_BULK_MAX_BATCH: int = 256
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_MAX_MEMORY_MB: int = 64
+    EMBEDDING_CACHE_DTYPE: str = "float16"
+    EMBEDDING_CACHE_TTL_SECONDS: int = 7 * 24 * 3600
     
     UPLOAD_DIR: str = "uploads"
     MAX_FILE_SIZE_MB: int = 100
@@ -37,6 +67,53 @@ class Settings(BaseSettings):
     RATE_LIMIT_WINDOW_SECONDS: int = 60
     
     FAISS_INDEX_PATH: str = "faiss_index"
+    VECTOR_STORE_MAX_MEMORY_MB: int = 1024
+    VECTOR_STORE_EVICTION_POLICY: str = "lru"
+    FAISS_FLAT_MAX_VECTORS: int = 10000
+    FAISS_LARGE_INDEX_TYPE: str = "hnsw"
+    FAISS_HNSW_M: int = 32
+    FAISS_HNSW_EF_CONSTRUCTION: int = 80
+    FAISS_HNSW_EF_SEARCH: int = 64
+    FAISS_IVF_NPROBE: int = 16
+    FAISS_PQ_SUBQUANTIZERS: int = 0
+    FAISS_STORAGE_MODE: str = "float"
+    FAISS_BINARY_RESCORE_FACTOR: int = 10
+    VECTOR_STORE_COMPACT_MAX_DELTAS: int = 8
+    VECTOR_STORE_COMPACT_TOMBSTONE_RATIO: float = 0.25
+    VECTOR_STORE_LAYOUT: str = "document"
+    VECTOR_STORE_NEGATIVE_CACHE_TTL_SECONDS: float = 30.0
+    VECTOR_SEARCH_COALESCE: bool = False
+    VECTOR_SEARCH_COALESCE_WINDOW_MS: float = 2.0
+    VECTOR_SEARCH_COALESCE_MAX_BATCH: int = 64
+    VECTOR_FILTER_EXACT_MAX: int = 2048
+    RETRIEVAL_MODE: str = "dense"
+    BM25_K1: float = 1.2
+    BM25_B: float = 0.75
+    HYBRID_RRF_K: int = 60
+    HYBRID_CANDIDATE_FACTOR: int = 4
+    MULTI_DOC_MAX_DOCUMENTS: int = 50
+    MULTI_DOC_SEARCH_CONCURRENCY: int = 8
+    EXECUTOR_INTERACTIVE_WORKERS: int = 4
+    EXECUTOR_BULK_EMBEDDING_WORKERS: int = 2
+    EXECUTOR_TRANSCRIPTION_WORKERS: int = 1
+    EXECUTOR_EXTRACTION_WORKERS: int = 2
+    EXECUTOR_INDEX_IO_WORKERS: int = 4
+    EXECUTOR_RERANKER_WORKERS: int = 1
+    EXECUTOR_PROCESS_POOLS: list = []
+    WARMUP_ENABLED: bool = True
+    WARMUP_MODELS: list = ["embedding", "tokenizer"]
+    WARMUP_PREFETCH_INDEXES: int = 0
+    RERANK_ENABLED: bool = False
+    RERANK_MODEL: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+    RERANK_CANDIDATES: int = 20
+    RERANK_BUDGET_MS: float = 150.0
+    RERANK_TOKEN_BUDGET: int = 4096
+    RERANK_MAX_BATCH: int = 32
+    ANSWER_CACHE_ENABLED: bool = False
+    ANSWER_CACHE_SIMILARITY_THRESHOLD: float = 0.95
+    ANSWER_CACHE_TTL_SECONDS: int = 24 * 3600
+    ANSWER_CACHE_MAX_DOCUMENTS: int = 1000
+    ANSWER_CACHE_MAX_ENTRIES_PER_DOCUMENT: int = 64
     CHUNK_SIZE: int = 1000
     CHUNK_OVERLAP: int = 200
 
@@ -21,6 +21,7 @@ async def connect_to_mongo():
     await mongodb.db.users.create_index("email", unique=True)
     await mongodb.db.documents.create_index("user_id")
     await mongodb.db.chat_history.create_index([("document_id", 1), ("created_at", -1)])
+    await mongodb.db.chat_history.create_index([("updated_at", -1)])
     
     print(f"Connected to MongoDB: {settings.MONGODB_DB_NAME}")
 
@@ -1,5 +1,7 @@
+import asyncio
 import redis.asyncio as redis
-from typing import Optional
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
 
 from app.config import get_settings
 
@@ -8,10 +10,15 @@ settings = get_settings()
 
 class RedisClient:
     client: Optional[redis.Redis] = None
+    binary: Optional[redis.Redis] = None
+    loop: Optional[asyncio.AbstractEventLoop] = None
 
 
 redis_client = RedisClient()
 
+# Binary clients for loops other than the app's, keyed by loop.
+_loop_clients: Dict[asyncio.AbstractEventLoop, redis.Redis] = {}
+
 
 async def connect_to_redis():
     try:
@@ -21,16 +28,22 @@ async def connect_to_redis():
             decode_responses=True
         )
         await redis_client.client.ping()
+        # Packed values such as embeddings must not be decoded as text.
+        redis_client.binary = redis.from_url(settings.REDIS_URL)
+        redis_client.loop = asyncio.get_running_loop()
         print("Connected to Redis")
     except Exception as e:
         print(f"Redis connection failed (continuing without cache): {e}")
         redis_client.client = None
+        redis_client.binary = None
 
 
 async def close_redis_connection():
     if redis_client.client:
         await redis_client.client.close()
         print("Closed Redis connection")
+    if redis_client.binary:
+        await redis_client.binary.close()
 
 
 def get_redis():
@@ -48,6 +61,54 @@ async def cache_set(key: str, value: str, expire_seconds: int = 3600):
         await redis_client.client.setex(key, expire_seconds, value)
 
 
+@asynccontextmanager
+async def loop_redis():
+    # Clients are bound to the loop that opened them. Work that runs a loop
+    # of its own in a worker thread (uploads go through asyncio.run) gets a
+    # binary client for that loop while the block runs, as long as the app
+    # reached Redis at startup.
+    loop = asyncio.get_running_loop()
+    if redis_client.binary is None or loop is redis_client.loop or loop in _loop_clients:
+        yield
+        return
+    client = redis.from_url(settings.REDIS_URL)
+    _loop_clients[loop] = client
+    try:
+        yield
+    finally:
+        _loop_clients.pop(loop, None)
+        await client.close()
+
+
+def _binary_client() -> Optional[redis.Redis]:
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+    if loop is redis_client.loop:
+        return redis_client.binary
+    return _loop_clients.get(loop)
+
+
+async def cache_get_many_bytes(keys: List[str]) -> List[Optional[bytes]]:
+    client = _binary_client()
+    if client and keys:
+        return await client.mget(keys)
+    return [None] * len(keys)
+
+
+async def cache_set_many_bytes(items: Dict[str, bytes], expire_seconds: int = 3600) -> bool:
+    # True only when Redis took every item.
+    client = _binary_client()
+    if not client or not items:
+        return False
+    async with client.pipeline(transaction=False) as pipe:
+        for key, value in items.items():
+            pipe.setex(key, expire_seconds, value)
+        results = await pipe.execute()
+    return all(results)
+
+
 async def increment_rate_limit(key: str, window_seconds: int = 60) -> int:
     if redis_client.client:
         count = await redis_client.client.incr(key)
@@ -1,12 +1,23 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
+import asyncio
 import os
 
 from app.config import get_settings
 from app.db.mongodb import connect_to_mongo, close_mongo_connection
 from app.db.redis import connect_to_redis, close_redis_connection
+from app.services.llm_client import open_llm_client, close_llm_client, llm_client_stats
+from app.services.llm_cache import llm_cache
 from app.api.routes import upload, chat, documents, auth
+from app.services.vector_store import vector_store
+from app.services.embedding_cache import embedding_cache
+from app.services.embedding import EmbeddingService
+from app.services.answer_cache import answer_cache
+from app.services.reranker import reranker
+from app.services.warmup import readiness, register_warmup, warm_up
+from app.utils.executors import executor_stats, shutdown_executors
 
 
 settings = get_settings()
@@ -16,14 +27,27 @@ settings = get_settings()
 async def lifespan(app: FastAPI):
     await connect_to_mongo()
     await connect_to_redis()
+    await open_llm_client()
+    await vector_store.open()
     
     os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
     os.makedirs(settings.FAISS_INDEX_PATH, exist_ok=True)
     
+    # Warm-up runs in the background; /ready stays 503 until it finishes.
+    warmup_task = None
+    if settings.WARMUP_ENABLED:
+        register_warmup()
+        warmup_task = asyncio.create_task(warm_up())
+    
     yield
     
+    if warmup_task is not None and not warmup_task.done():
+        warmup_task.cancel()
+    await vector_store.close()
     await close_mongo_connection()
     await close_redis_connection()
+    await close_llm_client()
+    shutdown_executors()
 
 
 app = FastAPI(
@@ -59,3 +83,25 @@ async def root():
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
+
+
+@app.get("/ready")
+async def readiness_check():
+    return JSONResponse(
+        status_code=200 if readiness.ready else 503,
+        content=readiness.stats()
+    )
+
+
+@app.get("/metrics")
+async def metrics():
+    return {
+        "vector_store": vector_store.stats(),
+        "embedding_cache": embedding_cache.stats(),
+        "embedding_batcher": EmbeddingService.get_batcher().stats(),
+        "executors": executor_stats(),
+        "answer_cache": answer_cache.stats(),
+        "reranker": reranker.stats(),
+        "llm_client": llm_client_stats(),
+        "llm_cache": llm_cache.stats()
+    }
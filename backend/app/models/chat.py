@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Optional, List, Literal, Dict, Tuple
 from datetime import datetime
 
 
@@ -10,10 +10,50 @@ class ChatMessage(BaseModel):
     sources: Optional[List[dict]] = []
 
 
+class SearchFilters(BaseModel):
+    start_time: Optional[float] = Field(None, ge=0)
+    end_time: Optional[float] = Field(None, ge=0)
+    page_start: Optional[int] = Field(None, ge=1)
+    page_end: Optional[int] = Field(None, ge=1)
+    chunk_start: Optional[int] = Field(None, ge=0)
+    chunk_end: Optional[int] = Field(None, ge=0)
+    
+    def to_ranges(self) -> Dict[str, Tuple[Optional[float], Optional[float]]]:
+        ranges = {
+            "time": (self.start_time, self.end_time),
+            "page": (self.page_start, self.page_end),
+            "index": (self.chunk_start, self.chunk_end)
+        }
+        return {
+            name: bounds
+            for name, bounds in ranges.items()
+            if bounds != (None, None)
+        }
+
+
 class ChatRequest(BaseModel):
     message: str
     document_id: str
     stream: bool = False
+    nprobe: Optional[int] = Field(None, ge=1)
+    ef_search: Optional[int] = Field(None, ge=1)
+    retrieval_mode: Optional[Literal["dense", "lexical", "hybrid"]] = None
+    filters: Optional[SearchFilters] = None
+    rerank: Optional[bool] = None
+    # Reuse a cached answer to the identical prompt, even though sampling
+    # could have produced a different one.
+    allow_cached: bool = False
+
+
+class MultiChatRequest(BaseModel):
+    message: str
+    document_ids: List[str] = Field(..., min_length=1)
+    top_k: int = Field(5, ge=1, le=50)
+    nprobe: Optional[int] = Field(None, ge=1)
+    ef_search: Optional[int] = Field(None, ge=1)
+    retrieval_mode: Optional[Literal["dense", "lexical", "hybrid"]] = None
+    filters: Optional[SearchFilters] = None
+    allow_cached: bool = False
 
 
 class ChatResponse(BaseModel):
@@ -40,6 +80,7 @@ class ChatHistoryResponse(BaseModel):
 class SummarizeRequest(BaseModel):
     document_id: str
     max_length: Optional[int] = 500
+    allow_cached: bool = False
 
 
 class SummarizeResponse(BaseModel):
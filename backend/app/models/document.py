@@ -49,6 +49,7 @@ class DocumentInDB(BaseModel):
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
     processing_error: Optional[str] = None
+    indexing_progress: Optional[float] = None
 
 
 class DocumentResponse(BaseModel):
@@ -61,6 +62,7 @@ class DocumentResponse(BaseModel):
     summary: Optional[str] = None
     duration: Optional[float] = None
     timestamps: Optional[List[TimestampSegment]] = []
+    indexing_progress: Optional[float] = None
     created_at: datetime
     
     class Config:
@@ -0,0 +1,151 @@
+import json
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+from app.config import get_settings
+
+settings = get_settings()
+
+
+def answer_scope(**parameters) -> str:
+    # Answers are only reused for requests that retrieve the same way.
+    return json.dumps(parameters, sort_keys=True, default=str)
+
+
+class DocumentAnswers:
+    def __init__(self, version: int, capacity: int):
+        self.version = version
+        self.capacity = capacity
+        self.vectors: Optional[np.ndarray] = None
+        self.expires = np.zeros(capacity, dtype=np.float64)
+        self.entries: List[Optional[Dict]] = [None] * capacity
+        self.next_slot = 0
+    
+    def search(self, query: np.ndarray, scope: str, now: float) -> Tuple[float, Optional[Dict]]:
+        if self.vectors is None:
+            return 0.0, None
+        
+        live = (self.expires > now) & np.array(
+            [entry is not None and entry["scope"] == scope for entry in self.entries]
+        )
+        if not live.any():
+            return 0.0, None
+        
+        # Embeddings are normalised, so the dot product is the cosine.
+        scores = np.where(live, self.vectors @ query, -np.inf)
+        best = int(np.argmax(scores))
+        return float(scores[best]), self.entries[best]
+    
+    def add(self, query: np.ndarray, entry: Dict, expires: float):
+        if self.vectors is None:
+            self.vectors = np.zeros((self.capacity, len(query)), dtype='float32')
+        
+        # Ring buffer: once full, the oldest answer is overwritten.
+        slot = self.next_slot
+        self.vectors[slot] = query
+        self.expires[slot] = expires
+        self.entries[slot] = entry
+        self.next_slot = (slot + 1) % self.capacity
+
+
+class SemanticAnswerCache:
+    def __init__(
+        self,
+        max_documents: int,
+        max_entries: int,
+        threshold: float,
+        ttl_seconds: float
+    ):
+        self.max_documents = max_documents
+        self.max_entries = max(1, max_entries)
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.documents: "OrderedDict[str, DocumentAnswers]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.saved_llm_seconds = 0.0
+    
+    def lookup(
+        self,
+        document_id: str,
+        version: int,
+        scope: str,
+        query_embedding: np.ndarray
+    ) -> Optional[Dict]:
+        answers = self._answers(document_id, version)
+        query = np.asarray(query_embedding, dtype='float32')
+        
+        score, entry = answers.search(query, scope, time.monotonic()) if answers else (0.0, None)
+        if entry is None or score < self.threshold:
+            self.misses += 1
+            return None
+        
+        self.hits += 1
+        self.saved_llm_seconds += entry["llm_seconds"]
+        self.documents.move_to_end(document_id)
+        return dict(entry, similarity=score)
+    
+    def store(
+        self,
+        document_id: str,
+        version: int,
+        scope: str,
+        query_embedding: np.ndarray,
+        answer: str,
+        sources: List[Dict],
+        llm_seconds: float
+    ):
+        answers = self._answers(document_id, version)
+        if answers is None:
+            answers = DocumentAnswers(version, self.max_entries)
+            self.documents[document_id] = answers
+            while len(self.documents) > self.max_documents:
+                self.documents.popitem(last=False)
+        
+        answers.add(
+            np.asarray(query_embedding, dtype='float32'),
+            {
+                "scope": scope,
+                "answer": answer,
+                "sources": sources,
+                "llm_seconds": llm_seconds
+            },
+            time.monotonic() + self.ttl_seconds
+        )
+        self.documents.move_to_end(document_id)
+    
+    def invalidate(self, document_id: str):
+        if self.documents.pop(document_id, None) is not None:
+            self.invalidations += 1
+    
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "documents": len(self.documents),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "saved_llm_seconds": round(self.saved_llm_seconds, 3)
+        }
+    
+    def _answers(self, document_id: str, version: int) -> Optional[DocumentAnswers]:
+        answers = self.documents.get(document_id)
+        if answers is None:
+            return None
+        # Any append, removal or rebuild bumps the index version.
+        if answers.version != version:
+            self.invalidate(document_id)
+            return None
+        return answers
+
+
+answer_cache = SemanticAnswerCache(
+    max_documents=settings.ANSWER_CACHE_MAX_DOCUMENTS,
+    max_entries=settings.ANSWER_CACHE_MAX_ENTRIES_PER_DOCUMENT,
+    threshold=settings.ANSWER_CACHE_SIMILARITY_THRESHOLD,
+    ttl_seconds=settings.ANSWER_CACHE_TTL_SECONDS
+)
@@ -0,0 +1,340 @@
+import os
+import json
+import struct
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+MAGIC = b"RAGCHK01"
+ALIGNMENT = 8
+INT_MISSING = np.iinfo(np.int64).min
+
+# Filter names map onto a (start, end) column pair; a chunk matches when
+# that interval overlaps the requested range.
+FILTER_COLUMNS = {
+    "time": ("start_time", "end_time"),
+    "page": ("page_start", "page_end"),
+    "index": ("index", "index"),
+    "document": ("doc_ordinal", "doc_ordinal")
+}
+
+
+class ChunkStore:
+    def __init__(self, path: str):
+        self.path = path
+        self._data = np.memmap(path, dtype=np.uint8, mode="r")
+        
+        if bytes(self._data[:len(MAGIC)]) != MAGIC:
+            raise ValueError(f"Not a chunk store: {path}")
+        
+        (header_length,) = struct.unpack_from("<Q", self._data, len(MAGIC))
+        header_start = len(MAGIC) + 8
+        header = json.loads(bytes(self._data[header_start:header_start + header_length]))
+        
+        self.count = header["count"]
+        self.columns: Dict[str, np.ndarray] = {}
+        self._sections = {
+            name: self._section(section)
+            for name, section in header["sections"].items()
+        }
+        
+        for name in header["columns"]:
+            self.columns[name] = self._sections[f"column:{name}"]
+    
+    def __len__(self) -> int:
+        return self.count
+    
+    def __getitem__(self, position: int) -> Dict:
+        if position < 0:
+            position += self.count
+        if not 0 <= position < self.count:
+            raise IndexError(position)
+        
+        offsets = self._sections["text_offsets"]
+        text = bytes(self._sections["text"][offsets[position]:offsets[position + 1]])
+        chunk = {"text": text.decode("utf-8")}
+        
+        for name, column in self.columns.items():
+            value = column[position]
+            if column.dtype.kind == "f":
+                if not np.isnan(value):
+                    chunk[name] = float(value)
+            elif value != INT_MISSING:
+                chunk[name] = int(value)
+        
+        if "extra" in self._sections:
+            extra_offsets = self._sections["extra_offsets"]
+            extra = bytes(self._sections["extra"][extra_offsets[position]:extra_offsets[position + 1]])
+            if extra:
+                chunk.update(json.loads(extra))
+        
+        return chunk
+    
+    def __iter__(self):
+        for position in range(self.count):
+            yield self[position]
+    
+    def column(self, name: str) -> Optional[np.ndarray]:
+        return self.columns.get(name)
+    
+    @property
+    def nbytes(self) -> int:
+        # Text pages are only touched for returned chunks; offsets and
+        # numeric columns are what stays hot.
+        return sum(
+            section.nbytes
+            for name, section in self._sections.items()
+            if name not in ("text", "extra")
+        )
+    
+    @staticmethod
+    def write(path: str, chunks: List[Dict]):
+        texts = [chunk.get("text", "").encode("utf-8") for chunk in chunks]
+        text_offsets = np.zeros(len(chunks) + 1, dtype="<i8")
+        np.cumsum([len(text) for text in texts], out=text_offsets[1:])
+        
+        sections = {
+            "text": np.frombuffer(b"".join(texts), dtype=np.uint8),
+            "text_offsets": text_offsets
+        }
+        
+        columns, extras = _split_columns(chunks)
+        for name, values in columns.items():
+            sections[f"column:{name}"] = values
+        
+        if any(extras):
+            encoded = [json.dumps(extra).encode("utf-8") if extra else b"" for extra in extras]
+            extra_offsets = np.zeros(len(chunks) + 1, dtype="<i8")
+            np.cumsum([len(item) for item in encoded], out=extra_offsets[1:])
+            sections["extra"] = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+            sections["extra_offsets"] = extra_offsets
+        
+        _write_sections(path, len(chunks), list(columns), sections)
+    
+    def _section(self, section: Dict) -> np.ndarray:
+        dtype = np.dtype(section["dtype"])
+        return np.frombuffer(
+            self._data,
+            dtype=dtype,
+            count=section["length"],
+            offset=section["offset"]
+        )
+
+
+class ChunkSegments:
+    def __init__(
+        self,
+        stores: List[ChunkStore],
+        vectors: Optional[List[Optional[np.ndarray]]] = None
+    ):
+        self.stores = list(stores)
+        self.segment_vectors = list(vectors) if vectors is not None else [None] * len(stores)
+        self._refresh()
+    
+    def __len__(self) -> int:
+        return int(self.offsets[-1])
+    
+    def __iter__(self):
+        for store in self.stores:
+            yield from store
+    
+    def append(self, store: ChunkStore, vectors: Optional[np.ndarray] = None):
+        self.stores.append(store)
+        self.segment_vectors.append(vectors)
+        self._refresh()
+    
+    def positions(self, chunk_ids) -> np.ndarray:
+        chunk_ids = np.asarray(chunk_ids, dtype=np.int64)
+        positions = np.searchsorted(self.ids, chunk_ids)
+        found = positions < len(self.ids)
+        found[found] = self.ids[positions[found]] == chunk_ids[found]
+        return np.where(found, positions, -1)
+    
+    def get(self, chunk_id: int) -> Optional[Dict]:
+        position = int(self.positions([chunk_id])[0])
+        if position < 0:
+            return None
+        return self.at(position)
+    
+    def at(self, position: int) -> Dict:
+        segment = int(np.searchsorted(self.offsets, position, side="right")) - 1
+        chunk = self.stores[segment][position - int(self.offsets[segment])]
+        chunk["chunk_id"] = int(self.ids[position])
+        return chunk
+    
+    def vectors(self, chunk_ids) -> Optional[np.ndarray]:
+        if any(vectors is None for vectors in self.segment_vectors):
+            return None
+        
+        positions = self.positions(chunk_ids)
+        segments = np.searchsorted(self.offsets, positions, side="right") - 1
+        dimension = next(v.shape[1] for v in self.segment_vectors if v is not None)
+        result = np.zeros((len(positions), dimension), dtype="float32")
+        
+        for segment in np.unique(segments[positions >= 0]):
+            mask = (segments == segment) & (positions >= 0)
+            rows = positions[mask] - self.offsets[segment]
+            result[mask] = self.segment_vectors[segment][rows]
+        
+        return result
+    
+    def column(self, name: str) -> Optional[np.ndarray]:
+        if name not in self._columns:
+            parts = [store.column(name) for store in self.stores]
+            if all(part is None for part in parts):
+                return None
+            if all(part is not None and part.dtype.kind == "i" for part in parts):
+                self._columns[name] = np.concatenate(parts)
+            else:
+                self._columns[name] = np.concatenate([
+                    _as_float(part, len(store))
+                    for part, store in zip(parts, self.stores)
+                ])
+        return self._columns[name]
+    
+    def matching(self, filters: Dict[str, Tuple[Optional[float], Optional[float]]]) -> np.ndarray:
+        mask = np.ones(len(self), dtype=bool)
+        for name, (low, high) in filters.items():
+            if name not in FILTER_COLUMNS:
+                raise ValueError(f"Unknown filter: {name}")
+            
+            start_column, end_column = FILTER_COLUMNS[name]
+            starts = self.column(start_column)
+            if starts is None:
+                # Chunks without the metadata can never satisfy the filter.
+                return np.zeros(len(self), dtype=bool)
+            starts = _as_float(starts, len(self))
+            ends = self.column(end_column)
+            ends = starts if ends is None else _as_float(ends, len(self))
+            ends = np.where(np.isnan(ends), starts, ends)
+            
+            if low is not None:
+                mask &= ends >= low
+            if high is not None:
+                mask &= starts <= high
+            mask &= ~np.isnan(starts)
+        return mask
+    
+    @property
+    def nbytes(self) -> int:
+        return sum(store.nbytes for store in self.stores) + self.ids.nbytes
+    
+    def _refresh(self):
+        counts = [len(store) for store in self.stores]
+        self.offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=self.offsets[1:])
+        
+        # Indexes written before stable chunk IDs use row positions.
+        ids = [
+            store.column("chunk_id") if store.column("chunk_id") is not None
+            else np.arange(len(store), dtype=np.int64)
+            for store in self.stores
+        ]
+        self.ids = np.concatenate(ids) if ids else np.zeros(0, dtype=np.int64)
+        self._columns: Dict[str, np.ndarray] = {}
+
+
+def _as_float(values: Optional[np.ndarray], count: int) -> np.ndarray:
+    if values is None:
+        return np.full(count, np.nan)
+    if values.dtype.kind == "f":
+        return values
+    return np.where(values == INT_MISSING, np.nan, values.astype(np.float64))
+
+
+def _split_columns(chunks: List[Dict]):
+    kinds: Dict[str, str] = {}
+    for chunk in chunks:
+        for key, value in chunk.items():
+            if key == "text" or value is None:
+                continue
+            if isinstance(value, bool) or not isinstance(value, (int, float, np.integer, np.floating)):
+                kind = "object"
+            elif isinstance(value, (float, np.floating)):
+                kind = "float"
+            else:
+                kind = "int"
+            
+            previous = kinds.get(key)
+            if previous is None or previous == kind:
+                kinds[key] = kind
+            elif {previous, kind} == {"int", "float"}:
+                kinds[key] = "float"
+            else:
+                kinds[key] = "object"
+    
+    columns = {}
+    for key, kind in kinds.items():
+        if kind == "int":
+            values = np.full(len(chunks), INT_MISSING, dtype="<i8")
+        elif kind == "float":
+            values = np.full(len(chunks), np.nan, dtype="<f8")
+        else:
+            continue
+        
+        for position, chunk in enumerate(chunks):
+            value = chunk.get(key)
+            if value is not None:
+                values[position] = value
+        columns[key] = values
+    
+    extras = [
+        {
+            key: value
+            for key, value in chunk.items()
+            if key != "text" and key not in columns and value is not None
+        }
+        for chunk in chunks
+    ]
+    
+    return columns, extras
+
+
+def _write_sections(path: str, count: int, columns: List[str], sections: Dict[str, np.ndarray]):
+    layout = {}
+    offset = 0
+    for name, values in sections.items():
+        layout[name] = {
+            "dtype": values.dtype.str,
+            "offset": offset,
+            "length": int(values.size)
+        }
+        offset += _aligned(values.nbytes)
+    
+    # Section offsets are stored as absolute file offsets, which depend
+    # on the header length, so grow the data start until it fits.
+    data_start = 0
+    while True:
+        header = {
+            "version": 1,
+            "count": count,
+            "columns": columns,
+            "sections": {
+                name: dict(section, offset=section["offset"] + data_start)
+                for name, section in layout.items()
+            }
+        }
+        header_bytes = json.dumps(header).encode("utf-8")
+        required = _aligned(len(MAGIC) + 8 + len(header_bytes))
+        if required <= data_start:
+            break
+        data_start = required
+    
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<Q", len(header_bytes)))
+        f.write(header_bytes)
+        f.write(b"\0" * (data_start - f.tell()))
+        
+        for name, values in sections.items():
+            f.write(values.tobytes())
+            f.write(b"\0" * (_aligned(values.nbytes) - values.nbytes))
+        
+        f.flush()
+        os.fsync(f.fileno())
+    
+    os.replace(tmp_path, path)
+
+
+def _aligned(size: int) -> int:
+    return (size + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
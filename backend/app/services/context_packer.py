@@ -0,0 +1,137 @@
+import threading
+from typing import Dict, List, Optional
+
+from app.config import get_settings
+from app.services.embedding import estimate_tokens
+
+settings = get_settings()
+
+# Tokens taken by the "[Source n]: " label and the blank line between sources.
+SOURCE_OVERHEAD_TOKENS = 8
+
+
+def join_overlapping(left: str, right: str, overlap: int) -> str:
+    # Chunk texts are stripped, so the shared span is found on the text
+    # itself rather than trusted from the offsets.
+    for size in range(min(overlap, len(left), len(right)), 0, -1):
+        if left.endswith(right[:size]):
+            return left + right[size:]
+    return f"{left} {right}"
+
+
+def merge_chunks(chunks: List[Dict]) -> List[Dict]:
+    # Chunks are given in relevance order; each merged span keeps the rank
+    # and score of its best chunk.
+    groups: Dict[Optional[str], List[Dict]] = {}
+    standalone = []
+    for rank, chunk in enumerate(chunks):
+        chunk = dict(chunk, rank=rank)
+        if isinstance(chunk.get("start"), int) and isinstance(chunk.get("end"), int):
+            groups.setdefault(chunk.get("document_id"), []).append(chunk)
+        else:
+            standalone.append(chunk)
+    
+    spans = []
+    for group in groups.values():
+        group.sort(key=lambda chunk: (chunk["start"], -chunk["end"]))
+        span = None
+        for chunk in group:
+            if span is None or chunk["start"] > span["end"]:
+                span = dict(chunk)
+                spans.append(span)
+                continue
+            
+            if chunk["end"] > span["end"]:
+                span["text"] = join_overlapping(span["text"], chunk["text"], span["end"] - chunk["start"])
+                span["end"] = chunk["end"]
+            span["rank"] = min(span["rank"], chunk["rank"])
+            span["score"] = max(span.get("score", 0), chunk.get("score", 0))
+            if "start_time" in chunk:
+                span["start_time"] = min(span.get("start_time", chunk["start_time"]), chunk["start_time"])
+            if "end_time" in chunk:
+                span["end_time"] = max(span.get("end_time", chunk["end_time"]), chunk["end_time"])
+    
+    seen = {span["text"] for span in spans}
+    for chunk in standalone:
+        if chunk["text"] not in seen:
+            seen.add(chunk["text"])
+            spans.append(chunk)
+    
+    spans.sort(key=lambda span: span["rank"])
+    return spans
+
+
+class ContextPacker:
+    _tokenizer = None
+    _tokenizer_lock = threading.Lock()
+    
+    @classmethod
+    def _load_tokenizer(cls, local_files_only: bool):
+        from transformers import AutoTokenizer
+        
+        return AutoTokenizer.from_pretrained(
+            settings.LLM_CONTEXT_TOKENIZER or settings.HUGGINGFACE_MODEL,
+            token=settings.HUGGINGFACE_API_KEY,
+            local_files_only=local_files_only
+        )
+    
+    @classmethod
+    def get_tokenizer(cls):
+        # Prompts never wait on the hub: a tokenizer that isn't on disk yet is
+        # fetched by the warm-up, and token counts are estimated until then.
+        # False records a failed load so it is not retried on every prompt.
+        with cls._tokenizer_lock:
+            if cls._tokenizer is None:
+                try:
+                    cls._tokenizer = cls._load_tokenizer(local_files_only=True)
+                except Exception as e:
+                    print(f"Tokenizer not cached locally, estimating context tokens: {e}")
+                    cls._tokenizer = False
+        return cls._tokenizer
+    
+    @classmethod
+    def preload_tokenizer(cls):
+        # Downloads outside the lock, so prompts keep estimating meanwhile.
+        try:
+            tokenizer = cls._load_tokenizer(local_files_only=False)
+        except Exception as e:
+            print(f"Tokenizer unavailable, estimating context tokens: {e}")
+            tokenizer = False
+        
+        with cls._tokenizer_lock:
+            if tokenizer or cls._tokenizer is None:
+                cls._tokenizer = tokenizer
+    
+    def count_tokens(self, text: str) -> int:
+        tokenizer = self.get_tokenizer()
+        if not tokenizer:
+            return estimate_tokens(text)
+        return len(tokenizer.encode(text, add_special_tokens=False))
+    
+    def pack(self, chunks: List[Dict], token_budget: Optional[int] = None) -> List[Dict]:
+        token_budget = token_budget or settings.LLM_CONTEXT_TOKEN_BUDGET
+        counts: Dict[str, int] = {}
+        
+        def cost(spans: List[Dict]) -> int:
+            for span in spans:
+                if span["text"] not in counts:
+                    counts[span["text"]] = self.count_tokens(span["text"]) + SOURCE_OVERHEAD_TOKENS
+            return sum(counts[span["text"]] for span in spans)
+        
+        # Chunks are admitted in relevance order and charged only for the
+        # text they add; the most relevant chunk is always kept.
+        selected: List[Dict] = []
+        packed: List[Dict] = []
+        for chunk in chunks:
+            candidate = merge_chunks(selected + [chunk])
+            if packed and cost(candidate) > token_budget:
+                continue
+            selected.append(chunk)
+            packed = candidate
+        
+        for span in packed:
+            span.pop("rank", None)
+        return packed
+
+
+context_packer = ContextPacker()
@@ -1,10 +1,12 @@
 import asyncio
 import sys
 from datetime import datetime
+from typing import Optional
 from bson import ObjectId
 
 from app.models.document import DocumentType, DocumentStatus
 from app.db.mongodb import get_collection
+from app.db.redis import loop_redis
 from app.services.pdf_processor import PDFProcessor
 from app.services.transcription import TranscriptionService
 from app.services.rag_pipeline import RAGPipeline
@@ -13,11 +15,12 @@ from app.services.rag_pipeline import RAGPipeline
 def process_document_sync(
     document_id: str,
     file_path: str,
-    document_type: DocumentType
+    document_type: DocumentType,
+    user_id: Optional[str] = None
 ):
     print(f"[BACKGROUND] Starting processing for document {document_id}", flush=True)
     try:
-        asyncio.run(_process_document_async(document_id, file_path, document_type))
+        asyncio.run(_process_on_worker_loop(document_id, file_path, document_type, user_id))
         print(f"[BACKGROUND] Completed processing for document {document_id}", flush=True)
     except Exception as e:
         print(f"[BACKGROUND] Fatal error processing document {document_id}: {e}", flush=True)
@@ -25,10 +28,18 @@ def process_document_sync(
         traceback.print_exc()
 
 
+async def _process_on_worker_loop(*args):
+    # This loop is not the app's, so it needs its own Redis client for the
+    # embedding cache.
+    async with loop_redis():
+        await _process_document_async(*args)
+
+
 async def _process_document_async(
     document_id: str,
     file_path: str,
-    document_type: DocumentType
+    document_type: DocumentType,
+    user_id: Optional[str] = None
 ):
     documents_collection = get_collection("documents")
     
@@ -44,11 +55,11 @@ async def _process_document_async(
         )
         
         if document_type == DocumentType.PDF:
-            result = await _process_pdf(document_id, file_path)
+            result = await _process_pdf(document_id, file_path, user_id)
         elif document_type == DocumentType.AUDIO:
-            result = await _process_audio(document_id, file_path)
+            result = await _process_audio(document_id, file_path, user_id)
         elif document_type == DocumentType.VIDEO:
-            result = await _process_video(document_id, file_path)
+            result = await _process_video(document_id, file_path, user_id)
         else:
             raise ValueError(f"Unknown document type: {document_type}")
         
@@ -66,7 +77,7 @@ async def _process_document_async(
         )
         
         print(f"Document {document_id} processed successfully", flush=True)
-        
+    
     except Exception as e:
         print(f"Error processing document {document_id}: {e}", flush=True)
         import traceback
@@ -84,7 +95,30 @@ async def _process_document_async(
         )
 
 
-async def _process_pdf(document_id: str, file_path: str) -> dict:
+def _indexing_progress(document_id: str):
+    documents_collection = get_collection("documents")
+    reported = {"step": -1}
+    
+    async def report(done: int, total: int):
+        # Written in 5% steps so long documents don't flood Mongo with updates.
+        step = 20 * done // total
+        if step <= reported["step"]:
+            return
+        reported["step"] = step
+        await documents_collection.update_one(
+            {"_id": ObjectId(document_id)},
+            {
+                "$set": {
+                    "indexing_progress": done / total,
+                    "updated_at": datetime.utcnow()
+                }
+            }
+        )
+    
+    return report
+
+
+async def _process_pdf(document_id: str, file_path: str, user_id: Optional[str] = None) -> dict:
     print(f"[PDF] Starting PDF processing for {document_id}", flush=True)
     processor = PDFProcessor()
     rag = RAGPipeline()
@@ -94,10 +128,16 @@ async def _process_pdf(document_id: str, file_path: str) -> dict:
     print(f"[PDF] Extracted {len(result.get('text', ''))} characters", flush=True)
     
     chunks = processor.chunk_text(result["text"])
+    processor.assign_pages(chunks, result["text"], result.get("pages", []))
     print(f"[PDF] Created {len(chunks)} chunks for indexing", flush=True)
     
     print(f"[PDF] Indexing chunks in vector store...", flush=True)
-    await rag.index_document(document_id, chunks)
+    await rag.index_document(
+        document_id,
+        chunks,
+        user_id=user_id,
+        progress=_indexing_progress(document_id)
+    )
     print(f"[PDF] Indexing complete for {document_id}", flush=True)
     
     return {
@@ -107,7 +147,7 @@ async def _process_pdf(document_id: str, file_path: str) -> dict:
     }
 
 
-async def _process_audio(document_id: str, file_path: str) -> dict:
+async def _process_audio(document_id: str, file_path: str, user_id: Optional[str] = None) -> dict:
     transcription = TranscriptionService()
     rag = RAGPipeline()
     pdf_processor = PDFProcessor()
@@ -117,15 +157,15 @@ async def _process_audio(document_id: str, file_path: str) -> dict:
     topics = transcription.extract_topics(result["segments"])
     
     chunks = pdf_processor.chunk_text(result["text"])
+    transcription.assign_times(chunks, result["text"], result["segments"])
     
-    for chunk in chunks:
-        for segment in result["segments"]:
-            if segment["text"] in chunk["text"]:
-                chunk["start_time"] = segment["start"]
-                chunk["end_time"] = segment["end"]
-                break
-    
-    await rag.index_document(document_id, chunks)
+    await rag.index_document(
+        document_id,
+        chunks,
+        user_id=user_id,
+        progress=_indexing_progress(document_id)
+    )
+    await rag.index_topics(document_id, topics)
     
     return {
         "text": result["text"],
@@ -134,7 +174,7 @@ async def _process_audio(document_id: str, file_path: str) -> dict:
     }
 
 
-async def _process_video(document_id: str, file_path: str) -> dict:
+async def _process_video(document_id: str, file_path: str, user_id: Optional[str] = None) -> dict:
     transcription = TranscriptionService()
     rag = RAGPipeline()
     pdf_processor = PDFProcessor()
@@ -144,15 +184,15 @@ async def _process_video(document_id: str, file_path: str) -> dict:
     topics = transcription.extract_topics(result["segments"])
     
     chunks = pdf_processor.chunk_text(result["text"])
-    
-    for chunk in chunks:
-        for segment in result["segments"]:
-            if segment["text"] in chunk["text"]:
-                chunk["start_time"] = segment["start"]
-                chunk["end_time"] = segment["end"]
-                break
-    
-    await rag.index_document(document_id, chunks)
+    transcription.assign_times(chunks, result["text"], result["segments"])
+    
+    await rag.index_document(
+        document_id,
+        chunks,
+        user_id=user_id,
+        progress=_indexing_progress(document_id)
+    )
+    await rag.index_topics(document_id, topics)
     
     return {
         "text": result["text"],
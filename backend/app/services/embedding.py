@@ -1,59 +1,226 @@
-from typing import List
+import os
+import re
+import threading
+from typing import Awaitable, Callable, Dict, List, Optional
 import numpy as np
 
 from app.config import get_settings
+from app.services.embedding_cache import embedding_cache
+from app.utils.batching import MicroBatcher
+from app.utils.executors import get_executor
 
 settings = get_settings()
 
+EMBEDDING_BACKENDS = ("torch", "onnx")
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+def estimate_tokens(text: str) -> int:
+    # Words and punctuation plus [CLS]/[SEP]; close enough to WordPiece
+    # counts to size batches without running the tokenizer twice.
+    return len(TOKEN_PATTERN.findall(text)) + 2
+
+
+def length_bucket_indices(lengths: List[int], token_budget: int, max_batch: int) -> List[List[int]]:
+    # Sorted by length, each batch pads to its last item; grow it while the
+    # padded size stays within the token budget.
+    order = sorted(range(len(lengths)), key=lengths.__getitem__)
+    
+    buckets = []
+    batch: List[int] = []
+    for position in order:
+        if batch and (
+            len(batch) >= max_batch
+            or (len(batch) + 1) * lengths[position] > token_budget
+        ):
+            buckets.append(batch)
+            batch = []
+        batch.append(position)
+    if batch:
+        buckets.append(batch)
+    return buckets
+
+
+def length_buckets(texts: List[str], token_budget: int, max_batch: int) -> List[List[str]]:
+    lengths = [estimate_tokens(text) for text in texts]
+    return [
+        [texts[position] for position in bucket]
+        for bucket in length_bucket_indices(lengths, token_budget, max_batch)
+    ]
+
+
+def load_embedding_model(model_name: str, backend: str, quantize: bool = False):
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend: {backend}")
+    
+    from sentence_transformers import SentenceTransformer
+    
+    if backend == "torch":
+        return SentenceTransformer(model_name)
+    if not quantize:
+        return SentenceTransformer(model_name, backend="onnx")
+    
+    # The int8 export runs once and is reused from disk afterwards.
+    from sentence_transformers import export_dynamic_quantized_onnx_model
+    
+    config = settings.EMBEDDING_ONNX_QUANTIZATION_CONFIG
+    path = os.path.join(settings.EMBEDDING_ONNX_PATH, model_name.replace("/", "__"))
+    file_name = f"onnx/model_qint8_{config}.onnx"
+    
+    if not os.path.exists(os.path.join(path, file_name)):
+        model = SentenceTransformer(model_name, backend="onnx")
+        model.save(path)
+        export_dynamic_quantized_onnx_model(model, config, path)
+    
+    return SentenceTransformer(path, backend="onnx", model_kwargs={"file_name": file_name})
+
 
 class EmbeddingService:
     _model = None
+    _model_lock = threading.Lock()
+    _batcher = None
     
     @classmethod
     def get_model(cls):
-        if cls._model is None:
-            from sentence_transformers import SentenceTransformer
-            cls._model = SentenceTransformer(settings.EMBEDDING_MODEL)
+        # Interactive and bulk executors may both ask for the first load.
+        with cls._model_lock:
+            if cls._model is None:
+                cls._model = load_embedding_model(
+                    settings.EMBEDDING_MODEL,
+                    settings.EMBEDDING_BACKEND,
+                    quantize=settings.EMBEDDING_ONNX_QUANTIZE
+                )
         return cls._model
     
-    async def embed_text(self, text: str) -> List[float]:
-        import asyncio
+    @classmethod
+    def get_batcher(cls) -> MicroBatcher:
+        # Shared by every instance so concurrent requests land in one batch.
+        if cls._batcher is None:
+            cls._batcher = MicroBatcher(
+                cls._encode_queries,
+                window_ms=settings.EMBEDDING_BATCH_WINDOW_MS,
+                max_batch=settings.EMBEDDING_BATCH_MAX_SIZE
+            )
+        return cls._batcher
+    
+    async def embed_text(self, text: str) -> np.ndarray:
+        if settings.EMBEDDING_CACHE_ENABLED:
+            (cached,) = await embedding_cache.get_many([text])
+            if cached is not None:
+                return cached
         
-        loop = asyncio.get_event_loop()
-        embedding = await loop.run_in_executor(
-            None,
-            self._embed_sync,
-            text
-        )
-        return embedding.tolist()
+        if settings.EMBEDDING_BATCH_ENABLED:
+            embedding = await self.get_batcher().submit(None, text)
+        else:
+            embedding = await get_executor("interactive").run(
+                self._embed_sync,
+                text
+            )
+        
+        embedding = np.ascontiguousarray(embedding, dtype='float32')
+        if settings.EMBEDDING_CACHE_ENABLED:
+            await embedding_cache.put_many([text], [embedding])
+        return embedding
     
-    async def embed_texts(self, texts: List[str]) -> List[List[float]]:
-        import asyncio
+    async def embed_texts(
+        self,
+        texts: List[str],
+        progress: Optional[Callable[[int, int], Awaitable[None]]] = None
+    ) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, 0), dtype='float32')
+        
+        if settings.EMBEDDING_CACHE_ENABLED:
+            cached = await embedding_cache.get_many(texts)
+        else:
+            cached = [None] * len(texts)
+        
+        # Vectors are written straight into one float32 matrix, so peak
+        # memory is the result plus a single batch, however long the document.
+        output = None
+        
+        def place(rows: List[int], vectors: np.ndarray):
+            nonlocal output
+            if output is None:
+                output = np.empty((len(texts), vectors.shape[1]), dtype='float32')
+            output[rows] = vectors
+        
+        hits = [position for position, embedding in enumerate(cached) if embedding is not None]
+        if hits:
+            place(hits, np.stack([cached[position] for position in hits]))
+        
+        # Each distinct missing text is encoded once.
+        positions: Dict[str, List[int]] = {}
+        for position, embedding in enumerate(cached):
+            if embedding is None:
+                positions.setdefault(texts[position], []).append(position)
         
-        loop = asyncio.get_event_loop()
-        embeddings = await loop.run_in_executor(
-            None,
-            self._embed_batch_sync,
-            texts
+        done = len(hits)
+        buckets = length_buckets(
+            list(positions),
+            settings.EMBEDDING_BULK_TOKEN_BUDGET,
+            settings.EMBEDDING_BULK_MAX_BATCH
         )
-        return [e.tolist() for e in embeddings]
+        for batch in buckets:
+            encoded = await get_executor("bulk_embedding").run(
+                self._embed_batch_sync,
+                batch
+            )
+            encoded = np.asarray(encoded, dtype='float32')
+            if settings.EMBEDDING_CACHE_ENABLED:
+                await embedding_cache.put_many(batch, encoded)
+            
+            rows = [position for text in batch for position in positions[text]]
+            sources = [row for row, text in enumerate(batch) for _ in positions[text]]
+            place(rows, encoded[sources])
+            
+            done += len(rows)
+            if progress is not None:
+                await progress(done, len(texts))
+        
+        return output
     
     def _embed_sync(self, text: str) -> np.ndarray:
         model = self.get_model()
         return model.encode(text, normalize_embeddings=True)
     
     def _embed_batch_sync(self, texts: List[str]) -> np.ndarray:
+        # Batches are already sized by length_buckets; encode each in one pass.
         model = self.get_model()
-        return model.encode(texts, normalize_embeddings=True, show_progress_bar=False)
+        return model.encode(
+            texts,
+            batch_size=max(len(texts), 1),
+            normalize_embeddings=True,
+            show_progress_bar=False
+        )
+    
+    @classmethod
+    async def _encode_queries(cls, key, texts: List[str]) -> List[np.ndarray]:
+        # The same question often arrives twice in one window (retrieval and
+        # timestamp ranking), so each distinct text is encoded once.
+        distinct = list(dict.fromkeys(texts))
+        embeddings = await get_executor("interactive").run(
+            cls._encode_batch,
+            distinct
+        )
+        encoded = dict(zip(distinct, embeddings))
+        return [encoded[text] for text in texts]
+    
+    @classmethod
+    def _encode_batch(cls, texts: List[str]) -> np.ndarray:
+        model = cls.get_model()
+        return np.atleast_2d(
+            model.encode(texts, normalize_embeddings=True, show_progress_bar=False)
+        )
     
     async def compute_similarity(
         self,
-        query_embedding: List[float],
-        document_embeddings: List[List[float]]
-    ) -> List[float]:
-        query = np.array(query_embedding)
-        docs = np.array(document_embeddings)
+        query_embedding: np.ndarray,
+        document_embeddings: np.ndarray
+    ) -> np.ndarray:
+        query = np.asarray(query_embedding, dtype='float32')
+        docs = np.asarray(document_embeddings, dtype='float32')
         
         similarities = np.dot(docs, query)
         
-        return similarities.tolist()
+        return similarities
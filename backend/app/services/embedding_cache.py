@@ -0,0 +1,133 @@
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional
+import numpy as np
+
+from app.config import get_settings
+from app.db.redis import cache_get_many_bytes, cache_set_many_bytes
+
+settings = get_settings()
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def model_variant() -> str:
+    # The same model run through ONNX or quantised to int8 gives slightly
+    # different vectors, so each variant keeps keys of its own.
+    if settings.EMBEDDING_BACKEND != "onnx":
+        return settings.EMBEDDING_BACKEND
+    if settings.EMBEDDING_ONNX_QUANTIZE:
+        return f"onnx-qint8-{settings.EMBEDDING_ONNX_QUANTIZATION_CONFIG}"
+    return "onnx"
+
+
+class EmbeddingCache:
+    def __init__(self, max_bytes: int = 0, dtype: str = "float16"):
+        self.max_bytes = max_bytes
+        self.dtype = np.dtype(dtype)
+        self.entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self.resident_bytes = 0
+        self.memory_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self._lock = threading.Lock()
+    
+    def key(self, text: str) -> str:
+        digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+        # Entries are packed in the cache dtype, so it is part of the key too.
+        return f"emb:{settings.EMBEDDING_MODEL}:{model_variant()}:{self.dtype.name}:{digest}"
+    
+    async def get_many(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        keys = [self.key(text) for text in texts]
+        results: List[Optional[np.ndarray]] = [None] * len(texts)
+        
+        remote = []
+        with self._lock:
+            for position, key in enumerate(keys):
+                packed = self.entries.get(key)
+                if packed is None:
+                    remote.append(position)
+                    continue
+                self.entries.move_to_end(key)
+                self.memory_hits += 1
+                results[position] = self._unpack(packed)
+        
+        if remote:
+            try:
+                values = await cache_get_many_bytes([keys[position] for position in remote])
+            except Exception as e:
+                print(f"Embedding cache read failed: {e}")
+                values = [None] * len(remote)
+            
+            for position, packed in zip(remote, values):
+                if packed is None:
+                    self.misses += 1
+                    continue
+                self.redis_hits += 1
+                self._remember(keys[position], packed)
+                results[position] = self._unpack(packed)
+        
+        for vector in results:
+            if vector is not None:
+                self.bytes_saved += vector.size * 4
+        
+        return results
+    
+    async def put_many(self, texts: List[str], vectors: np.ndarray):
+        items: Dict[str, bytes] = {}
+        for text, vector in zip(texts, vectors):
+            key = self.key(text)
+            packed = np.asarray(vector, dtype=self.dtype).tobytes()
+            self._remember(key, packed)
+            items[key] = packed
+        
+        if not items:
+            return
+        try:
+            await cache_set_many_bytes(items, settings.EMBEDDING_CACHE_TTL_SECONDS)
+        except Exception as e:
+            print(f"Embedding cache write failed: {e}")
+    
+    def stats(self) -> Dict:
+        lookups = self.memory_hits + self.redis_hits + self.misses
+        return {
+            "dtype": self.dtype.name,
+            "max_bytes": self.max_bytes,
+            "resident_bytes": self.resident_bytes,
+            "entries": len(self.entries),
+            "memory_hits": self.memory_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_ratio": (self.memory_hits + self.redis_hits) / lookups if lookups else 0.0,
+            "bytes_saved": self.bytes_saved
+        }
+    
+    def _remember(self, key: str, packed: bytes):
+        if self.max_bytes <= 0:
+            return
+        
+        with self._lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.resident_bytes -= len(previous)
+            
+            self.entries[key] = packed
+            self.resident_bytes += len(packed)
+            
+            while self.resident_bytes > self.max_bytes and len(self.entries) > 1:
+                _, evicted = self.entries.popitem(last=False)
+                self.resident_bytes -= len(evicted)
+    
+    def _unpack(self, packed: bytes) -> np.ndarray:
+        return np.frombuffer(packed, dtype=self.dtype).astype('float32')
+
+
+embedding_cache = EmbeddingCache(
+    max_bytes=settings.EMBEDDING_CACHE_MAX_MEMORY_MB * 1024 * 1024,
+    dtype=settings.EMBEDDING_CACHE_DTYPE
+)
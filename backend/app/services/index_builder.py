@@ -0,0 +1,244 @@
+import math
+from typing import Callable, Dict, Optional, Tuple
+import numpy as np
+
+from app.config import get_settings
+
+settings = get_settings()
+
+PQ_TRAINING_POINTS = 256 * 39
+STORAGE_MODES = ("float", "sq8", "pq", "binary")
+
+
+def select_index_spec(count: int, dimension: int) -> Dict:
+    storage = settings.FAISS_STORAGE_MODE
+    if storage not in STORAGE_MODES:
+        raise ValueError(f"Unknown storage mode: {storage}")
+    
+    if storage == "binary":
+        return {
+            "index_type": "binary",
+            "factory": "BFlat",
+            "storage": storage,
+            "params": {"rescore_factor": settings.FAISS_BINARY_RESCORE_FACTOR},
+            "dimension": dimension,
+            "count": count
+        }
+    
+    if storage == "pq" and count < PQ_TRAINING_POINTS:
+        storage = "sq8"
+    
+    index_type = "flat"
+    if count > settings.FAISS_FLAT_MAX_VECTORS:
+        index_type = settings.FAISS_LARGE_INDEX_TYPE
+    
+    if index_type == "ivfpq" and count < PQ_TRAINING_POINTS:
+        index_type = "hnsw"
+    
+    pq_m = _pq_subquantizers(dimension)
+    encoding = {"float": "Flat", "sq8": "SQ8", "pq": f"PQ{pq_m}"}[storage]
+    
+    if index_type == "hnsw":
+        params = {
+            "M": settings.FAISS_HNSW_M,
+            "ef_construction": settings.FAISS_HNSW_EF_CONSTRUCTION,
+            "ef_search": settings.FAISS_HNSW_EF_SEARCH
+        }
+        factory = f"HNSW{params['M']},{encoding}"
+    elif index_type == "ivfpq":
+        nlist = max(1, min(int(4 * math.sqrt(count)), count // 39))
+        params = {
+            "nlist": nlist,
+            "pq_m": pq_m,
+            "nprobe": settings.FAISS_IVF_NPROBE
+        }
+        factory = f"IVF{nlist},PQ{pq_m}"
+        storage = "pq"
+    elif index_type == "flat":
+        params = {}
+        factory = encoding
+    else:
+        raise ValueError(f"Unknown index type: {index_type}")
+    
+    return {
+        "index_type": index_type,
+        "factory": factory,
+        "storage": storage,
+        "params": params,
+        "dimension": dimension,
+        "count": count
+    }
+
+
+def build_index(vectors: np.ndarray, spec: Dict, ids: Optional[np.ndarray] = None):
+    import faiss
+    
+    if spec["index_type"] == "binary":
+        index = faiss.IndexBinaryFlat(spec["dimension"])
+        if ids is not None:
+            index = faiss.IndexBinaryIDMap2(index)
+        add_to_index(index, spec, vectors, ids)
+        return index
+    
+    index = faiss.index_factory(
+        spec["dimension"],
+        spec["factory"],
+        faiss.METRIC_INNER_PRODUCT
+    )
+    
+    if spec["index_type"] == "hnsw":
+        index.hnsw.efConstruction = spec["params"]["ef_construction"]
+        index.hnsw.efSearch = spec["params"]["ef_search"]
+    
+    if not index.is_trained:
+        index.train(vectors)
+    
+    if ids is not None:
+        index = faiss.IndexIDMap2(index)
+    add_to_index(index, spec, vectors, ids)
+    
+    return index
+
+
+def add_to_index(index, spec: Dict, vectors: np.ndarray, ids: Optional[np.ndarray] = None):
+    if spec["index_type"] == "binary":
+        vectors = binary_codes(vectors)
+    
+    if hasattr(index, "id_map"):
+        index.add_with_ids(vectors, ids)
+    else:
+        # Indexes without an ID map use row positions as chunk IDs.
+        index.add(vectors)
+
+
+def search_index(
+    index,
+    spec: Dict,
+    queries: np.ndarray,
+    top_k: int,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+    fetch_vectors: Optional[Callable[[np.ndarray], np.ndarray]] = None,
+    selector=None,
+    allowed: Optional[np.ndarray] = None,
+    removed: Optional[np.ndarray] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    # `allowed` and `removed` describe the selector as ID arrays, for indexes
+    # that can't take one.
+    if selector is not None and not supports_selector(spec):
+        return search_filtered(index, queries, top_k, allowed, removed)
+    
+    if spec["index_type"] == "binary":
+        import faiss
+        
+        params = faiss.SearchParameters(sel=selector) if selector is not None else None
+        shortlist = min(top_k * spec["params"]["rescore_factor"], index.ntotal)
+        _, candidates = index.search(binary_codes(queries), shortlist, params=params)
+        return rescore(queries, candidates, fetch_vectors, top_k)
+    
+    params = search_parameters(spec, top_k, nprobe, ef_search, selector)
+    return index.search(queries, top_k, params=params)
+
+
+def supports_selector(spec: Dict) -> bool:
+    # A flat IndexPQ rejects search parameters of any kind.
+    return not (spec["index_type"] == "flat" and spec["storage"] == "pq")
+
+
+def search_filtered(
+    index,
+    queries: np.ndarray,
+    top_k: int,
+    allowed: Optional[np.ndarray] = None,
+    removed: Optional[np.ndarray] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    # Widening the search by the number of rejected IDs and dropping them
+    # afterwards gives the same hits a selector would.
+    if allowed is not None:
+        rejected = index.ntotal - len(allowed)
+    else:
+        rejected = len(removed) if removed is not None else 0
+    
+    k = min(top_k + rejected, index.ntotal)
+    scores, ids = index.search(queries, k)
+    
+    keep = ids >= 0
+    if allowed is not None:
+        keep &= np.isin(ids, allowed)
+    elif removed is not None:
+        keep &= ~np.isin(ids, removed)
+    
+    # Kept hits move to the front of each row in score order.
+    order = np.argsort(~keep, axis=1, kind="stable")[:, :top_k]
+    kept = np.take_along_axis(keep, order, axis=1)
+    scores = np.where(kept, np.take_along_axis(scores, order, axis=1), -np.inf).astype('float32')
+    ids = np.where(kept, np.take_along_axis(ids, order, axis=1), -1)
+    return scores, ids
+
+
+def binary_codes(vectors: np.ndarray) -> np.ndarray:
+    return np.packbits(vectors > 0, axis=1)
+
+
+def rescore(
+    queries: np.ndarray,
+    candidates: np.ndarray,
+    fetch_vectors: Callable[[np.ndarray], np.ndarray],
+    top_k: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    valid = candidates >= 0
+    ids = np.where(valid, candidates, candidates[valid].min(initial=0))
+    
+    # Only the shortlisted rows of the (memory-mapped) float vectors are read.
+    unique_ids, inverse = np.unique(ids, return_inverse=True)
+    candidate_vectors = np.asarray(fetch_vectors(unique_ids), dtype='float32')
+    scores = np.einsum(
+        'qsd,qd->qs',
+        candidate_vectors[inverse.reshape(ids.shape)],
+        queries
+    )
+    scores[~valid] = -np.inf
+    
+    k = min(top_k, scores.shape[1])
+    order = np.argsort(-scores, axis=1)[:, :k]
+    top_scores = np.take_along_axis(scores, order, axis=1)
+    top_ids = np.take_along_axis(candidates, order, axis=1)
+    top_ids[np.isneginf(top_scores)] = -1
+    
+    return top_scores.astype('float32'), top_ids
+
+
+def search_parameters(
+    spec: Dict,
+    top_k: int,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+    selector=None
+):
+    import faiss
+    
+    if spec["index_type"] == "hnsw":
+        ef = ef_search or spec["params"]["ef_search"]
+        return faiss.SearchParametersHNSW(efSearch=max(ef, top_k), sel=selector)
+    
+    if spec["index_type"] == "ivfpq":
+        probes = nprobe or spec["params"]["nprobe"]
+        return faiss.SearchParametersIVF(
+            nprobe=min(probes, spec["params"]["nlist"]),
+            sel=selector
+        )
+    
+    if selector is not None:
+        return faiss.SearchParameters(sel=selector)
+    
+    return None
+
+
+def _pq_subquantizers(dimension: int) -> int:
+    if settings.FAISS_PQ_SUBQUANTIZERS:
+        return settings.FAISS_PQ_SUBQUANTIZERS
+    
+    for m in (dimension // 8, dimension // 4, dimension // 2):
+        if m and dimension % m == 0:
+            return m
+    return dimension
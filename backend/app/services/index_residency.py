@@ -0,0 +1,103 @@
+from collections import OrderedDict
+from typing import Dict, List
+
+
+class IndexResidency:
+    def __init__(self, max_bytes: int = 0, policy: str = "lru"):
+        if policy not in ("lru", "lfu"):
+            raise ValueError(f"Unknown eviction policy: {policy}")
+        
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.entries: "OrderedDict[str, int]" = OrderedDict()
+        self.frequencies: Dict[str, int] = {}
+        # Keys being written to; they are never chosen for eviction.
+        self.pinned: Dict[str, int] = {}
+        self.resident_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def __contains__(self, key: str) -> bool:
+        return key in self.entries
+    
+    def __len__(self) -> int:
+        return len(self.entries)
+    
+    def hit(self, key: str):
+        self.hits += 1
+        self._touch(key)
+    
+    def miss(self, key: str):
+        self.misses += 1
+    
+    def admit(self, key: str, nbytes: int) -> List[str]:
+        if key in self.entries:
+            self.resident_bytes -= self.entries.pop(key)
+        
+        self.entries[key] = nbytes
+        self.resident_bytes += nbytes
+        self.frequencies[key] = self.frequencies.get(key, 0) + 1
+        
+        return self._evict(protect=key)
+    
+    def pin(self, key: str):
+        self.pinned[key] = self.pinned.get(key, 0) + 1
+    
+    def unpin(self, key: str):
+        count = self.pinned.get(key, 0) - 1
+        if count > 0:
+            self.pinned[key] = count
+        else:
+            self.pinned.pop(key, None)
+    
+    def discard(self, key: str):
+        if key in self.entries:
+            self.resident_bytes -= self.entries.pop(key)
+        self.frequencies.pop(key, None)
+    
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "policy": self.policy,
+            "max_bytes": self.max_bytes,
+            "resident_bytes": self.resident_bytes,
+            "resident_indexes": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0
+        }
+    
+    def _touch(self, key: str):
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.frequencies[key] = self.frequencies.get(key, 0) + 1
+    
+    def _evict(self, protect: str) -> List[str]:
+        evicted = []
+        if self.max_bytes <= 0:
+            return evicted
+        
+        # The entry that was just admitted always stays, even if it alone
+        # exceeds the budget, so the caller can still serve it.
+        while self.resident_bytes > self.max_bytes:
+            candidates = [
+                key for key in self.entries
+                if key != protect and key not in self.pinned
+            ]
+            if not candidates:
+                break
+            victim = self._select_victim(candidates)
+            self.resident_bytes -= self.entries.pop(victim)
+            self.frequencies.pop(victim, None)
+            self.evictions += 1
+            evicted.append(victim)
+        
+        return evicted
+    
+    def _select_victim(self, candidates: List[str]) -> str:
+        if self.policy == "lfu":
+            # Entries are kept in recency order, so ties fall back to LRU.
+            return min(candidates, key=lambda key: self.frequencies.get(key, 0))
+        return candidates[0]
@@ -0,0 +1,185 @@
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+from app.config import get_settings
+
+settings = get_settings()
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-_./][a-z0-9]+)*")
+MAX_TERM_FREQUENCY = np.iinfo(np.uint16).max
+
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        tokens.append(token)
+        # Identifiers such as "AB-1234" also match on their parts.
+        if not token.isalnum():
+            tokens.extend(re.findall(r"[a-z0-9]+", token))
+    return tokens
+
+
+# One inverted index per chunk segment, with postings in CSR form: the
+# postings of term row t are rows[indptr[t]:indptr[t + 1]].
+class LexicalIndex:
+    def __init__(
+        self,
+        terms: Dict[str, int],
+        indptr: np.ndarray,
+        rows: np.ndarray,
+        frequencies: np.ndarray,
+        lengths: np.ndarray,
+        chunk_ids: np.ndarray
+    ):
+        self.terms = terms
+        self.indptr = indptr
+        self.rows = rows
+        self.frequencies = frequencies
+        self.lengths = lengths
+        self.chunk_ids = chunk_ids
+    
+    def __len__(self) -> int:
+        return len(self.lengths)
+    
+    def postings(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        row = self.terms.get(term)
+        if row is None:
+            return self.rows[:0], self.frequencies[:0]
+        start, end = self.indptr[row], self.indptr[row + 1]
+        return self.rows[start:end], self.frequencies[start:end]
+    
+    @property
+    def nbytes(self) -> int:
+        arrays = (self.indptr, self.rows, self.frequencies, self.lengths, self.chunk_ids)
+        # Rough allowance for the term dictionary.
+        return sum(array.nbytes for array in arrays) + 100 * len(self.terms)
+    
+    @classmethod
+    def build(cls, texts: List[str], chunk_ids: np.ndarray) -> "LexicalIndex":
+        vocabulary: Dict[str, int] = {}
+        term_rows = []
+        doc_rows = []
+        lengths = np.zeros(len(texts), dtype=np.int32)
+        
+        for position, text in enumerate(texts):
+            tokens = tokenize(text)
+            lengths[position] = len(tokens)
+            for token in tokens:
+                term_rows.append(vocabulary.setdefault(token, len(vocabulary)))
+                doc_rows.append(position)
+        
+        # Count (term, chunk) pairs, then lay postings out term by term.
+        stride = max(len(texts), 1)
+        pairs = np.asarray(term_rows, dtype=np.int64) * stride + np.asarray(doc_rows, dtype=np.int64)
+        pairs, counts = np.unique(pairs, return_counts=True)
+        pair_terms = pairs // stride
+        
+        indptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(pair_terms, minlength=len(vocabulary)), out=indptr[1:])
+        
+        return cls(
+            terms=vocabulary,
+            indptr=indptr,
+            rows=(pairs % stride).astype(np.int32),
+            frequencies=np.minimum(counts, MAX_TERM_FREQUENCY).astype(np.uint16),
+            lengths=lengths,
+            chunk_ids=np.asarray(chunk_ids, dtype=np.int64)
+        )
+    
+    @classmethod
+    def load(cls, path: str) -> "LexicalIndex":
+        with np.load(path, allow_pickle=False) as data:
+            blob = data["term_blob"].tobytes()
+            offsets = data["term_offsets"]
+            terms = {
+                blob[offsets[row]:offsets[row + 1]].decode("utf-8"): row
+                for row in range(len(offsets) - 1)
+            }
+            return cls(
+                terms=terms,
+                indptr=data["indptr"],
+                rows=data["rows"],
+                frequencies=data["frequencies"],
+                lengths=data["lengths"],
+                chunk_ids=data["chunk_ids"]
+            )
+    
+    def save(self, path: str):
+        ordered = sorted(self.terms, key=self.terms.get)
+        encoded = [term.encode("utf-8") for term in ordered]
+        term_offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(term) for term in encoded], out=term_offsets[1:])
+        
+        with open(f"{path}.tmp", 'wb') as f:
+            np.savez(
+                f,
+                term_blob=np.frombuffer(b"".join(encoded), dtype=np.uint8),
+                term_offsets=term_offsets,
+                indptr=self.indptr,
+                rows=self.rows,
+                frequencies=self.frequencies,
+                lengths=self.lengths,
+                chunk_ids=self.chunk_ids
+            )
+        os.replace(f"{path}.tmp", path)
+
+
+# BM25 over a base segment plus appended deltas, scored as one corpus.
+class LexicalSegments:
+    def __init__(self, segments: Optional[List[LexicalIndex]] = None):
+        self.segments = list(segments or [])
+    
+    def append(self, segment: LexicalIndex):
+        self.segments.append(segment)
+    
+    @property
+    def nbytes(self) -> int:
+        return sum(segment.nbytes for segment in self.segments)
+    
+    def search(
+        self,
+        query: str,
+        top_k: int,
+        excluded: Optional[np.ndarray] = None,
+        allowed: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        terms = list(dict.fromkeys(tokenize(query)))
+        total = sum(len(segment) for segment in self.segments)
+        if not terms or not total:
+            return np.zeros(0, dtype='float32'), np.zeros(0, dtype=np.int64)
+        
+        k1 = settings.BM25_K1
+        b = settings.BM25_B
+        average_length = max(sum(int(segment.lengths.sum()) for segment in self.segments) / total, 1.0)
+        
+        postings = [[segment.postings(term) for term in terms] for segment in self.segments]
+        frequencies = np.array([
+            sum(len(postings[s][t][0]) for s in range(len(self.segments)))
+            for t in range(len(terms))
+        ])
+        idf = np.log1p((total - frequencies + 0.5) / (frequencies + 0.5))
+        
+        scores = []
+        for segment, segment_postings in zip(self.segments, postings):
+            segment_scores = np.zeros(len(segment), dtype=np.float32)
+            norms = k1 * (1 - b + b * segment.lengths / average_length)
+            for weight, (rows, tf) in zip(idf, segment_postings):
+                tf = tf.astype(np.float32)
+                segment_scores[rows] += weight * tf * (k1 + 1) / (tf + norms[rows])
+            scores.append(segment_scores)
+        
+        scores = np.concatenate(scores)
+        ids = np.concatenate([segment.chunk_ids for segment in self.segments])
+        if excluded is not None and len(excluded):
+            scores[np.isin(ids, excluded)] = 0
+        if allowed is not None:
+            scores[~np.isin(ids, allowed)] = 0
+        
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > top_k:
+            candidates = candidates[np.argpartition(-scores[candidates], top_k - 1)[:top_k]]
+        order = candidates[np.argsort(-scores[candidates], kind="stable")]
+        
+        return scores[order], ids[order]
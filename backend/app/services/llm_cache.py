@@ -0,0 +1,77 @@
+import hashlib
+import json
+import zlib
+from typing import Dict, Optional
+
+from app.config import get_settings
+from app.db.redis import cache_get_many_bytes, cache_set_many_bytes
+
+settings = get_settings()
+
+
+class LLMResponseCache:
+    def __init__(self, ttl_seconds: int, compression_level: int = 6):
+        self.ttl_seconds = ttl_seconds
+        self.compression_level = compression_level
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.saved_llm_seconds = 0.0
+        self.bytes_stored = 0
+        self.bytes_uncompressed = 0
+    
+    def key(self, model: str, prompt: str, parameters: Dict, scope: Optional[str] = None) -> str:
+        digest = hashlib.sha256(
+            json.dumps([model, prompt, parameters], sort_keys=True).encode("utf-8")
+        ).hexdigest()
+        # The scope carries the index version, so a rebuilt index never
+        # matches entries written against the old one.
+        return f"llm:{scope}:{digest}" if scope else f"llm:{digest}"
+    
+    async def get(self, key: str) -> Optional[str]:
+        try:
+            packed = (await cache_get_many_bytes([key]))[0]
+        except Exception as e:
+            print(f"LLM cache read failed: {e}")
+            packed = None
+        
+        if packed is None:
+            self.misses += 1
+            return None
+        
+        entry = json.loads(zlib.decompress(packed))
+        self.hits += 1
+        self.saved_llm_seconds += entry["seconds"]
+        return entry["text"]
+    
+    async def put(self, key: str, text: str, seconds: float):
+        raw = json.dumps({"text": text, "seconds": seconds}).encode("utf-8")
+        packed = zlib.compress(raw, self.compression_level)
+        try:
+            stored = await cache_set_many_bytes({key: packed}, expire_seconds=self.ttl_seconds)
+        except Exception as e:
+            print(f"LLM cache write failed: {e}")
+            return
+        if not stored:
+            return
+        
+        self.stores += 1
+        self.bytes_stored += len(packed)
+        self.bytes_uncompressed += len(raw)
+    
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "stores": self.stores,
+            "saved_llm_seconds": round(self.saved_llm_seconds, 3),
+            "compression_ratio": self.bytes_stored / self.bytes_uncompressed if self.bytes_uncompressed else 0.0
+        }
+
+
+llm_cache = LLMResponseCache(
+    ttl_seconds=settings.LLM_CACHE_TTL_SECONDS,
+    compression_level=settings.LLM_CACHE_COMPRESSION_LEVEL
+)
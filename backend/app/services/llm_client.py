@@ -0,0 +1,93 @@
+import asyncio
+import importlib.util
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+import httpx
+
+from app.config import get_settings
+
+settings = get_settings()
+
+
+class LLMClient:
+    client: Optional[httpx.AsyncClient] = None
+    loop: Optional[asyncio.AbstractEventLoop] = None
+    requests = 0
+
+
+llm_client = LLMClient()
+
+
+def http2_available() -> bool:
+    return importlib.util.find_spec("h2") is not None
+
+
+async def _count_request(request: httpx.Request):
+    llm_client.requests += 1
+
+
+def create_llm_client(**overrides) -> httpx.AsyncClient:
+    options = dict(
+        http2=settings.LLM_HTTP2 and http2_available(),
+        limits=httpx.Limits(
+            max_connections=settings.LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY
+        ),
+        timeout=httpx.Timeout(
+            settings.LLM_READ_TIMEOUT,
+            connect=settings.LLM_CONNECT_TIMEOUT,
+            pool=settings.LLM_POOL_TIMEOUT
+        ),
+        event_hooks={"request": [_count_request]}
+    )
+    options.update(overrides)
+    return httpx.AsyncClient(**options)
+
+
+async def open_llm_client():
+    llm_client.client = create_llm_client()
+    llm_client.loop = asyncio.get_running_loop()
+
+
+async def close_llm_client():
+    if llm_client.client:
+        await llm_client.client.aclose()
+        llm_client.client = None
+        llm_client.loop = None
+
+
+@asynccontextmanager
+async def get_llm_client() -> AsyncIterator[httpx.AsyncClient]:
+    # Pooled connections belong to the app's event loop; callers on another
+    # loop, or before startup, get a client of their own.
+    shared = llm_client.client
+    if shared is not None and asyncio.get_running_loop() is llm_client.loop:
+        yield shared
+        return
+    
+    async with create_llm_client() as client:
+        yield client
+
+
+def llm_client_stats() -> Dict:
+    client = llm_client.client
+    stats = {
+        "open": client is not None,
+        "http2": settings.LLM_HTTP2 and http2_available(),
+        "max_connections": settings.LLM_MAX_CONNECTIONS,
+        "requests": llm_client.requests
+    }
+    
+    # httpx exposes no pool counters, so they are read off httpcore's pool.
+    pool = getattr(getattr(client, "_transport", None), "_pool", None)
+    if pool is not None:
+        connections = list(pool.connections)
+        idle = sum(1 for connection in connections if connection.is_idle())
+        stats.update(
+            connections=len(connections),
+            active=len(connections) - idle,
+            idle=idle,
+            queued=sum(1 for request in getattr(pool, "_requests", []) if request.is_queued())
+        )
+    return stats
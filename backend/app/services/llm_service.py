@@ -1,16 +1,45 @@
+import json
+import time
 from typing import List, Dict, AsyncGenerator, Optional
-import httpx
 
 from app.config import get_settings
+from app.services.context_packer import context_packer
+from app.services.llm_cache import llm_cache
+from app.services.llm_client import get_llm_client
+from app.utils.executors import get_executor
 
 settings = get_settings()
 
 
 class LLMService:
-    def __init__(self):
+    def __init__(self, cache_scope: Optional[str] = None, allow_cached: bool = False):
         self.api_key = settings.HUGGINGFACE_API_KEY
         self.model = settings.HUGGINGFACE_MODEL
-        self.api_url = f"https://api-inference.huggingface.co/models/{self.model}"
+        self.api_url = f"{settings.HUGGINGFACE_API_URL.rstrip('/')}/{self.model}"
+        # Identifies the indexed content behind a prompt, e.g. the
+        # document's index version, for the response cache.
+        self.cache_scope = cache_scope
+        self.allow_cached = allow_cached
+        # Set when the last answer came from the fallback, not the model.
+        self.used_fallback = False
+        self.cache_hit = False
+    
+    def _cache_key(self, prompt: str, parameters: Dict) -> Optional[str]:
+        if not settings.LLM_CACHE_ENABLED:
+            return None
+        # Sampled output differs from run to run, so replaying one is
+        # something the caller has to ask for.
+        if parameters.get("do_sample") and not self.allow_cached:
+            return None
+        return llm_cache.key(self.model, prompt, parameters, self.cache_scope)
+    
+    async def _cached_response(self, key: Optional[str]) -> Optional[str]:
+        self.cache_hit = False
+        if key is None:
+            return None
+        text = await llm_cache.get(key)
+        self.cache_hit = text is not None
+        return text
     
     def _get_headers(self) -> Dict:
         return {
@@ -26,7 +55,7 @@ class LLMService:
     ) -> str:
         context_text = "\n\n".join([
             f"[Source {i+1}]: {chunk['text']}"
-            for i, chunk in enumerate(context_chunks[:5])
+            for i, chunk in enumerate(context_packer.pack(context_chunks))
         ])
         
         if document_type in ["audio", "video"]:
@@ -53,23 +82,31 @@ Answer: """
         context_chunks: List[Dict],
         document_type: str = "pdf"
     ) -> tuple[str, List[Dict]]:
-        prompt = self._build_prompt(question, context_chunks, document_type)
+        # Packing runs the tokenizer, so it stays off the event loop.
+        prompt = await get_executor("interactive").run(
+            self._build_prompt, question, context_chunks, document_type
+        )
+        self.used_fallback = False
+        parameters = {
+            "max_new_tokens": 500,
+            "temperature": 0.7,
+            "top_p": 0.9,
+            "do_sample": True,
+            "return_full_text": False
+        }
         
-        async with httpx.AsyncClient(timeout=60.0) as client:
+        cache_key = self._cache_key(prompt, parameters)
+        cached = await self._cached_response(cache_key)
+        if cached is not None:
+            return cached, self.build_sources(context_chunks)
+        
+        started = time.perf_counter()
+        async with get_llm_client() as client:
             try:
                 response = await client.post(
                     self.api_url,
                     headers=self._get_headers(),
-                    json={
-                        "inputs": prompt,
-                        "parameters": {
-                            "max_new_tokens": 500,
-                            "temperature": 0.7,
-                            "top_p": 0.9,
-                            "do_sample": True,
-                            "return_full_text": False
-                        }
-                    }
+                    json={"inputs": prompt, "parameters": parameters}
                 )
                 
                 if response.status_code == 200:
@@ -79,13 +116,21 @@ Answer: """
                     else:
                         generated_text = str(result)
                 else:
+                    self.used_fallback = True
                     generated_text = self._generate_fallback_response(question, context_chunks)
             
             except Exception as e:
                 print(f"LLM API error: {e}")
+                self.used_fallback = True
                 generated_text = self._generate_fallback_response(question, context_chunks)
         
-        sources = [
+        if cache_key and not self.used_fallback:
+            await llm_cache.put(cache_key, generated_text.strip(), time.perf_counter() - started)
+        
+        return generated_text.strip(), self.build_sources(context_chunks)
+    
+    def build_sources(self, context_chunks: List[Dict]) -> List[Dict]:
+        return [
             {
                 "text": chunk["text"][:200] + "..." if len(chunk["text"]) > 200 else chunk["text"],
                 "score": chunk.get("score", 0),
@@ -94,8 +139,6 @@ Answer: """
             }
             for chunk in context_chunks[:3]
         ]
-        
-        return generated_text.strip(), sources
     
     async def generate_response_stream(
         self,
@@ -103,40 +146,80 @@ Answer: """
         context_chunks: List[Dict],
         document_type: str = "pdf"
     ) -> AsyncGenerator[str, None]:
-        prompt = self._build_prompt(question, context_chunks, document_type)
+        # Packing runs the tokenizer, so it stays off the event loop.
+        prompt = await get_executor("interactive").run(
+            self._build_prompt, question, context_chunks, document_type
+        )
+        self.used_fallback = False
+        parameters = {
+            "max_new_tokens": 500,
+            "temperature": 0.7,
+            "top_p": 0.9,
+            "do_sample": True,
+            "return_full_text": False
+        }
+        
+        cache_key = self._cache_key(prompt, parameters)
+        cached = await self._cached_response(cache_key)
+        if cached is not None:
+            yield cached
+            return
+        
+        started = time.perf_counter()
+        streamed = []
         
         try:
-            async with httpx.AsyncClient(timeout=60.0) as client:
-                response = await client.post(
+            async with get_llm_client() as client:
+                # Closing this response when the consumer goes away drops the
+                # connection, which stops generation on the backend.
+                async with client.stream(
+                    "POST",
                     self.api_url,
                     headers=self._get_headers(),
-                    json={
-                        "inputs": prompt,
-                        "parameters": {
-                            "max_new_tokens": 500,
-                            "temperature": 0.7,
-                            "top_p": 0.9,
-                            "do_sample": True,
-                            "return_full_text": False
-                        }
-                    }
-                )
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    if isinstance(result, list) and len(result) > 0:
-                        text = result[0].get("generated_text", "")
-                    else:
-                        text = str(result)
-                else:
-                    text = self._generate_fallback_response(question, context_chunks)
+                    json={"inputs": prompt, "parameters": parameters, "stream": True}
+                ) as response:
+                    if response.status_code == 200:
+                        async for token in self._stream_tokens(response):
+                            # Leading whitespace is dropped, as in generate_response.
+                            token = token if streamed else token.lstrip()
+                            if token:
+                                streamed.append(token)
+                                yield token
+                        if streamed:
+                            # Only reached when the consumer read to the end.
+                            if cache_key:
+                                await llm_cache.put(
+                                    cache_key, "".join(streamed).strip(), time.perf_counter() - started
+                                )
+                            return
         except Exception as e:
             print(f"LLM API error: {e}")
-            text = self._generate_fallback_response(question, context_chunks)
         
-        words = text.split()
-        for i, word in enumerate(words):
-            yield word + (" " if i < len(words) - 1 else "")
+        # Tokens already sent can't be taken back, so the fallback only
+        # answers when the backend produced nothing.
+        self.used_fallback = True
+        if not streamed:
+            yield self._generate_fallback_response(question, context_chunks)
+    
+    async def _stream_tokens(self, response) -> AsyncGenerator[str, None]:
+        # Endpoints without streaming support answer with the usual JSON.
+        if not response.headers.get("content-type", "").startswith("text/event-stream"):
+            result = json.loads(await response.aread())
+            if isinstance(result, list) and len(result) > 0:
+                yield result[0].get("generated_text", "")
+            return
+        
+        # TGI sends one server-sent event per token and an error event if
+        # generation fails part way.
+        async for line in response.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            event = json.loads(line[len("data:"):])
+            if "error" in event:
+                raise RuntimeError(event["error"])
+            token = event.get("token") or {}
+            if not token.get("special"):
+                yield token.get("text", "")
     
     async def generate_summary(
         self,
@@ -153,27 +236,35 @@ Document:
 
 Summary:"""
         
-        async with httpx.AsyncClient(timeout=60.0) as client:
+        parameters = {
+            "max_new_tokens": max_length,
+            "temperature": 0.5,
+            "top_p": 0.9,
+            "do_sample": True,
+            "return_full_text": False
+        }
+        
+        cache_key = self._cache_key(prompt, parameters)
+        cached = await self._cached_response(cache_key)
+        if cached is not None:
+            return cached
+        
+        started = time.perf_counter()
+        async with get_llm_client() as client:
             try:
                 response = await client.post(
                     self.api_url,
                     headers=self._get_headers(),
-                    json={
-                        "inputs": prompt,
-                        "parameters": {
-                            "max_new_tokens": max_length,
-                            "temperature": 0.5,
-                            "top_p": 0.9,
-                            "do_sample": True,
-                            "return_full_text": False
-                        }
-                    }
+                    json={"inputs": prompt, "parameters": parameters}
                 )
                 
                 if response.status_code == 200:
                     result = response.json()
                     if isinstance(result, list) and len(result) > 0:
-                        return result[0].get("generated_text", "").strip()
+                        summary = result[0].get("generated_text", "").strip()
+                        if cache_key:
+                            await llm_cache.put(cache_key, summary, time.perf_counter() - started)
+                        return summary
                 
                 return self._simple_summary(text, max_length)
             
@@ -1,17 +1,16 @@
 import os
+from bisect import bisect_right
 from typing import Dict, List
 
 from app.config import get_settings
+from app.utils.executors import get_executor
 
 settings = get_settings()
 
 
 class PDFProcessor:
     async def extract_text(self, file_path: str) -> Dict:
-        import asyncio
-        
-        loop = asyncio.get_event_loop()
-        result = await loop.run_in_executor(None, self._extract_sync, file_path)
+        result = await get_executor("extraction").run(self._extract_sync, file_path)
         return result
     
     def _extract_sync(self, file_path: str) -> Dict:
@@ -111,7 +110,7 @@ class PDFProcessor:
         overlap = overlap or settings.CHUNK_OVERLAP
         
         if len(text) <= chunk_size:
-            return [{"text": text, "start": 0, "end": len(text)}]
+            return [{"text": text, "start": 0, "end": len(text), "index": 0}]
         
         chunks = []
         start = 0
@@ -142,3 +141,26 @@ class PDFProcessor:
                 break
         
         return chunks
+    
+    def assign_pages(self, chunks: List[Dict], text: str, pages: List[Dict]) -> List[Dict]:
+        if not pages:
+            return chunks
+        
+        # The extracted text is the pages joined by blank lines, possibly
+        # with leading whitespace stripped.
+        joined = "\n\n".join(page["text"] for page in pages)
+        leading = max(joined.find(text), 0) if text else 0
+        
+        page_starts = []
+        offset = -leading
+        for page in pages:
+            page_starts.append(offset)
+            offset += len(page["text"]) + 2
+        
+        for chunk in chunks:
+            start = chunk.get("start", 0)
+            end = max(chunk.get("end", start) - 1, start)
+            chunk["page_start"] = pages[max(bisect_right(page_starts, start) - 1, 0)]["page_number"]
+            chunk["page_end"] = pages[max(bisect_right(page_starts, end) - 1, 0)]["page_number"]
+        
+        return chunks
@@ -1,41 +1,193 @@
-from typing import List, Dict
+import asyncio
+import heapq
+import itertools
+import time
+from typing import Awaitable, Callable, List, Dict, Optional, Tuple
+import numpy as np
+from app.config import get_settings
 from app.services.embedding import EmbeddingService
+from app.services.reranker import reranker
+from app.services.topic_index import topic_index
 from app.services.vector_store import vector_store
 
+settings = get_settings()
+
+RETRIEVAL_MODES = ("dense", "lexical", "hybrid")
+
 
 class RAGPipeline:
     def __init__(self):
         self.embedding_service = EmbeddingService()
+        self._query_embeddings: Dict[str, np.ndarray] = {}
+        # Milliseconds spent per stage of the request this pipeline serves.
+        self.timings: Dict[str, float] = {}
+        self.rerank_fallback = False
+    
+    async def embed_query(self, query: str) -> np.ndarray:
+        # A pipeline serves one request, so retrieval and timestamp ranking
+        # share a single embedding of the question.
+        if query not in self._query_embeddings:
+            started = time.perf_counter()
+            self._query_embeddings[query] = await self.embedding_service.embed_text(query)
+            self.record_timing("embed", started)
+        return self._query_embeddings[query]
+    
+    def record_timing(self, stage: str, started: float):
+        elapsed = 1000 * (time.perf_counter() - started)
+        self.timings[stage] = self.timings.get(stage, 0.0) + elapsed
+    
+    def server_timing(self) -> str:
+        return ", ".join(f"{stage};dur={ms:.1f}" for stage, ms in self.timings.items())
     
     async def retrieve_context(
         self,
         document_id: str,
         query: str,
-        top_k: int = 5
+        top_k: int = 5,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        retrieval_mode: Optional[str] = None,
+        filters: Optional[Dict[str, Tuple[Optional[float], Optional[float]]]] = None,
+        user_id: Optional[str] = None,
+        rerank: Optional[bool] = None
     ) -> List[Dict]:
-        query_embedding = await self.embedding_service.embed_text(query)
+        mode = self._retrieval_mode(retrieval_mode)
+        use_rerank = settings.RERANK_ENABLED if rerank is None else rerank
+        candidates = max(top_k, settings.RERANK_CANDIDATES) if use_rerank else top_k
+        
+        query_embedding = None
+        if mode != "lexical":
+            query_embedding = await self.embed_query(query)
+        
+        started = time.perf_counter()
+        chunks = await self._retrieve(
+            document_id, query, query_embedding, mode, candidates,
+            nprobe, ef_search, filters, user_id
+        )
+        self.record_timing("search", started)
+        
+        if use_rerank:
+            started = time.perf_counter()
+            chunks, self.rerank_fallback = await reranker.rerank(query, chunks, top_k)
+            self.record_timing("rerank", started)
+        
+        return chunks
+    
+    async def retrieve_context_many(
+        self,
+        document_ids: List[str],
+        query: str,
+        top_k: int = 5,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        retrieval_mode: Optional[str] = None,
+        filters: Optional[Dict[str, Tuple[Optional[float], Optional[float]]]] = None,
+        user_id: Optional[str] = None
+    ) -> List[Dict]:
+        mode = self._retrieval_mode(retrieval_mode)
+        query_embedding = None
+        if mode != "lexical":
+            query_embedding = await self.embed_query(query)
+        
+        semaphore = asyncio.Semaphore(settings.MULTI_DOC_SEARCH_CONCURRENCY)
+        
+        async def search_document(document_id: str) -> List[Dict]:
+            async with semaphore:
+                results = await self._retrieve(
+                    document_id, query, query_embedding, mode, top_k,
+                    nprobe, ef_search, filters, user_id
+                )
+            return [dict(chunk, document_id=document_id) for chunk in results]
+        
+        rankings = await asyncio.gather(*[
+            search_document(document_id) for document_id in document_ids
+        ])
         
-        results = await vector_store.search(
+        # Each ranking is already sorted, so a heap merge only touches the
+        # heads of the lists until the global top-k is filled.
+        merged = heapq.merge(*rankings, key=lambda chunk: -chunk["score"])
+        return list(itertools.islice(merged, top_k))
+    
+    def _retrieval_mode(self, retrieval_mode: Optional[str]) -> str:
+        mode = retrieval_mode or settings.RETRIEVAL_MODE
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode: {mode}")
+        return mode
+    
+    async def _retrieve(
+        self,
+        document_id: str,
+        query: str,
+        query_embedding: Optional[np.ndarray],
+        mode: str,
+        top_k: int,
+        nprobe: Optional[int],
+        ef_search: Optional[int],
+        filters: Optional[Dict[str, Tuple[Optional[float], Optional[float]]]],
+        user_id: Optional[str]
+    ) -> List[Dict]:
+        if mode == "lexical":
+            return await vector_store.search_lexical(
+                document_id,
+                query,
+                top_k=top_k,
+                filters=filters,
+                user_id=user_id
+            )
+        
+        if mode == "dense":
+            return await vector_store.search(
+                document_id=document_id,
+                query_embedding=query_embedding,
+                top_k=top_k,
+                nprobe=nprobe,
+                ef_search=ef_search,
+                filters=filters,
+                user_id=user_id
+            )
+        
+        candidates = top_k * settings.HYBRID_CANDIDATE_FACTOR
+        dense = await vector_store.search(
             document_id=document_id,
             query_embedding=query_embedding,
-            top_k=top_k
+            top_k=candidates,
+            nprobe=nprobe,
+            ef_search=ef_search,
+            filters=filters,
+            user_id=user_id
+        )
+        lexical = await vector_store.search_lexical(
+            document_id,
+            query,
+            top_k=candidates,
+            filters=filters,
+            user_id=user_id
         )
         
-        return results
+        return reciprocal_rank_fusion([dense, lexical], top_k)
     
     async def find_relevant_timestamps(
         self,
         query: str,
         timestamps: List[Dict],
-        top_k: int = 3
+        top_k: int = 3,
+        document_id: Optional[str] = None
     ) -> List[Dict]:
         if not timestamps:
             return []
         
-        query_embedding = await self.embedding_service.embed_text(query)
+        query_embedding = await self.embed_query(query)
+        
+        timestamp_embeddings = None
+        if document_id is not None:
+            timestamp_embeddings = await topic_index.load(document_id, len(timestamps))
         
-        timestamp_texts = [ts.get("text", "") for ts in timestamps]
-        timestamp_embeddings = await self.embedding_service.embed_texts(timestamp_texts)
+        if timestamp_embeddings is None:
+            timestamp_texts = [ts.get("text", "") for ts in timestamps]
+            timestamp_embeddings = await self.embedding_service.embed_texts(timestamp_texts)
+            # Recordings ingested before topics were indexed are backfilled.
+            if document_id is not None:
+                await topic_index.save(document_id, timestamp_embeddings)
         
         similarities = await self.embedding_service.compute_similarity(
             query_embedding,
@@ -56,16 +208,39 @@ class RAGPipeline:
         
         return scored_timestamps[:top_k]
     
+    async def index_topics(self, document_id: str, topics: List[Dict]):
+        if not topics:
+            return
+        
+        embeddings = await self.embedding_service.embed_texts(
+            [topic.get("text", "") for topic in topics]
+        )
+        await topic_index.save(document_id, embeddings)
+    
     async def index_document(
         self,
         document_id: str,
-        chunks: List[Dict]
+        chunks: List[Dict],
+        user_id: Optional[str] = None,
+        progress: Optional[Callable[[int, int], Awaitable[None]]] = None
     ):
         texts = [chunk["text"] for chunk in chunks]
-        embeddings = await self.embedding_service.embed_texts(texts)
+        embeddings = await self.embedding_service.embed_texts(texts, progress=progress)
         
         await vector_store.create_index(
             document_id=document_id,
             chunks=chunks,
-            embeddings=embeddings
+            embeddings=embeddings,
+            user_id=user_id
         )
+
+
+def reciprocal_rank_fusion(rankings: List[List[Dict]], top_k: int) -> List[Dict]:
+    # Rank-based fusion, so BM25 and cosine scores need no common scale.
+    fused: Dict[int, Dict] = {}
+    for ranking in rankings:
+        for rank, chunk in enumerate(ranking):
+            entry = fused.setdefault(chunk["chunk_id"], dict(chunk, score=0.0))
+            entry["score"] += 1.0 / (settings.HYBRID_RRF_K + rank + 1)
+    
+    return sorted(fused.values(), key=lambda chunk: chunk["score"], reverse=True)[:top_k]
@@ -0,0 +1,104 @@
+import asyncio
+import threading
+import time
+from typing import Dict, List, Tuple
+import numpy as np
+
+from app.config import get_settings
+from app.services.embedding import estimate_tokens, length_bucket_indices
+from app.utils.executors import get_executor
+
+settings = get_settings()
+
+
+class Reranker:
+    _model = None
+    _model_lock = threading.Lock()
+    
+    def __init__(self):
+        self.calls = 0
+        self.fallbacks = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+    
+    @classmethod
+    def get_model(cls):
+        with cls._model_lock:
+            if cls._model is None:
+                from sentence_transformers import CrossEncoder
+                cls._model = CrossEncoder(settings.RERANK_MODEL)
+        return cls._model
+    
+    async def rerank(self, query: str, chunks: List[Dict], top_k: int) -> Tuple[List[Dict], bool]:
+        # Returns the reordered top_k and whether the budget forced the
+        # dense order instead.
+        if len(chunks) <= 1:
+            return chunks[:top_k], False
+        
+        started = time.perf_counter()
+        deadline = started + settings.RERANK_BUDGET_MS / 1000
+        
+        texts = [chunk["text"] for chunk in chunks]
+        query_tokens = estimate_tokens(query)
+        lengths = [query_tokens + estimate_tokens(text) for text in texts]
+        scores = np.empty(len(chunks), dtype='float32')
+        
+        try:
+            buckets = length_bucket_indices(
+                lengths,
+                settings.RERANK_TOKEN_BUDGET,
+                settings.RERANK_MAX_BATCH
+            )
+            for bucket in buckets:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError()
+                # A timed-out batch keeps running, so the cross-encoder gets
+                # its own pool rather than holding interactive workers that
+                # query embeddings and searches are waiting for.
+                scores[bucket] = await asyncio.wait_for(
+                    get_executor("reranker").run(
+                        self._score_sync,
+                        [(query, texts[position]) for position in bucket]
+                    ),
+                    remaining
+                )
+        except asyncio.TimeoutError:
+            self._record(started, fallback=True)
+            return chunks[:top_k], True
+        except Exception as e:
+            # Reranking only refines the order, so a broken model must not
+            # fail the request.
+            print(f"Rerank failed: {e}")
+            self._record(started, fallback=True)
+            return chunks[:top_k], True
+        
+        self._record(started, fallback=False)
+        order = np.argsort(-scores, kind="stable")[:top_k]
+        return [dict(chunks[position], rerank_score=float(scores[position])) for position in order], False
+    
+    def stats(self) -> Dict:
+        return {
+            "calls": self.calls,
+            "fallbacks": self.fallbacks,
+            "average_ms": self.total_ms / self.calls if self.calls else 0.0,
+            "max_ms": self.max_ms
+        }
+    
+    def _record(self, started: float, fallback: bool):
+        elapsed = 1000 * (time.perf_counter() - started)
+        self.calls += 1
+        self.fallbacks += int(fallback)
+        self.total_ms += elapsed
+        self.max_ms = max(self.max_ms, elapsed)
+    
+    @classmethod
+    def _score_sync(cls, pairs: List[Tuple[str, str]]) -> np.ndarray:
+        model = cls.get_model()
+        return np.asarray(
+            model.predict(pairs, batch_size=len(pairs), show_progress_bar=False),
+            dtype='float32'
+        )
+
+
+reranker = Reranker()
@@ -0,0 +1,44 @@
+import os
+from typing import Optional
+import numpy as np
+
+from app.config import get_settings
+from app.utils.executors import get_executor
+
+settings = get_settings()
+
+
+# Topic embeddings for one recording, row-aligned with doc["timestamps"].
+# Recordings have at most a few hundred topics, so a flat matrix scanned
+# with one dot product is the whole index. Files sit next to the FAISS
+# index as {document_id}.topics.npy and are removed with it.
+class TopicIndex:
+    async def save(self, document_id: str, embeddings: np.ndarray):
+        await get_executor("index_io").run(self._save_sync, document_id, embeddings)
+    
+    async def load(self, document_id: str, count: int) -> Optional[np.ndarray]:
+        return await get_executor("index_io").run(self._load_sync, document_id, count)
+    
+    def _path(self, document_id: str) -> str:
+        return os.path.join(settings.FAISS_INDEX_PATH, f"{document_id}.topics.npy")
+    
+    def _save_sync(self, document_id: str, embeddings: np.ndarray):
+        path = self._path(document_id)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(f"{path}.tmp", 'wb') as f:
+            np.save(f, np.ascontiguousarray(embeddings, dtype='float32'))
+        os.replace(f"{path}.tmp", path)
+    
+    def _load_sync(self, document_id: str, count: int) -> Optional[np.ndarray]:
+        path = self._path(document_id)
+        if not os.path.exists(path):
+            return None
+        
+        embeddings = np.load(path, mmap_mode="r", allow_pickle=False)
+        # Stale if the topics were regenerated without re-embedding them.
+        if embeddings.ndim != 2 or embeddings.shape[0] != count:
+            return None
+        return embeddings
+
+
+topic_index = TopicIndex()
@@ -1,29 +1,36 @@
 import os
 import tempfile
+from bisect import bisect_left, bisect_right
 from typing import List, Dict, Optional
 import subprocess
+from functools import partial
 
 from app.config import get_settings
+from app.utils.executors import get_executor
 
 settings = get_settings()
 
 
 class TranscriptionService:
+    # Loaded models per process, so pool workers keep theirs between tasks.
+    _models: Dict[str, object] = {}
+    
     def __init__(self):
         self.model = None
         self.model_name = settings.WHISPER_MODEL
     
     def _load_model(self):
         if self.model is None:
-            import whisper
-            self.model = whisper.load_model(self.model_name)
+            model = self._models.get(self.model_name)
+            if model is None:
+                import whisper
+                model = whisper.load_model(self.model_name)
+                self._models[self.model_name] = model
+            self.model = model
         return self.model
     
     async def transcribe_audio(self, file_path: str) -> Dict:
-        import asyncio
-        
-        loop = asyncio.get_event_loop()
-        result = await loop.run_in_executor(None, self._transcribe_sync, file_path)
+        result = await get_executor("transcription").run(self._transcribe_sync, file_path)
         return result
     
     def _transcribe_sync(self, file_path: str) -> Dict:
@@ -63,8 +70,6 @@ class TranscriptionService:
                 os.remove(audio_path)
     
     async def _extract_audio(self, video_path: str) -> str:
-        import asyncio
-        
         temp_dir = tempfile.gettempdir()
         audio_path = os.path.join(temp_dir, f"audio_{os.path.basename(video_path)}.wav")
         
@@ -79,14 +84,41 @@ class TranscriptionService:
             audio_path
         ]
         
-        loop = asyncio.get_event_loop()
-        await loop.run_in_executor(
-            None,
-            lambda: subprocess.run(cmd, capture_output=True, check=True)
+        await get_executor("extraction").run(
+            partial(subprocess.run, cmd, capture_output=True, check=True)
         )
         
         return audio_path
     
+    def assign_times(self, chunks: List[Dict], text: str, segments: List[Dict]) -> List[Dict]:
+        # Segments are located in the transcript in order. A chunk spans from
+        # the first segment it overlaps to the last, so a time filter matches
+        # any chunk that covers part of the window.
+        located = []
+        cursor = 0
+        for segment in segments:
+            position = text.find(segment["text"], cursor) if segment["text"] else -1
+            if position < 0:
+                continue
+            cursor = position + len(segment["text"])
+            located.append((position, cursor, segment))
+        
+        if not located:
+            return chunks
+        
+        starts = [start for start, _, _ in located]
+        ends = [end for _, end, _ in located]
+        for chunk in chunks:
+            start = chunk.get("start", 0)
+            end = chunk.get("end", start)
+            first = bisect_right(ends, start)
+            last = bisect_left(starts, end) - 1
+            if first <= last:
+                chunk["start_time"] = located[first][2]["start"]
+                chunk["end_time"] = located[last][2]["end"]
+        
+        return chunks
+    
     def extract_topics(self, segments: List[Dict]) -> List[Dict]:
         if not segments:
             return []
@@ -1,126 +1,1108 @@
+import asyncio
 import os
+import sys
+import glob
+import json
 import pickle
-from typing import List, Dict, Optional, Tuple
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import List, Dict, NamedTuple, Optional, Tuple
 import numpy as np
 
 from app.config import get_settings
+from app.services.index_residency import IndexResidency
+from app.services.chunk_store import ChunkStore, ChunkSegments
+from app.services.lexical_index import LexicalIndex, LexicalSegments
+from app.services.index_builder import select_index_spec, build_index, add_to_index, search_index, rescore
+from app.utils.batching import MicroBatcher
+from app.utils.executors import get_executor
+from app.utils.locks import AsyncThreadLock, ReadWriteLock
 
 settings = get_settings()
 
+NEGATIVE_CACHE_MAX_ENTRIES = 10000
+
+
+class ResidentIndex(NamedTuple):
+    index: object
+    chunks: ChunkSegments
+    spec: Dict
+    tombstones: np.ndarray
+    lexical: LexicalSegments
+
 
 class VectorStore:
     def __init__(self):
         self.indexes = {}
         self.documents = {}
+        self.specs = {}
+        self.tombstones = {}
+        self.selectors = {}
+        self.lexical = {}
+        self.residency = IndexResidency(
+            max_bytes=settings.VECTOR_STORE_MAX_MEMORY_MB * 1024 * 1024,
+            policy=settings.VECTOR_STORE_EVICTION_POLICY
+        )
+        # Uploads index on event loops of their own in threadpool threads, so
+        # the resident maps are only changed under this lock and read through
+        # snapshots.
+        self._state = threading.RLock()
+        self._locks = {}
+        self._index_locks = {}
+        self._compactions = {}
+        self.loop = None
+        self._loads = {}
+        self._missing = {}
+        self.load_stats = {"loads": 0, "joined": 0, "negative_hits": 0}
+        self._coalescer = MicroBatcher(
+            self._search_batch,
+            window_ms=settings.VECTOR_SEARCH_COALESCE_WINDOW_MS,
+            max_batch=settings.VECTOR_SEARCH_COALESCE_MAX_BATCH
+        )
+    
+    async def open(self):
+        self.loop = asyncio.get_running_loop()
+    
+    async def close(self):
+        pending = list(self._compactions.values())
+        self.loop = None
+        if pending:
+            await asyncio.wait([asyncio.wrap_future(future) for future in pending])
     
     async def create_index(
         self,
         document_id: str,
         chunks: List[Dict],
-        embeddings: List[List[float]]
+        embeddings: np.ndarray,
+        user_id: Optional[str] = None
     ):
-        import faiss
-        
-        vectors = np.array(embeddings).astype('float32')
+        if self._uses_shards(user_id):
+            await self._add_to_shard(self._shard_id(user_id), document_id, chunks, embeddings)
+            return
         
-        dimension = vectors.shape[1]
-        index = faiss.IndexFlatIP(dimension)
-        index.add(vectors)
+        async with self._writing(document_id):
+            await self._create_index(document_id, chunks, embeddings)
+    
+    async def append_chunks(
+        self,
+        document_id: str,
+        chunks: List[Dict],
+        embeddings: np.ndarray
+    ) -> List[int]:
+        async with self._writing(document_id):
+            ids = await self._append(document_id, chunks, embeddings)
         
-        self.indexes[document_id] = index
-        self.documents[document_id] = chunks
+        await self._maybe_compact(document_id)
+        return ids
+    
+    async def remove_chunks(self, document_id: str, ids: List[int]) -> int:
+        async with self._writing(document_id):
+            removed = await self._remove(document_id, ids)
         
-        await self._save_index(document_id)
+        await self._maybe_compact(document_id)
+        return removed
+    
+    async def compact(self, document_id: str):
+        async with self._writing(document_id):
+            if not await self._ensure_resident(document_id):
+                return
+            
+            manifest = self.specs[document_id]
+            segments = self.documents[document_id]
+            live = ~np.isin(segments.ids, self.tombstones[document_id])
+            if not live.any():
+                return
+            
+            index, store, vectors, lexical, updated = await self._write_io(
+                self._compact_sync,
+                document_id,
+                manifest,
+                self.indexes[document_id],
+                segments,
+                live
+            )
+            
+            with self._state:
+                self.indexes[document_id] = index
+                self.documents[document_id] = ChunkSegments([store], [vectors])
+                self.lexical[document_id] = LexicalSegments([lexical])
+                self.specs[document_id] = updated
+                self.tombstones[document_id] = np.zeros(0, dtype=np.int64)
+                self.selectors.pop(document_id, None)
+                self._admit(document_id)
     
     async def search(
         self,
         document_id: str,
-        query_embedding: List[float],
-        top_k: int = 5
+        query_embedding: np.ndarray,
+        top_k: int = 5,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        filters: Optional[Dict[str, Tuple[Optional[float], Optional[float]]]] = None,
+        user_id: Optional[str] = None
     ) -> List[Dict]:
-        if document_id not in self.indexes:
-            await self._load_index(document_id)
+        query = np.asarray(query_embedding, dtype='float32')
+        document_id, filters = await self._route(document_id, user_id, filters)
         
-        if document_id not in self.indexes:
+        if settings.VECTOR_SEARCH_COALESCE:
+            filter_key = None
+            if filters:
+                filter_key = tuple(sorted((name, tuple(bounds)) for name, bounds in filters.items()))
+            return await self._coalescer.submit(
+                (document_id, top_k, nprobe, ef_search, filter_key),
+                query
+            )
+        
+        results = await self.search_many(
+            document_id,
+            query[np.newaxis],
+            top_k=top_k,
+            nprobe=nprobe,
+            ef_search=ef_search,
+            filters=filters
+        )
+        return results[0]
+    
+    async def search_many(
+        self,
+        document_id: str,
+        query_embeddings,
+        top_k: int = 5,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        filters: Optional[Dict[str, Tuple[Optional[float], Optional[float]]]] = None,
+        user_id: Optional[str] = None
+    ) -> List[List[Dict]]:
+        queries = np.atleast_2d(np.asarray(query_embeddings, dtype='float32'))
+        document_id, filters = await self._route(document_id, user_id, filters)
+        
+        resident = await self._lookup(document_id)
+        if resident is None:
+            return [[] for _ in range(len(queries))]
+        
+        chunks = resident.chunks
+        
+        allowed = None
+        selector = self._selector(document_id, resident.tombstones)
+        live = len(chunks) - len(resident.tombstones)
+        if filters:
+            allowed = self._allowed_ids(chunks, resident.tombstones, filters)
+            selector = self._batch_selector(allowed)
+            live = len(allowed)
+        
+        k = min(top_k, live)
+        if k <= 0:
+            return [[] for _ in range(len(queries))]
+        
+        # Narrow filters are cheaper to score exactly than to walk the index
+        # with a selector, and approximate indexes can miss sparse matches.
+        exact = (
+            allowed is not None
+            and len(allowed) <= settings.VECTOR_FILTER_EXACT_MAX
+            and all(vectors is not None for vectors in chunks.segment_vectors)
+        )
+        
+        if exact:
+            scores, indices = await get_executor("interactive").run(
+                rescore,
+                queries,
+                np.broadcast_to(allowed, (len(queries), len(allowed))),
+                chunks.vectors,
+                k
+            )
+        else:
+            scores, indices = await get_executor("interactive").run(
+                self._search_sync,
+                document_id,
+                resident.index,
+                resident.spec,
+                queries,
+                k,
+                nprobe,
+                ef_search,
+                chunks,
+                selector,
+                allowed,
+                resident.tombstones
+            )
+        
+        return [
+            self._chunks_for(chunks, row_scores, row_ids)
+            for row_scores, row_ids in zip(scores, indices)
+        ]
+    
+    async def search_lexical(
+        self,
+        document_id: str,
+        query: str,
+        top_k: int = 5,
+        filters: Optional[Dict[str, Tuple[Optional[float], Optional[float]]]] = None,
+        user_id: Optional[str] = None
+    ) -> List[Dict]:
+        document_id, filters = await self._route(document_id, user_id, filters)
+        resident = await self._lookup(document_id)
+        if resident is None:
             return []
         
-        index = self.indexes[document_id]
-        chunks = self.documents[document_id]
+        chunks = resident.chunks
+        allowed = self._allowed_ids(chunks, resident.tombstones, filters) if filters else None
+        
+        scores, ids = await get_executor("interactive").run(
+            resident.lexical.search,
+            query,
+            top_k,
+            resident.tombstones,
+            allowed
+        )
+        
+        return self._chunks_for(chunks, scores, ids)
+    
+    async def delete_index(self, document_id: str, user_id: Optional[str] = None):
+        if self._uses_shards(user_id):
+            await self._remove_from_shard(self._shard_id(user_id), document_id)
+        
+        async with self._writing(document_id):
+            with self._state:
+                self._drop_resident(document_id)
+                self.residency.discard(document_id)
+                self._mark_missing(document_id)
+            
+            pattern = os.path.join(settings.FAISS_INDEX_PATH, f"{glob.escape(document_id)}.*")
+            for path in glob.glob(pattern):
+                os.remove(path)
+    
+    async def warm(self, document_id: str, user_id: Optional[str] = None) -> bool:
+        document_id, _ = await self._route(document_id, user_id, None)
+        return await self._ensure_resident(document_id)
+    
+    async def index_version(self, document_id: str, user_id: Optional[str] = None) -> Optional[int]:
+        document_id, _ = await self._route(document_id, user_id, None)
+        await self._ensure_resident(document_id)
+        resident = self._resident(document_id)
+        return resident.spec["version"] if resident else None
+    
+    def stats(self) -> Dict:
+        return dict(
+            self.residency.stats(),
+            loading=dict(self.load_stats, missing_cached=len(self._missing)),
+            coalescing=self._coalescer.stats()
+        )
+    
+    def _uses_shards(self, user_id: Optional[str]) -> bool:
+        return user_id is not None and settings.VECTOR_STORE_LAYOUT == "user"
+    
+    def _shard_id(self, user_id: str) -> str:
+        return f"user_{user_id}"
+    
+    async def _route(
+        self,
+        document_id: str,
+        user_id: Optional[str],
+        filters: Optional[Dict[str, Tuple[Optional[float], Optional[float]]]]
+    ) -> Tuple[str, Optional[Dict[str, Tuple[Optional[float], Optional[float]]]]]:
+        if not self._uses_shards(user_id):
+            return document_id, filters
+        
+        shard_id = self._shard_id(user_id)
+        await self._ensure_resident(shard_id)
+        resident = self._resident(shard_id)
+        if resident is None:
+            return document_id, filters
+        
+        ordinal = resident.spec["documents"].get(document_id)
+        if ordinal is None:
+            # Documents indexed before the user layout keep their own files.
+            return document_id, filters
+        
+        return shard_id, dict(filters or {}, document=(ordinal, ordinal))
+    
+    async def _add_to_shard(
+        self,
+        shard_id: str,
+        document_id: str,
+        chunks: List[Dict],
+        embeddings: np.ndarray
+    ):
+        async with self._writing(shard_id):
+            manifest = self.specs.get(shard_id) if await self._ensure_resident(shard_id) else None
+            documents = dict(manifest["documents"]) if manifest else {}
+            next_ordinal = manifest["next_ordinal"] if manifest else 0
+            
+            # Re-indexing a document replaces its previous chunks.
+            if document_id in documents:
+                await self._remove(shard_id, self._shard_chunk_ids(shard_id, documents[document_id]))
+            
+            documents[document_id] = next_ordinal
+            await self._append(
+                shard_id,
+                [dict(chunk, doc_ordinal=next_ordinal) for chunk in chunks],
+                embeddings,
+                documents=documents,
+                next_ordinal=next_ordinal + 1
+            )
+        
+        await self._maybe_compact(shard_id)
+    
+    async def _remove_from_shard(self, shard_id: str, document_id: str):
+        async with self._writing(shard_id):
+            if not await self._ensure_resident(shard_id):
+                return
+            
+            documents = dict(self.specs[shard_id]["documents"])
+            ordinal = documents.pop(document_id, None)
+            if ordinal is None:
+                return
+            
+            await self._remove(
+                shard_id,
+                self._shard_chunk_ids(shard_id, ordinal),
+                documents=documents
+            )
         
-        query = np.array([query_embedding]).astype('float32')
-        scores, indices = index.search(query, min(top_k, len(chunks)))
+        # Tombstoned chunks are dropped by the background compaction.
+        await self._maybe_compact(shard_id)
+    
+    def _shard_chunk_ids(self, shard_id: str, ordinal: int) -> np.ndarray:
+        segments = self.documents[shard_id]
+        return segments.ids[segments.matching({"document": (ordinal, ordinal)})]
+    
+    def _lock(self, document_id: str) -> AsyncThreadLock:
+        # Writers come from the app's loop and from uploads on loops of their
+        # own, so the lock can't belong to any one loop.
+        return self._locks.setdefault(document_id, AsyncThreadLock())
+    
+    @asynccontextmanager
+    async def _writing(self, document_id: str):
+        # Writes read the resident index back after every await, so a cold
+        # load of another document must not evict it in between.
+        async with self._lock(document_id):
+            with self._state:
+                self.residency.pin(document_id)
+            try:
+                self._drop_if_stale(document_id)
+                yield
+            finally:
+                with self._state:
+                    self.residency.unpin(document_id)
+    
+    def _drop_if_stale(self, document_id: str):
+        # A write cut short after its manifest was committed leaves the
+        # resident copy behind the disk; reload it instead of writing a delta
+        # against the old generation.
+        spec = self.specs.get(document_id)
+        if spec is None:
+            return
         
+        manifest = self._read_manifest(document_id)
+        if manifest is None:
+            return
+        if any(manifest[key] != spec.get(key) for key in ("generation", "deltas", "version")):
+            with self._state:
+                self._drop_resident(document_id)
+                self.residency.discard(document_id)
+    
+    def _resident(self, document_id: str) -> Optional[ResidentIndex]:
+        with self._state:
+            if document_id not in self.indexes:
+                return None
+            return ResidentIndex(
+                self.indexes[document_id],
+                self.documents[document_id],
+                self.specs[document_id],
+                self.tombstones[document_id],
+                self.lexical[document_id]
+            )
+    
+    async def _lookup(self, document_id: str) -> Optional[ResidentIndex]:
+        with self._state:
+            resident = self._resident(document_id)
+            if resident is not None:
+                self.residency.hit(document_id)
+                return resident
+            self.residency.miss(document_id)
+        
+        await self._load_index(document_id)
+        return self._resident(document_id)
+    
+    async def _write_io(self, func, *args):
+        # Writes run under the document's lock. A cancelled caller still
+        # waits for the job, so the lock is never released over half-written
+        # files.
+        job = asyncio.ensure_future(get_executor("index_io").run(func, *args))
+        try:
+            return await asyncio.shield(job)
+        except asyncio.CancelledError:
+            while not job.done():
+                try:
+                    await asyncio.wait([job])
+                except asyncio.CancelledError:
+                    pass
+            raise
+    
+    def _chunks_for(self, chunks: ChunkSegments, scores, ids) -> List[Dict]:
         results = []
-        for score, idx in zip(scores[0], indices[0]):
-            if idx >= 0 and idx < len(chunks):
-                chunk = chunks[idx].copy()
+        for score, chunk_id in zip(scores, ids):
+            if chunk_id < 0:
+                continue
+            chunk = chunks.get(int(chunk_id))
+            if chunk is not None:
                 chunk["score"] = float(score)
                 results.append(chunk)
-        
         return results
     
-    async def delete_index(self, document_id: str):
-        if document_id in self.indexes:
-            del self.indexes[document_id]
-        if document_id in self.documents:
-            del self.documents[document_id]
+    def _index_lock(self, document_id: str) -> ReadWriteLock:
+        # FAISS searches on one index may run side by side, but an add must
+        # not overlap any of them.
+        return self._index_locks.setdefault(document_id, ReadWriteLock())
+    
+    async def _search_batch(self, key: Tuple, queries: List[np.ndarray]) -> List[List[Dict]]:
+        document_id, top_k, nprobe, ef_search, filter_key = key
+        return await self.search_many(
+            document_id,
+            np.vstack(queries),
+            top_k=top_k,
+            nprobe=nprobe,
+            ef_search=ef_search,
+            filters=dict(filter_key) if filter_key else None
+        )
+    
+    def _search_sync(
+        self,
+        document_id: str,
+        index,
+        spec: Dict,
+        queries: np.ndarray,
+        top_k: int,
+        nprobe: Optional[int],
+        ef_search: Optional[int],
+        chunks: ChunkSegments,
+        selector,
+        allowed: Optional[np.ndarray] = None,
+        removed: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        with self._index_lock(document_id).read():
+            return search_index(
+                index,
+                spec,
+                queries,
+                top_k,
+                nprobe=nprobe,
+                ef_search=ef_search,
+                fetch_vectors=chunks.vectors,
+                selector=selector,
+                allowed=allowed,
+                removed=removed
+            )
+    
+    def _add_sync(self, document_id: str, index, spec: Dict, vectors: np.ndarray, ids: np.ndarray):
+        with self._index_lock(document_id).write():
+            add_to_index(index, spec, vectors, ids)
+    
+    async def _ensure_resident(self, document_id: str) -> bool:
+        if document_id not in self.indexes:
+            await self._load_index(document_id)
+        return document_id in self.indexes
+    
+    async def _append(
+        self,
+        document_id: str,
+        chunks: List[Dict],
+        embeddings: np.ndarray,
+        **manifest_updates
+    ) -> List[int]:
+        if not await self._ensure_resident(document_id):
+            manifest = await self._create_index(document_id, chunks, embeddings, **manifest_updates)
+            return list(range(manifest["next_id"]))
+        
+        vectors = np.ascontiguousarray(embeddings, dtype='float32')
+        manifest = self.specs[document_id]
+        ids = np.arange(manifest["next_id"], manifest["next_id"] + len(chunks), dtype=np.int64)
+        delta = max(manifest["deltas"], default=0) + 1
+        
+        updated = dict(
+            manifest,
+            deltas=manifest["deltas"] + [delta],
+            next_id=int(ids[-1]) + 1 if len(ids) else manifest["next_id"],
+            version=manifest["version"] + 1,
+            **manifest_updates
+        )
         
-        index_path = self._get_index_path(document_id)
-        docs_path = self._get_docs_path(document_id)
+        store, delta_vectors, lexical = await self._write_io(
+            self._append_sync,
+            document_id,
+            updated,
+            delta,
+            [dict(chunk, chunk_id=int(chunk_id)) for chunk, chunk_id in zip(chunks, ids)],
+            vectors
+        )
+        
+        await self._write_io(
+            self._add_sync,
+            document_id,
+            self.indexes[document_id],
+            manifest,
+            vectors,
+            ids
+        )
+        
+        # Searches keep the segments they started with, so appends swap in
+        # new ones rather than growing them in place.
+        with self._state:
+            segments = self.documents[document_id]
+            self.documents[document_id] = ChunkSegments(
+                segments.stores + [store],
+                segments.segment_vectors + [delta_vectors]
+            )
+            self.lexical[document_id] = LexicalSegments(self.lexical[document_id].segments + [lexical])
+            self.specs[document_id] = updated
+            self._admit(document_id)
         
-        if os.path.exists(index_path):
-            os.remove(index_path)
-        if os.path.exists(docs_path):
-            os.remove(docs_path)
+        return ids.tolist()
     
-    def _get_index_path(self, document_id: str) -> str:
-        return os.path.join(settings.FAISS_INDEX_PATH, f"{document_id}.index")
+    async def _remove(self, document_id: str, ids: List[int], **manifest_updates) -> int:
+        if not await self._ensure_resident(document_id):
+            return 0
+        
+        segments = self.documents[document_id]
+        ids = np.unique(np.asarray(ids, dtype=np.int64))
+        ids = ids[segments.positions(ids) >= 0]
+        ids = np.setdiff1d(ids, self.tombstones[document_id])
+        if not len(ids) and not manifest_updates:
+            return 0
+        
+        manifest = self.specs[document_id]
+        updated = dict(manifest, version=manifest["version"] + 1, **manifest_updates)
+        
+        await self._write_io(
+            self._remove_sync,
+            document_id,
+            updated,
+            ids
+        )
+        
+        with self._state:
+            self.tombstones[document_id] = np.union1d(self.tombstones[document_id], ids)
+            self.selectors.pop(document_id, None)
+            self.specs[document_id] = updated
+        
+        return len(ids)
     
-    def _get_docs_path(self, document_id: str) -> str:
+    async def _create_index(
+        self,
+        document_id: str,
+        chunks: List[Dict],
+        embeddings: np.ndarray,
+        **manifest_updates
+    ) -> Dict:
+        vectors = np.ascontiguousarray(embeddings, dtype='float32')
+        ids = np.arange(len(chunks), dtype=np.int64)
+        
+        spec = select_index_spec(vectors.shape[0], vectors.shape[1])
+        
+        index = await get_executor("index_io").run(build_index, vectors, spec, ids)
+        
+        previous = self.specs.get(document_id) or self._read_manifest(document_id)
+        manifest = dict(
+            spec,
+            generation=previous["generation"] + 1 if previous else 0,
+            deltas=[],
+            next_id=len(chunks),
+            version=previous["version"] + 1 if previous else 1,
+            **manifest_updates
+        )
+        
+        store, stored_vectors, lexical = await self._write_io(
+            self._write_generation,
+            document_id,
+            manifest,
+            index,
+            [dict(chunk, chunk_id=int(chunk_id)) for chunk, chunk_id in zip(chunks, ids)],
+            vectors,
+            previous
+        )
+        
+        with self._state:
+            self.indexes[document_id] = index
+            self.documents[document_id] = ChunkSegments([store], [stored_vectors])
+            self.lexical[document_id] = LexicalSegments([lexical])
+            self.specs[document_id] = manifest
+            self.tombstones[document_id] = np.zeros(0, dtype=np.int64)
+            self.selectors.pop(document_id, None)
+            self._missing.pop(document_id, None)
+            self._admit(document_id)
+        
+        return manifest
+    
+    def _selector(self, document_id: str, tombstones: np.ndarray):
+        import faiss
+        
+        if not len(tombstones):
+            return None
+        
+        # Cached against the tombstone array it was built from, so a search
+        # on an older snapshot never picks up a newer selector.
+        cached = self.selectors.get(document_id)
+        if cached is not None and cached[0] is tombstones:
+            return cached[1]
+        
+        # The wrapper keeps the inner selector alive for as long as an
+        # in-flight search still holds it, even after the cache drops it.
+        removed = faiss.IDSelectorBatch(tombstones)
+        selector = faiss.IDSelectorNot(removed)
+        selector.referenced_objects = [removed]
+        self.selectors[document_id] = (tombstones, selector)
+        return selector
+    
+    def _allowed_ids(
+        self,
+        segments: ChunkSegments,
+        tombstones: np.ndarray,
+        filters: Dict[str, Tuple[Optional[float], Optional[float]]]
+    ) -> np.ndarray:
+        ids = segments.ids[segments.matching(filters)]
+        return np.setdiff1d(ids, tombstones)
+    
+    def _batch_selector(self, ids: np.ndarray):
+        import faiss
+        
+        return faiss.IDSelectorBatch(np.ascontiguousarray(ids, dtype=np.int64))
+    
+    async def _maybe_compact(self, document_id: str):
+        resident = self._resident(document_id)
+        if resident is None:
+            return
+        
+        tombstones = len(resident.tombstones)
+        total = len(resident.chunks)
+        if (
+            len(resident.spec["deltas"]) < settings.VECTOR_STORE_COMPACT_MAX_DELTAS
+            and tombstones <= settings.VECTOR_STORE_COMPACT_TOMBSTONE_RATIO * total
+        ):
+            return
+        
+        # Uploads run on a loop that is torn down as soon as they finish, so
+        # background compaction goes to the app's loop. Without one (scripts
+        # and tests) the caller compacts inline.
+        loop = self.loop
+        if loop is None or not loop.is_running():
+            await self.compact(document_id)
+            return
+        
+        with self._state:
+            if document_id in self._compactions:
+                return
+            future = asyncio.run_coroutine_threadsafe(self.compact(document_id), loop)
+            self._compactions[document_id] = future
+        future.add_done_callback(lambda _: self._finish_compaction(document_id, future))
+    
+    def _finish_compaction(self, document_id: str, future):
+        with self._state:
+            if self._compactions.get(document_id) is future:
+                del self._compactions[document_id]
+        
+        if not future.cancelled() and future.exception() is not None:
+            print(f"Compaction of {document_id} failed: {future.exception()}")
+    
+    def _admit(self, document_id: str):
+        with self._state:
+            nbytes = (
+                self._index_nbytes(self.indexes[document_id])
+                + self._chunks_nbytes(self.documents[document_id])
+                + self.lexical[document_id].nbytes
+            )
+            for evicted_id in self.residency.admit(document_id, nbytes):
+                self._drop_resident(evicted_id)
+    
+    def _drop_resident(self, document_id: str):
+        with self._state:
+            self.indexes.pop(document_id, None)
+            self.documents.pop(document_id, None)
+            self.specs.pop(document_id, None)
+            self.tombstones.pop(document_id, None)
+            self.selectors.pop(document_id, None)
+            self.lexical.pop(document_id, None)
+    
+    def _index_nbytes(self, index) -> int:
+        import faiss
+        
+        nbytes = 0
+        if hasattr(index, "id_map"):
+            # id_map plus the reverse lookup kept by the *IDMap2 variants
+            nbytes += int(index.ntotal) * 8 * 3
+            if isinstance(index, faiss.IndexBinary):
+                index = faiss.downcast_IndexBinary(index.index)
+            else:
+                index = faiss.downcast_index(index.index)
+        
+        code_size = getattr(index, "code_size", None)
+        if code_size:
+            return nbytes + int(index.ntotal * code_size)
+        
+        # HNSW has no code size of its own. Serialising it to find out copies
+        # the whole graph on every admit, so it is sized from its storage and
+        # its link arrays (int32 neighbours and levels, 64-bit offsets).
+        hnsw = getattr(index, "hnsw", None)
+        if hnsw is not None:
+            return (
+                nbytes
+                + self._index_nbytes(faiss.downcast_index(index.storage))
+                + int(hnsw.neighbors.size()) * 4
+                + int(hnsw.levels.size()) * 4
+                + int(hnsw.offsets.size()) * 8
+            )
+        
+        return nbytes + int(faiss.serialize_index(index).nbytes)
+    
+    def _chunks_nbytes(self, chunks) -> int:
+        if isinstance(chunks, (ChunkStore, ChunkSegments)):
+            return chunks.nbytes
+        return sum(
+            sys.getsizeof(chunk) + sum(sys.getsizeof(value) for value in chunk.values())
+            for chunk in chunks
+        )
+    
+    def _get_path(
+        self,
+        document_id: str,
+        extension: str,
+        generation: int = 0,
+        delta: Optional[int] = None
+    ) -> str:
+        name = document_id
+        if generation:
+            name = f"{name}.g{generation}"
+        if delta is not None:
+            name = f"{name}.d{delta}"
+        return os.path.join(settings.FAISS_INDEX_PATH, f"{name}.{extension}")
+    
+    def _get_legacy_docs_path(self, document_id: str) -> str:
         return os.path.join(settings.FAISS_INDEX_PATH, f"{document_id}.pkl")
     
-    async def _save_index(self, document_id: str):
+    def _get_meta_path(self, document_id: str) -> str:
+        return os.path.join(settings.FAISS_INDEX_PATH, f"{document_id}.meta.json")
+    
+    def _read_manifest(self, document_id: str) -> Optional[Dict]:
+        meta_path = self._get_meta_path(document_id)
+        if not os.path.exists(meta_path):
+            return None
+        
+        with open(meta_path) as f:
+            manifest = json.load(f)
+        
+        manifest.setdefault("generation", 0)
+        manifest.setdefault("deltas", [])
+        manifest.setdefault("version", 1)
+        return manifest
+    
+    def _write_manifest(self, document_id: str, manifest: Dict):
+        meta_path = self._get_meta_path(document_id)
+        with open(f"{meta_path}.tmp", 'w') as f:
+            json.dump(manifest, f)
+        os.replace(f"{meta_path}.tmp", meta_path)
+    
+    def _write_generation(
+        self,
+        document_id: str,
+        manifest: Dict,
+        index,
+        chunks: List[Dict],
+        vectors: np.ndarray,
+        previous: Optional[Dict]
+    ) -> Tuple[ChunkStore, np.ndarray, LexicalIndex]:
         import faiss
-        import asyncio
         
         os.makedirs(settings.FAISS_INDEX_PATH, exist_ok=True)
+        generation = manifest["generation"]
         
-        index = self.indexes[document_id]
-        chunks = self.documents[document_id]
+        docs_path = self._get_path(document_id, "chunks", generation)
+        ChunkStore.write(docs_path, chunks)
         
-        loop = asyncio.get_event_loop()
-        await loop.run_in_executor(
-            None,
-            faiss.write_index,
-            index,
-            self._get_index_path(document_id)
+        # Float vectors stay on disk and are memory-mapped: binary codes are
+        # rescored against them and compaction rebuilds from them.
+        vectors_path = self._get_path(document_id, "vectors.npy", generation)
+        _write_vectors(vectors_path, vectors)
+        
+        lexical = _build_lexical(chunks)
+        lexical.save(self._get_path(document_id, "lexical.npz", generation))
+        
+        index_path = self._get_path(document_id, "index", generation)
+        if manifest["index_type"] == "binary":
+            faiss.write_index_binary(index, f"{index_path}.tmp")
+        else:
+            faiss.write_index(index, f"{index_path}.tmp")
+        os.replace(f"{index_path}.tmp", index_path)
+        
+        # The manifest is the commit point for the new generation.
+        self._write_manifest(document_id, manifest)
+        
+        if previous and previous["generation"] != generation:
+            self._remove_generation(document_id, previous)
+        
+        return ChunkStore(docs_path), np.load(vectors_path, mmap_mode='r'), lexical
+    
+    def _remove_generation(self, document_id: str, manifest: Dict):
+        generation = manifest["generation"]
+        paths = [
+            self._get_path(document_id, extension, generation)
+            for extension in ("index", "chunks", "vectors.npy", "lexical.npz", "tombstones")
+        ]
+        for delta in manifest["deltas"]:
+            for extension in ("chunks", "vectors.npy", "lexical.npz"):
+                paths.append(self._get_path(document_id, extension, generation, delta))
+        paths.append(self._get_legacy_docs_path(document_id))
+        
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
+    
+    def _append_sync(
+        self,
+        document_id: str,
+        manifest: Dict,
+        delta: int,
+        chunks: List[Dict],
+        vectors: np.ndarray
+    ) -> Tuple[ChunkStore, np.ndarray, LexicalIndex]:
+        generation = manifest["generation"]
+        
+        docs_path = self._get_path(document_id, "chunks", generation, delta)
+        ChunkStore.write(docs_path, chunks)
+        
+        vectors_path = self._get_path(document_id, "vectors.npy", generation, delta)
+        _write_vectors(vectors_path, vectors)
+        
+        lexical = _build_lexical(chunks)
+        lexical.save(self._get_path(document_id, "lexical.npz", generation, delta))
+        
+        self._write_manifest(document_id, manifest)
+        
+        return ChunkStore(docs_path), np.load(vectors_path, mmap_mode='r'), lexical
+    
+    def _remove_sync(self, document_id: str, manifest: Dict, ids: np.ndarray):
+        tombstones_path = self._get_path(document_id, "tombstones", manifest["generation"])
+        with open(tombstones_path, 'ab') as f:
+            f.write(ids.astype('<i8').tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        
+        self._write_manifest(document_id, manifest)
+    
+    def _compact_sync(
+        self,
+        document_id: str,
+        manifest: Dict,
+        index,
+        segments: ChunkSegments,
+        live: np.ndarray
+    ) -> Tuple[object, ChunkStore, np.ndarray, LexicalIndex, Dict]:
+        live_ids = segments.ids[live]
+        
+        vectors = segments.vectors(live_ids)
+        if vectors is None:
+            vectors = index.reconstruct_batch(live_ids)
+        
+        chunks = [segments.at(int(position)) for position in np.flatnonzero(live)]
+        
+        spec = select_index_spec(len(live_ids), vectors.shape[1])
+        compacted = build_index(vectors, spec, live_ids)
+        
+        # Start from the old manifest so layout keys such as a shard's
+        # document map survive the rebuild.
+        updated = dict(
+            manifest,
+            **spec,
+            generation=manifest["generation"] + 1,
+            deltas=[],
+            next_id=manifest["next_id"],
+            version=manifest["version"]
+        )
+        store, stored_vectors, lexical = self._write_generation(
+            document_id, updated, compacted, chunks, vectors, manifest
         )
         
-        with open(self._get_docs_path(document_id), 'wb') as f:
-            pickle.dump(chunks, f)
+        return compacted, store, stored_vectors, lexical, updated
     
     async def _load_index(self, document_id: str):
-        import faiss
-        import asyncio
+        if self._is_missing(document_id):
+            self.load_stats["negative_hits"] += 1
+            return
         
-        index_path = self._get_index_path(document_id)
-        docs_path = self._get_docs_path(document_id)
+        # Concurrent cold searches share one load. The shield keeps a
+        # cancelled caller from aborting the load the others are awaiting.
+        loop = asyncio.get_event_loop()
+        pending = self._loads.get(document_id)
+        if pending is not None and pending.get_loop() is loop:
+            self.load_stats["joined"] += 1
+            await asyncio.shield(pending)
+            return
         
-        if not os.path.exists(index_path) or not os.path.exists(docs_path):
+        task = loop.create_task(self._load_index_once(document_id))
+        self._loads[document_id] = task
+        task.add_done_callback(lambda _: self._finish_load(document_id, task))
+        await asyncio.shield(task)
+    
+    def _finish_load(self, document_id: str, task):
+        if self._loads.get(document_id) is task:
+            del self._loads[document_id]
+    
+    def _is_missing(self, document_id: str) -> bool:
+        expires = self._missing.get(document_id)
+        if expires is None:
+            return False
+        if expires < time.monotonic():
+            del self._missing[document_id]
+            return False
+        return True
+    
+    def _mark_missing(self, document_id: str):
+        ttl = settings.VECTOR_STORE_NEGATIVE_CACHE_TTL_SECONDS
+        if ttl <= 0:
             return
         
-        loop = asyncio.get_event_loop()
-        index = await loop.run_in_executor(
-            None,
-            faiss.read_index,
-            index_path
+        self._missing.pop(document_id, None)
+        while len(self._missing) >= NEGATIVE_CACHE_MAX_ENTRIES:
+            del self._missing[next(iter(self._missing))]
+        self._missing[document_id] = time.monotonic() + ttl
+    
+    async def _load_index_once(self, document_id: str):
+        self.load_stats["loads"] += 1
+        manifest = self._read_manifest(document_id)
+        generation = manifest["generation"] if manifest else 0
+        
+        if not os.path.exists(self._get_path(document_id, "index", generation)):
+            self._mark_missing(document_id)
+            return
+        if (
+            not os.path.exists(self._get_path(document_id, "chunks", generation))
+            and not os.path.exists(self._get_legacy_docs_path(document_id))
+        ):
+            self._mark_missing(document_id)
+            return
+        
+        index, segments, lexical, manifest, tombstones = await get_executor("index_io").run(
+            self._load_sync,
+            document_id,
+            manifest
+        )
+        
+        with self._state:
+            # A create or a load on another loop may have finished while the
+            # files were being read.
+            if document_id in self.indexes:
+                return
+            
+            self.indexes[document_id] = index
+            self.documents[document_id] = segments
+            self.lexical[document_id] = lexical
+            self.specs[document_id] = manifest
+            self.tombstones[document_id] = tombstones
+            self._admit(document_id)
+    
+    def _load_sync(
+        self,
+        document_id: str,
+        manifest: Optional[Dict]
+    ) -> Tuple[object, ChunkSegments, LexicalSegments, Dict, np.ndarray]:
+        import faiss
+        
+        generation = manifest["generation"] if manifest else 0
+        
+        docs_path = self._get_path(document_id, "chunks", generation)
+        if not os.path.exists(docs_path):
+            self._migrate_legacy_docs(document_id)
+        
+        index_path = self._get_path(document_id, "index", generation)
+        if manifest and manifest["index_type"] == "binary":
+            index = faiss.read_index_binary(index_path)
+        else:
+            index = faiss.read_index(index_path)
+        
+        if manifest is None:
+            manifest = {
+                "index_type": "flat",
+                "factory": "Flat",
+                "storage": "float",
+                "params": {},
+                "dimension": index.d,
+                "count": index.ntotal,
+                "generation": 0,
+                "deltas": [],
+                "version": 1
+            }
+        manifest.setdefault("next_id", int(index.ntotal))
+        
+        store = ChunkStore(docs_path)
+        segments = ChunkSegments(
+            [store],
+            [_load_vectors(self._get_path(document_id, "vectors.npy", generation))]
         )
+        lexical = LexicalSegments([
+            _load_lexical(self._get_path(document_id, "lexical.npz", generation), store, segments.ids)
+        ])
+        
+        # Deltas appended since the last compaction are replayed into the
+        # in-memory index; the base index file is only rewritten on compaction.
+        for delta in manifest["deltas"]:
+            store = ChunkStore(self._get_path(document_id, "chunks", generation, delta))
+            vectors = _load_vectors(self._get_path(document_id, "vectors.npy", generation, delta))
+            add_to_index(index, manifest, np.asarray(vectors), store.column("chunk_id"))
+            segments.append(store, vectors)
+            lexical.append(_load_lexical(
+                self._get_path(document_id, "lexical.npz", generation, delta),
+                store,
+                store.column("chunk_id")
+            ))
         
-        with open(docs_path, 'rb') as f:
+        tombstones_path = self._get_path(document_id, "tombstones", generation)
+        tombstones = np.zeros(0, dtype=np.int64)
+        if os.path.exists(tombstones_path):
+            with open(tombstones_path, 'rb') as f:
+                data = f.read()
+            # Ignore a torn trailing write.
+            data = data[:len(data) - len(data) % 8]
+            tombstones = np.unique(np.frombuffer(data, dtype='<i8').astype(np.int64))
+        
+        return index, segments, lexical, manifest, tombstones
+    
+    def _migrate_legacy_docs(self, document_id: str):
+        # Indexes written before the columnar chunk store kept a pickled
+        # list of dicts; convert them once and drop the pickle.
+        legacy_docs_path = self._get_legacy_docs_path(document_id)
+        with open(legacy_docs_path, 'rb') as f:
             chunks = pickle.load(f)
         
-        self.indexes[document_id] = index
-        self.documents[document_id] = chunks
+        ChunkStore.write(self._get_path(document_id, "chunks"), chunks)
+        os.remove(legacy_docs_path)
+
+
+def _write_vectors(path: str, vectors: np.ndarray):
+    with open(f"{path}.tmp", 'wb') as f:
+        np.save(f, np.ascontiguousarray(vectors, dtype='float32'))
+    os.replace(f"{path}.tmp", path)
+
+
+def _load_vectors(path: str) -> Optional[np.ndarray]:
+    if not os.path.exists(path):
+        return None
+    return np.load(path, mmap_mode='r')
+
+
+def _build_lexical(chunks: List[Dict]) -> LexicalIndex:
+    return LexicalIndex.build(
+        [chunk.get("text", "") for chunk in chunks],
+        [chunk["chunk_id"] for chunk in chunks]
+    )
+
+
+def _load_lexical(path: str, store: ChunkStore, chunk_ids: np.ndarray) -> LexicalIndex:
+    if os.path.exists(path):
+        return LexicalIndex.load(path)
+    
+    # Indexes written before lexical search get their postings on first load.
+    lexical = LexicalIndex.build([chunk["text"] for chunk in store], chunk_ids)
+    lexical.save(path)
+    return lexical
 
 
 vector_store = VectorStore()
@@ -0,0 +1,124 @@
+import asyncio
+import time
+from typing import Awaitable, Dict, Optional
+import numpy as np
+
+from app.config import get_settings
+from app.db.mongodb import get_collection
+from app.services.context_packer import ContextPacker
+from app.services.embedding import EmbeddingService
+from app.services.reranker import Reranker
+from app.services.transcription import TranscriptionService
+from app.services.vector_store import vector_store
+from app.utils.executors import get_executor
+
+settings = get_settings()
+
+WARMUP_MODELS = ("embedding", "tokenizer", "whisper", "reranker")
+
+
+class Readiness:
+    def __init__(self):
+        self.components: Dict[str, Dict] = {}
+    
+    def pending(self, name: str):
+        self.components[name] = {"ready": False, "seconds": None, "error": None}
+    
+    def finished(self, name: str, seconds: float, error: Optional[str] = None):
+        self.components[name] = {
+            "ready": error is None,
+            "seconds": round(seconds, 3),
+            "error": error
+        }
+    
+    @property
+    def ready(self) -> bool:
+        return all(component["ready"] for component in self.components.values())
+    
+    def stats(self) -> Dict:
+        return {"ready": self.ready, "components": dict(self.components)}
+
+
+readiness = Readiness()
+
+
+# The warm-up callables run on the executors that serve real traffic and
+# return nothing, so no model is pickled back from a process pool.
+def _warm_faiss():
+    import faiss
+    
+    index = faiss.IndexFlatIP(8)
+    index.add(np.eye(8, dtype='float32'))
+    index.search(np.eye(1, 8, dtype='float32'), 1)
+
+
+def _warm_embedding():
+    EmbeddingService._encode_batch(["warm up"])
+
+
+def _warm_tokenizer():
+    ContextPacker.preload_tokenizer()
+
+
+def _warm_reranker():
+    Reranker._score_sync([("warm up", "warm up")])
+
+
+def _warm_whisper():
+    model = TranscriptionService()._load_model()
+    # One second of silence at Whisper's 16 kHz sample rate.
+    model.transcribe(np.zeros(16000, dtype='float32'), fp16=False)
+
+
+async def prefetch_hot_indexes(limit: int) -> int:
+    # The most recently used chats are the most likely to be asked again.
+    history = get_collection("chat_history")
+    cursor = history.find({}, {"document_id": 1, "user_id": 1}).sort("updated_at", -1).limit(limit)
+    
+    warmed = 0
+    async for entry in cursor:
+        if await vector_store.warm(entry["document_id"], user_id=entry.get("user_id")):
+            warmed += 1
+    return warmed
+
+
+async def _track(name: str, step: Awaitable):
+    started = time.perf_counter()
+    try:
+        await step
+    except Exception as e:
+        print(f"Warm-up of {name} failed: {e}")
+        readiness.finished(name, time.perf_counter() - started, error=str(e))
+        return
+    readiness.finished(name, time.perf_counter() - started)
+
+
+def register_warmup():
+    # Called before serving, so /ready reports pending work from the first request.
+    unknown = set(settings.WARMUP_MODELS) - set(WARMUP_MODELS)
+    if unknown:
+        raise ValueError(f"Unknown warm-up models: {sorted(unknown)}")
+    
+    readiness.pending("faiss")
+    for name in settings.WARMUP_MODELS:
+        readiness.pending(name)
+    if settings.WARMUP_PREFETCH_INDEXES > 0:
+        readiness.pending("indexes")
+
+
+async def warm_up():
+    steps = [_track("faiss", get_executor("index_io").run(_warm_faiss))]
+    if "embedding" in settings.WARMUP_MODELS:
+        steps.append(_track("embedding", get_executor("interactive").run(_warm_embedding)))
+    if "tokenizer" in settings.WARMUP_MODELS:
+        steps.append(_track("tokenizer", get_executor("interactive").run(_warm_tokenizer)))
+    if "reranker" in settings.WARMUP_MODELS:
+        steps.append(_track("reranker", get_executor("reranker").run(_warm_reranker)))
+    if "whisper" in settings.WARMUP_MODELS:
+        steps.append(_track("whisper", get_executor("transcription").run(_warm_whisper)))
+    
+    await asyncio.gather(*steps)
+    
+    # Indexes are loaded after the models so the two don't compete for I/O.
+    if settings.WARMUP_PREFETCH_INDEXES > 0:
+        await _track("indexes", prefetch_hot_indexes(settings.WARMUP_PREFETCH_INDEXES))
@@ -0,0 +1,74 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Tuple
+
+
+class MicroBatcher:
+    def __init__(
+        self,
+        handler: Callable[[Hashable, List[Any]], Awaitable[List[Any]]],
+        window_ms: float,
+        max_batch: int
+    ):
+        self.handler = handler
+        self.window = window_ms / 1000
+        self.max_batch = max(1, max_batch)
+        self._pending: Dict[Tuple, List[Tuple[Any, asyncio.Future]]] = {}
+        self._timers: Dict[Tuple, asyncio.TimerHandle] = {}
+        self._tasks = set()
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+    
+    async def submit(self, key: Hashable, item: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        
+        # Callers on different event loops are never batched together.
+        pending_key = (id(loop), key)
+        batch = self._pending.setdefault(pending_key, [])
+        batch.append((item, future))
+        
+        if len(batch) >= self.max_batch:
+            self._flush(pending_key)
+        elif len(batch) == 1:
+            self._timers[pending_key] = loop.call_later(self.window, self._flush, pending_key)
+        
+        return await future
+    
+    def stats(self) -> Dict:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "largest_batch": self.largest_batch,
+            "average_batch": self.items / self.batches if self.batches else 0.0
+        }
+    
+    def _flush(self, pending_key: Tuple):
+        timer = self._timers.pop(pending_key, None)
+        if timer is not None:
+            timer.cancel()
+        
+        batch = self._pending.pop(pending_key, None)
+        if not batch:
+            return
+        
+        self.batches += 1
+        self.items += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        
+        task = asyncio.ensure_future(self._run(pending_key[1], batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+    
+    async def _run(self, key: Hashable, batch: List[Tuple[Any, asyncio.Future]]):
+        try:
+            results = await self.handler(key, [item for item, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
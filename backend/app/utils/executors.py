@@ -0,0 +1,136 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Tuple
+
+from app.config import get_settings
+
+settings = get_settings()
+
+# Work classes that only submit picklable callables and may use processes.
+PROCESS_CAPABLE = ("bulk_embedding", "transcription", "extraction")
+
+
+def _timed(func: Callable, args: Tuple) -> Tuple[float, float, Any]:
+    # Runs in the worker; wall-clock stamps are comparable across processes.
+    started = time.time()
+    result = func(*args)
+    return started, time.time(), result
+
+
+class InstrumentedExecutor:
+    def __init__(self, name: str, workers: int, use_processes: bool = False):
+        self.name = name
+        self.workers = max(1, workers)
+        self.use_processes = use_processes
+        self._executor = None
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_run = 0.0
+    
+    @property
+    def executor(self) -> Executor:
+        with self._lock:
+            if self._executor is None:
+                if self.use_processes:
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                else:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.workers,
+                        thread_name_prefix=self.name
+                    )
+            return self._executor
+    
+    async def run(self, func: Callable, *args) -> Any:
+        loop = asyncio.get_event_loop()
+        with self._lock:
+            self.submitted += 1
+        
+        submitted = time.time()
+        try:
+            started, finished, result = await loop.run_in_executor(
+                self.executor,
+                _timed,
+                func,
+                args
+            )
+        except BaseException:
+            with self._lock:
+                self.failed += 1
+            raise
+        
+        wait = max(0.0, started - submitted)
+        with self._lock:
+            self.completed += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            self.total_run += finished - started
+        return result
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            in_flight = self.submitted - self.completed - self.failed
+            finished = self.completed
+            return {
+                "kind": "process" if self.use_processes else "thread",
+                "workers": self.workers,
+                "in_flight": in_flight,
+                "queue_depth": max(0, in_flight - self.workers),
+                "completed": self.completed,
+                "failed": self.failed,
+                "average_wait_ms": 1000 * self.total_wait / finished if finished else 0.0,
+                "max_wait_ms": 1000 * self.max_wait,
+                "average_run_ms": 1000 * self.total_run / finished if finished else 0.0
+            }
+    
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+
+def _build_executors() -> Dict[str, InstrumentedExecutor]:
+    sizes = {
+        "interactive": settings.EXECUTOR_INTERACTIVE_WORKERS,
+        "bulk_embedding": settings.EXECUTOR_BULK_EMBEDDING_WORKERS,
+        "transcription": settings.EXECUTOR_TRANSCRIPTION_WORKERS,
+        "extraction": settings.EXECUTOR_EXTRACTION_WORKERS,
+        "index_io": settings.EXECUTOR_INDEX_IO_WORKERS,
+        "reranker": settings.EXECUTOR_RERANKER_WORKERS
+    }
+    
+    unknown = set(settings.EXECUTOR_PROCESS_POOLS) - set(PROCESS_CAPABLE)
+    if unknown:
+        raise ValueError(f"Executors cannot use process pools: {sorted(unknown)}")
+    
+    return {
+        name: InstrumentedExecutor(
+            name,
+            workers or os.cpu_count() or 1,
+            use_processes=name in settings.EXECUTOR_PROCESS_POOLS
+        )
+        for name, workers in sizes.items()
+    }
+
+
+executors = _build_executors()
+
+
+def get_executor(name: str) -> InstrumentedExecutor:
+    return executors[name]
+
+
+def executor_stats() -> Dict[str, Dict]:
+    return {name: executor.stats() for name, executor in executors.items()}
+
+
+def shutdown_executors():
+    for executor in executors.values():
+        executor.shutdown(wait=False)
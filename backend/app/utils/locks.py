@@ -0,0 +1,66 @@
+import asyncio
+import threading
+from contextlib import contextmanager
+
+
+class ReadWriteLock:
+    # Many readers or one writer. Waiting writers block new readers, so a
+    # steady stream of searches can't starve an append.
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+    
+    @contextmanager
+    def read(self):
+        with self._condition:
+            while self._writer or self._waiting_writers:
+                self._condition.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+                if not self._readers:
+                    self._condition.notify_all()
+    
+    @contextmanager
+    def write(self):
+        with self._condition:
+            self._waiting_writers += 1
+            try:
+                while self._writer or self._readers:
+                    self._condition.wait()
+            finally:
+                self._waiting_writers -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writer = False
+                self._condition.notify_all()
+
+
+class AsyncThreadLock:
+    # An asyncio.Lock belongs to one event loop, but uploads run on loops of
+    # their own in threadpool threads. This wraps a threading.Lock that any
+    # loop can wait for without blocking it; waiters poll with backoff, so a
+    # cancelled waiter never holds the lock.
+    def __init__(self, max_delay: float = 0.05):
+        self._lock = threading.Lock()
+        self.max_delay = max_delay
+    
+    def locked(self) -> bool:
+        return self._lock.locked()
+    
+    async def __aenter__(self):
+        delay = 0.001
+        while not self._lock.acquire(blocking=False):
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_delay)
+    
+    async def __aexit__(self, *exc_info):
+        self._lock.release()
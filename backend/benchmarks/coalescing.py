@@ -0,0 +1,76 @@
+"""Search throughput with and without request coalescing at several client counts.
+
+Run from the backend directory:
+    
+    python -m benchmarks.coalescing --count 20000 --dimension 384
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+
+from app.config import get_settings
+from app.services.vector_store import VectorStore
+from benchmarks.index_types import synthetic_embeddings
+
+settings = get_settings()
+
+
+async def client(store: VectorStore, queries, top_k: int):
+    for query in queries:
+        await store.search("bench", query, top_k=top_k)
+
+
+async def measure(store: VectorStore, query_vectors, clients: int, top_k: int) -> float:
+    per_client = max(1, len(query_vectors) // clients)
+    started = time.perf_counter()
+    await asyncio.gather(*[
+        client(store, query_vectors[i * per_client:(i + 1) * per_client], top_k)
+        for i in range(clients)
+    ])
+    elapsed = time.perf_counter() - started
+    return per_client * clients / elapsed
+
+
+async def run(count: int, dimension: int, queries: int, top_k: int, client_counts):
+    data = synthetic_embeddings(count, dimension)
+    query_vectors = synthetic_embeddings(queries, dimension, seed=1)
+    
+    with tempfile.TemporaryDirectory() as path:
+        settings.FAISS_INDEX_PATH = path
+        settings.FAISS_FLAT_MAX_VECTORS = count
+        
+        store = VectorStore()
+        await store.create_index("bench", [{"text": ""}] * count, data)
+        
+        print(f"{count} vectors x {dimension} dims, {queries} searches, top_k={top_k}")
+        print(
+            f"window={settings.VECTOR_SEARCH_COALESCE_WINDOW_MS}ms "
+            f"max_batch={settings.VECTOR_SEARCH_COALESCE_MAX_BATCH}"
+        )
+        print(f"{'clients':>7} {'direct qps':>11} {'coalesced qps':>14} {'avg batch':>10}")
+        
+        for clients in client_counts:
+            settings.VECTOR_SEARCH_COALESCE = False
+            direct = await measure(store, query_vectors, clients, top_k)
+            
+            store._coalescer.batches = store._coalescer.items = 0
+            settings.VECTOR_SEARCH_COALESCE = True
+            coalesced = await measure(store, query_vectors, clients, top_k)
+            
+            print(
+                f"{clients:>7} {direct:>11.0f} {coalesced:>14.0f} "
+                f"{store._coalescer.stats()['average_batch']:>10.1f}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--count", type=int, default=20000)
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=2048)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 16, 128])
+    args = parser.parse_args()
+    
+    asyncio.run(run(args.count, args.dimension, args.queries, args.top_k, args.clients))
@@ -0,0 +1,85 @@
+"""Embedding throughput of the torch and ONNX backends at several batch sizes.
+
+Also reports the worst cosine between each backend's vectors and the torch
+vectors for the same sentences, i.e. how far it drifts from existing indexes.
+Needs sentence-transformers, and optimum[onnxruntime] for the ONNX rows.
+
+Run from the backend directory:
+    
+    python -m benchmarks.embedding_backends --sentences 2048 --batch-sizes 1 8 32 128
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.config import get_settings
+from app.services.embedding import load_embedding_model
+
+settings = get_settings()
+
+BACKENDS = [
+    ("torch", "torch", False),
+    ("onnx", "onnx", False),
+    ("onnx-int8", "onnx", True),
+]
+
+
+def synthetic_sentences(count: int, seed: int = 0):
+    # Chunk-like text of 20-120 words drawn from a fixed vocabulary.
+    rng = np.random.default_rng(seed)
+    words = [
+        "document", "revenue", "lecture", "audio", "index", "search", "model",
+        "quarter", "growth", "summary", "question", "answer", "chapter", "video",
+        "transcript", "section", "table", "figure", "result", "method",
+    ]
+    return [
+        " ".join(rng.choice(words, size=rng.integers(20, 120)))
+        for _ in range(count)
+    ]
+
+
+def throughput(model, sentences, batch_size: int) -> float:
+    model.encode(sentences[:batch_size], batch_size=batch_size, normalize_embeddings=True)
+    
+    started = time.perf_counter()
+    model.encode(
+        sentences,
+        batch_size=batch_size,
+        normalize_embeddings=True,
+        show_progress_bar=False
+    )
+    return len(sentences) / (time.perf_counter() - started)
+
+
+def run(sentence_count: int, batch_sizes):
+    sentences = synthetic_sentences(sentence_count)
+    reference = None
+    
+    print(f"{settings.EMBEDDING_MODEL}, {sentence_count} sentences")
+    header = " ".join(f"{f'batch {size}':>10}" for size in batch_sizes)
+    print(f"{'backend':>10} {header} {'min cosine':>11}")
+    
+    for label, backend, quantize in BACKENDS:
+        try:
+            model = load_embedding_model(settings.EMBEDDING_MODEL, backend, quantize=quantize)
+        except ImportError as e:
+            print(f"{label:>10} skipped: {e}")
+            continue
+        
+        vectors = model.encode(sentences[:256], normalize_embeddings=True)
+        if label == "torch":
+            reference = vectors
+        cosine = float(np.sum(reference * vectors, axis=1).min()) if reference is not None else float("nan")
+        
+        rates = " ".join(f"{throughput(model, sentences, size):>10.1f}" for size in batch_sizes)
+        print(f"{label:>10} {rates} {cosine:>11.5f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sentences", type=int, default=2048)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32, 128])
+    args = parser.parse_args()
+    
+    run(args.sentences, args.batch_sizes)
@@ -0,0 +1,89 @@
+"""Time and Python allocations for indexing one large document.
+
+The model is replaced by a stand-in returning precomputed float32 vectors,
+so only the hand-off from embeddings to the index is measured. The list
+variant reproduces the old `.tolist()` / `np.array(...)` round trip.
+
+Run from the backend directory:
+    
+    python -m benchmarks.embedding_path --chunks 5000 --dimension 384
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from app.config import get_settings
+from app.services.embedding import EmbeddingService
+from app.services.rag_pipeline import RAGPipeline
+from app.services.vector_store import vector_store
+from benchmarks.index_types import synthetic_embeddings
+
+settings = get_settings()
+
+
+class PrecomputedModel:
+    def __init__(self, vectors: np.ndarray):
+        self.vectors = vectors
+    
+    def encode(self, texts, **kwargs):
+        return self.vectors[:len(texts)].copy()
+
+
+async def index_with_lists(pipeline: RAGPipeline, document_id: str, chunks):
+    embeddings = await pipeline.embedding_service.embed_texts([chunk["text"] for chunk in chunks])
+    as_lists = [embedding.tolist() for embedding in embeddings]
+    vectors = np.array(as_lists).astype('float32')
+    await vector_store.create_index(document_id, chunks, vectors)
+
+
+async def index_with_arrays(pipeline: RAGPipeline, document_id: str, chunks):
+    await pipeline.index_document(document_id, chunks)
+
+
+async def measure(label: str, index, pipeline: RAGPipeline, chunks, rounds: int):
+    # Tracing slows allocation-heavy code, so time and peak come from
+    # separate runs.
+    timings = []
+    for i in range(rounds):
+        started = time.perf_counter()
+        await index(pipeline, f"{label}{i}", chunks)
+        timings.append(time.perf_counter() - started)
+        await vector_store.delete_index(f"{label}{i}")
+    
+    tracemalloc.start()
+    await index(pipeline, f"{label}traced", chunks)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    await vector_store.delete_index(f"{label}traced")
+    
+    print(f"{label:>8} {1000 * min(timings):>10.1f} {peak / 2 ** 20:>16.1f}")
+
+
+async def run(chunks: int, dimension: int, rounds: int):
+    settings.EMBEDDING_CACHE_ENABLED = False
+    EmbeddingService._model = PrecomputedModel(synthetic_embeddings(chunks, dimension))
+    
+    texts = [{"text": f"chunk {i}", "index": i} for i in range(chunks)]
+    
+    with tempfile.TemporaryDirectory() as path:
+        settings.FAISS_INDEX_PATH = path
+        pipeline = RAGPipeline()
+        
+        print(f"{chunks} chunks x {dimension} dims, best of {rounds}")
+        print(f"{'path':>8} {'index ms':>10} {'peak Python MB':>16}")
+        await measure("lists", index_with_lists, pipeline, texts, rounds)
+        await measure("arrays", index_with_arrays, pipeline, texts, rounds)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=5000)
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+    
+    asyncio.run(run(args.chunks, args.dimension, args.rounds))
@@ -0,0 +1,96 @@
+"""Recall versus latency for each VectorStore index type on synthetic data.
+
+Run from the backend directory:
+    
+    python -m benchmarks.index_types --count 20000 --dimension 384
+"""
+import argparse
+import time
+import numpy as np
+
+from app.services.index_builder import build_index, search_parameters
+
+
+def synthetic_embeddings(count: int, dimension: int, seed: int = 0) -> np.ndarray:
+    # Sentence embeddings have a low intrinsic dimension, so project a
+    # small latent space up to the model dimension and add a little noise.
+    projection = np.random.default_rng(0).standard_normal((32, dimension))
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((count, 32)) @ projection
+    vectors += 0.5 * rng.standard_normal((count, dimension))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return np.ascontiguousarray(vectors, dtype='float32')
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def run(count: int, dimension: int, queries: int, top_k: int):
+    data = synthetic_embeddings(count, dimension)
+    query_vectors = synthetic_embeddings(queries, dimension, seed=1)
+    
+    nlist = max(1, min(int(4 * np.sqrt(count)), count // 39))
+    pq_m = dimension // 8
+    specs = [
+        ("flat", {"index_type": "flat", "factory": "Flat", "params": {}}, [{}]),
+        (
+            "hnsw",
+            {
+                "index_type": "hnsw",
+                "factory": "HNSW32",
+                "params": {"M": 32, "ef_construction": 80, "ef_search": 64}
+            },
+            [{"ef_search": ef} for ef in (16, 32, 64, 128, 256)]
+        ),
+        (
+            "ivfpq",
+            {
+                "index_type": "ivfpq",
+                "factory": f"IVF{nlist},PQ{pq_m}",
+                "params": {"nlist": nlist, "pq_m": pq_m, "nprobe": 16}
+            },
+            [{"nprobe": probes} for probes in (1, 4, 16, 64)]
+        )
+    ]
+    
+    truth = None
+    print(f"{count} vectors x {dimension} dims, {queries} single-query searches, recall@{top_k}")
+    print(f"{'index':<8} {'knob':<16} {'build s':>8} {'ms/query':>9} {'recall':>7}")
+    
+    for name, spec, knobs in specs:
+        spec = dict(spec, dimension=dimension, count=count)
+        
+        started = time.perf_counter()
+        index = build_index(data, spec)
+        build_seconds = time.perf_counter() - started
+        
+        for knob in knobs:
+            params = search_parameters(spec, top_k, **knob)
+            labels = np.empty((queries, top_k), dtype='int64')
+            
+            started = time.perf_counter()
+            for i in range(queries):
+                labels[i] = index.search(query_vectors[i:i + 1], top_k, params=params)[1][0]
+            elapsed = time.perf_counter() - started
+            
+            if truth is None:
+                truth = labels.copy()
+            
+            knob_label = ", ".join(f"{key}={value}" for key, value in knob.items()) or "-"
+            print(
+                f"{name:<8} {knob_label:<16} {build_seconds:>8.2f} "
+                f"{1000 * elapsed / queries:>9.3f} {recall_at_k(labels, truth):>7.3f}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--count", type=int, default=20000)
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    args = parser.parse_args()
+    
+    run(args.count, args.dimension, args.queries, args.top_k)
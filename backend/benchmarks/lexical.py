@@ -0,0 +1,61 @@
+"""BM25 build time, postings size and per-query latency on synthetic chunks.
+
+Run from the backend directory:
+    
+    python -m benchmarks.lexical --chunks 10000 --tokens 180
+"""
+import argparse
+import os
+import tempfile
+import time
+import numpy as np
+
+from app.services.lexical_index import LexicalIndex, LexicalSegments
+
+
+def synthetic_texts(chunks: int, tokens: int, vocabulary: int = 50000, seed: int = 0):
+    # Word frequencies in prose are roughly Zipfian.
+    rng = np.random.default_rng(seed)
+    words = np.array([f"w{i}" for i in range(vocabulary)])
+    ranks = np.minimum(rng.zipf(1.2, size=(chunks, tokens)), vocabulary) - 1
+    return [" ".join(words[row]) for row in ranks], words
+
+
+def run(chunks: int, tokens: int, queries: int, top_k: int):
+    texts, words = synthetic_texts(chunks, tokens)
+    rng = np.random.default_rng(1)
+    query_texts = [
+        " ".join(words[rng.integers(0, 2000, size=rng.integers(2, 6))])
+        for _ in range(queries)
+    ]
+    
+    started = time.perf_counter()
+    index = LexicalIndex.build(texts, np.arange(chunks))
+    build = time.perf_counter() - started
+    
+    with tempfile.TemporaryDirectory() as path:
+        index_path = os.path.join(path, "bench.lexical.npz")
+        index.save(index_path)
+        size = os.path.getsize(index_path)
+        segments = LexicalSegments([LexicalIndex.load(index_path)])
+    
+    started = time.perf_counter()
+    for query in query_texts:
+        segments.search(query, top_k)
+    elapsed = time.perf_counter() - started
+    
+    text_bytes = sum(len(text) for text in texts)
+    print(f"{chunks} chunks x {tokens} tokens, {queries} queries of 2-5 terms, top_k={top_k}")
+    print(f"build {build:.2f} s, postings {size / 2 ** 20:.2f} MB ({size / text_bytes:.2f}x raw text)")
+    print(f"{1000 * elapsed / queries:.3f} ms / query")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=10000)
+    parser.add_argument("--tokens", type=int, default=180)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--top-k", type=int, default=20)
+    args = parser.parse_args()
+    
+    run(args.chunks, args.tokens, args.queries, args.top_k)
@@ -0,0 +1,71 @@
+"""Per-call versus pooled HTTP clients against a local inference stand-in.
+
+The stand-in (`benchmarks/llm_stub.py`) answers instantly, so the numbers
+are the client-side cost of reaching the endpoint: connection setup, TLS
+handshake and request round trip. "per-call" reproduces the old
+`async with httpx.AsyncClient()` around every LLM request.
+
+Run from the backend directory:
+    
+    python -m benchmarks.llm_client --requests 200 --concurrency 1 8
+"""
+import argparse
+import asyncio
+import time
+
+from app.services.llm_client import create_llm_client
+from benchmarks.llm_stub import StubLLMServer
+
+PAYLOAD = {"inputs": "question", "parameters": {"max_new_tokens": 16}}
+
+
+async def per_call(server: StubLLMServer, url: str, requests: int, concurrency: int):
+    async def one():
+        async with create_llm_client(verify=server.verify) as client:
+            (await client.post(url, json=PAYLOAD)).raise_for_status()
+    
+    await run_requests(one, requests, concurrency)
+
+
+async def pooled(server: StubLLMServer, url: str, requests: int, concurrency: int):
+    async with create_llm_client(verify=server.verify) as client:
+        async def one():
+            (await client.post(url, json=PAYLOAD)).raise_for_status()
+        
+        await run_requests(one, requests, concurrency)
+
+
+async def run_requests(one, requests: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def limited():
+        async with semaphore:
+            await one()
+    
+    await asyncio.gather(*(limited() for _ in range(requests)))
+
+
+async def run(requests: int, concurrency_levels):
+    print(f"{requests} requests per row")
+    print(f"{'transport':>9} {'clients':>8} {'mode':>9} {'ms / request':>13} {'connections':>12}")
+    for tls in (False, True):
+        for concurrency in concurrency_levels:
+            for label, mode in (("per-call", per_call), ("pooled", pooled)):
+                async with StubLLMServer(tls=tls) as server:
+                    url = f"{server.base_url}/stub"
+                    started = time.perf_counter()
+                    await mode(server, url, requests, concurrency)
+                    elapsed = time.perf_counter() - started
+                    print(
+                        f"{'https' if tls else 'http':>9} {concurrency:>8} {label:>9} "
+                        f"{1000 * elapsed / requests:>13.2f} {server.connections:>12}"
+                    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8])
+    args = parser.parse_args()
+    
+    asyncio.run(run(args.requests, args.concurrency))
@@ -0,0 +1,174 @@
+"""A local stand-in for the Hugging Face inference endpoint.
+
+Answers `POST /models/<name>` with a fixed completion over HTTP/1.1
+keep-alive, optionally behind TLS with a throwaway self-signed certificate,
+and counts the connections it accepts so clients can be compared by the
+handshakes they cause. Requests with `"stream": true` get TGI-style
+server-sent events, one token every `token_delay` seconds; streams the
+client abandons are counted in `aborted`.
+"""
+import asyncio
+import datetime
+import json
+import os
+import re
+import ssl
+import tempfile
+from typing import Optional
+
+COMPLETION = "The warranty lasts two years from the date of purchase."
+
+
+def self_signed_certificate(directory: str):
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+    import ipaddress
+    
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "127.0.0.1")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    certificate = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(minutes=1))
+        .not_valid_after(now + datetime.timedelta(hours=1))
+        .add_extension(
+            x509.SubjectAlternativeName([x509.IPAddress(ipaddress.ip_address("127.0.0.1"))]),
+            critical=False
+        )
+        .sign(key, hashes.SHA256())
+    )
+    
+    cert_path = os.path.join(directory, "stub.crt")
+    key_path = os.path.join(directory, "stub.key")
+    with open(cert_path, "wb") as f:
+        f.write(certificate.public_bytes(serialization.Encoding.PEM))
+    with open(key_path, "wb") as f:
+        f.write(key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption()
+        ))
+    return cert_path, key_path
+
+
+class StubLLMServer:
+    def __init__(
+        self,
+        completion: str = COMPLETION,
+        latency: float = 0.0,
+        token_delay: float = 0.0,
+        tls: bool = False
+    ):
+        self.completion = completion
+        self.latency = latency
+        self.token_delay = token_delay
+        self.tls = tls
+        self.connections = 0
+        self.requests = 0
+        self.aborted = 0
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.client_ssl: Optional[ssl.SSLContext] = None
+        self._directory: Optional[tempfile.TemporaryDirectory] = None
+    
+    async def __aenter__(self) -> "StubLLMServer":
+        server_ssl = None
+        if self.tls:
+            self._directory = tempfile.TemporaryDirectory()
+            cert_path, key_path = self_signed_certificate(self._directory.name)
+            server_ssl = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+            server_ssl.load_cert_chain(cert_path, key_path)
+            self.client_ssl = ssl.create_default_context(cafile=cert_path)
+        
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0, ssl=server_ssl)
+        return self
+    
+    async def __aexit__(self, *exc_info):
+        self.server.close()
+        await self.server.wait_closed()
+        if self._directory is not None:
+            self._directory.cleanup()
+    
+    @property
+    def base_url(self) -> str:
+        port = self.server.sockets[0].getsockname()[1]
+        return f"{'https' if self.tls else 'http'}://127.0.0.1:{port}/models"
+    
+    @property
+    def verify(self):
+        return self.client_ssl if self.tls else True
+    
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                self.requests += 1
+                payload = json.loads(body or b"{}")
+                if payload.get("stream"):
+                    await self._stream(reader, writer)
+                else:
+                    await self._respond(writer)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+    
+    async def _respond(self, writer: asyncio.StreamWriter):
+        await asyncio.sleep(self.latency)
+        body = json.dumps([{"generated_text": self.completion}]).encode()
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: application/json\r\n"
+            b"Content-Length: " + str(len(body)).encode() + b"\r\n"
+            b"\r\n" + body
+        )
+        await writer.drain()
+    
+    async def _stream(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        await asyncio.sleep(self.latency)
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: text/event-stream\r\n"
+            b"Transfer-Encoding: chunked\r\n"
+            b"\r\n"
+        )
+        
+        # Tokens carry their leading whitespace, as TGI's do.
+        tokens = re.findall(r"\s*\S+", self.completion)
+        for position, text in enumerate(tokens):
+            if position:
+                await asyncio.sleep(self.token_delay)
+            if reader.at_eof():
+                self.aborted += 1
+                return
+            
+            last = position == len(tokens) - 1
+            event = {
+                "token": {"id": position, "text": text, "logprob": 0.0, "special": False},
+                "generated_text": self.completion if last else None,
+                "details": None
+            }
+            data = f"data:{json.dumps(event)}\n\n".encode()
+            writer.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            await writer.drain()
+        
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
@@ -0,0 +1,66 @@
+"""Cross-document retrieval latency against the number of selected documents.
+
+The query embedding is computed once per question in both cases, so it is
+held fixed here and only the fan-out and merge are timed.
+
+Run from the backend directory:
+    
+    python -m benchmarks.multi_document --documents 50 --chunks 2000
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+
+from app.config import get_settings
+from app.services.rag_pipeline import RAGPipeline
+from app.services.vector_store import vector_store
+from benchmarks.index_types import synthetic_embeddings
+
+settings = get_settings()
+
+
+async def run(documents: int, chunks: int, dimension: int, queries: int, top_k: int):
+    query_vectors = synthetic_embeddings(queries, dimension, seed=1)
+    
+    with tempfile.TemporaryDirectory() as path:
+        settings.FAISS_INDEX_PATH = path
+        
+        document_ids = [f"bench{i}" for i in range(documents)]
+        for i, document_id in enumerate(document_ids):
+            data = synthetic_embeddings(chunks, dimension, seed=100 + i)
+            await vector_store.create_index(document_id, [{"text": ""}] * chunks, data)
+        
+        pipeline = RAGPipeline()
+        current = {"query": None}
+        
+        async def fixed_embedding(text):
+            return current["query"]
+        
+        pipeline.embedding_service.embed_text = fixed_embedding
+        
+        print(
+            f"{chunks} chunks x {dimension} dims per document, {queries} questions, "
+            f"top_k={top_k}, concurrency={settings.MULTI_DOC_SEARCH_CONCURRENCY}"
+        )
+        print(f"{'documents':>9} {'ms / question':>14}")
+        
+        for count in sorted({1, min(10, documents), documents}):
+            started = time.perf_counter()
+            for query in query_vectors:
+                current["query"] = query
+                await pipeline.retrieve_context_many(document_ids[:count], "", top_k=top_k)
+            elapsed = time.perf_counter() - started
+            print(f"{count:>9} {1000 * elapsed / queries:>14.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--documents", type=int, default=50)
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+    
+    asyncio.run(run(args.documents, args.chunks, args.dimension, args.queries, args.top_k))
@@ -0,0 +1,72 @@
+"""Index size, latency and recall@k for each FAISS_STORAGE_MODE.
+
+Run from the backend directory:
+    
+    python -m benchmarks.quantization --count 20000 --dimension 384
+"""
+import argparse
+import time
+import numpy as np
+
+from app.config import get_settings
+from app.services.index_builder import (
+    STORAGE_MODES, select_index_spec, build_index, search_index
+)
+from benchmarks.index_types import synthetic_embeddings, recall_at_k
+
+settings = get_settings()
+
+
+def index_nbytes(index, spec) -> int:
+    import faiss
+    
+    if spec["index_type"] == "binary":
+        return int(faiss.serialize_index_binary(index).nbytes)
+    return int(faiss.serialize_index(index).nbytes)
+
+
+def run(count: int, dimension: int, queries: int, top_k: int):
+    data = synthetic_embeddings(count, dimension)
+    query_vectors = synthetic_embeddings(queries, dimension, seed=1)
+    
+    # Compare storage modes on the flat family only.
+    settings.FAISS_FLAT_MAX_VECTORS = count
+    
+    truth = None
+    baseline_bytes = None
+    print(f"{count} vectors x {dimension} dims, {queries} single-query searches, recall@{top_k}")
+    print(f"{'storage':<8} {'factory':<10} {'index MB':>9} {'vs float':>9} {'ms/query':>9} {'recall':>7}")
+    
+    for mode in STORAGE_MODES:
+        settings.FAISS_STORAGE_MODE = mode
+        spec = select_index_spec(count, dimension)
+        index = build_index(data, spec)
+        
+        labels = np.empty((queries, top_k), dtype='int64')
+        started = time.perf_counter()
+        for i in range(queries):
+            _, found = search_index(index, spec, query_vectors[i:i + 1], top_k, fetch_vectors=data.__getitem__)
+            labels[i] = found[0]
+        elapsed = time.perf_counter() - started
+        
+        nbytes = index_nbytes(index, spec)
+        if truth is None:
+            truth = labels.copy()
+            baseline_bytes = nbytes
+        
+        print(
+            f"{spec['storage']:<8} {spec['factory']:<10} {nbytes / 2 ** 20:>9.2f} "
+            f"{nbytes / baseline_bytes:>9.3f} {1000 * elapsed / queries:>9.3f} "
+            f"{recall_at_k(labels, truth):>7.3f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--count", type=int, default=20000)
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    args = parser.parse_args()
+    
+    run(args.count, args.dimension, args.queries, args.top_k)
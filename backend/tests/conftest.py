@@ -142,9 +142,17 @@ def mock_embedding():
 @pytest.fixture
 def mock_llm():
     """Mock LLM service."""
-    with patch("app.services.llm_service.httpx.AsyncClient") as mock:
+    with patch("app.services.llm_client.create_llm_client") as mock:
         response = MagicMock()
         response.status_code = 200
         response.json.return_value = [{"generated_text": "AI generated response"}]
         mock.return_value.__aenter__.return_value.post = AsyncMock(return_value=response)
         yield mock
+
+
+@pytest.fixture
+def faiss_index_dir(tmp_path, monkeypatch):
+    """Point the vector store at a temporary index directory."""
+    from app.config import get_settings
+    monkeypatch.setattr(get_settings(), "FAISS_INDEX_PATH", str(tmp_path))
+    return tmp_path
@@ -35,6 +35,17 @@ class TestChatModels:
         assert request.message == "Summarize the document"
         assert request.stream is False
     
+    def test_multi_chat_request_requires_documents(self):
+        """Test that a multi-document request needs at least one document."""
+        from pydantic import ValidationError
+        from app.models.chat import MultiChatRequest
+        
+        with pytest.raises(ValidationError):
+            MultiChatRequest(message="Compare these", document_ids=[])
+        
+        request = MultiChatRequest(message="Compare these", document_ids=["a", "b"])
+        assert request.top_k == 5
+    
     def test_chat_response_with_timestamps(self):
         """Test chat response with timestamps."""
         from app.models.chat import ChatResponse
@@ -62,8 +73,201 @@ class TestEmbeddingService:
         with patch.object(service, '_embed_sync', return_value=np.random.rand(384)):
             embedding = await service.embed_text("Test text")
             
-            assert isinstance(embedding, list)
-            assert len(embedding) == 384
+            assert isinstance(embedding, np.ndarray)
+            assert embedding.dtype == np.float32
+            assert embedding.shape == (384,)
+    
+    @pytest.mark.asyncio
+    async def test_embed_texts_encodes_only_cache_misses(self, monkeypatch):
+        """Test that cached texts are not re-encoded."""
+        from app.services import embedding
+        from app.services.embedding import EmbeddingService
+        from app.services.embedding_cache import EmbeddingCache
+        
+        cache = EmbeddingCache(max_bytes=1024 * 1024)
+        monkeypatch.setattr(embedding, "embedding_cache", cache)
+        service = EmbeddingService()
+        
+        def fake_batch(texts):
+            return np.array([[float(len(text))] * 384 for text in texts], dtype='float32')
+        
+        with patch.object(service, '_embed_batch_sync', side_effect=fake_batch) as encode:
+            first = await service.embed_texts(["alpha", "be", "alpha"])
+            second = await service.embed_texts(["be  ", "gamma"])
+        
+        assert [call.args[0] for call in encode.call_args_list] == [["alpha", "be"], ["gamma"]]
+        assert first.shape == (3, 384)
+        assert first.dtype == np.float32 and first.flags.c_contiguous
+        assert np.array_equal(first[0], first[2])
+        assert np.array_equal(second[0], first[1])
+        
+        stats = cache.stats()
+        assert stats["memory_hits"] == 1
+        assert stats["misses"] == 4
+        assert stats["bytes_saved"] == 384 * 4
+    
+    @pytest.mark.asyncio
+    async def test_concurrent_embed_text_calls_share_one_encode(self, monkeypatch):
+        """Test that concurrent queries are encoded in one batch."""
+        import asyncio
+        from app.services import embedding
+        from app.services.embedding import EmbeddingService
+        from app.services.embedding_cache import EmbeddingCache
+        
+        monkeypatch.setattr(embedding, "embedding_cache", EmbeddingCache())
+        monkeypatch.setattr(EmbeddingService, "_batcher", None)
+        
+        model = MagicMock()
+        model.encode.side_effect = lambda texts, **kwargs: np.array(
+            [[float(len(text))] * 384 for text in texts], dtype='float32'
+        )
+        
+        with patch.object(EmbeddingService, "get_model", return_value=model):
+            questions = ["a", "bb", "ccc", "bb"]
+            results = await asyncio.gather(*[
+                EmbeddingService().embed_text(question) for question in questions
+            ])
+        
+        model.encode.assert_called_once()
+        assert model.encode.call_args.args[0] == ["a", "bb", "ccc"]
+        assert [result[0] for result in results] == [1.0, 2.0, 3.0, 2.0]
+        assert EmbeddingService.get_batcher().stats()["largest_batch"] == 4
+    
+    def test_unknown_embedding_backend_is_rejected(self):
+        """Test that a misconfigured backend fails before loading anything."""
+        from app.services.embedding import load_embedding_model
+        
+        with pytest.raises(ValueError):
+            load_embedding_model("sentence-transformers/all-MiniLM-L6-v2", "tensorrt")
+    
+    @pytest.mark.parametrize("quantize,min_cosine", [(False, 0.9999), (True, 0.98)])
+    def test_onnx_backend_matches_torch(self, monkeypatch, tmp_path, quantize, min_cosine):
+        """Test that ONNX vectors stay compatible with torch-built indexes."""
+        pytest.importorskip("sentence_transformers")
+        pytest.importorskip("optimum.onnxruntime")
+        from app.services import embedding
+        from app.services.embedding import load_embedding_model
+        
+        monkeypatch.setattr(embedding.settings, "EMBEDDING_ONNX_PATH", str(tmp_path))
+        model_name = embedding.settings.EMBEDDING_MODEL
+        sentences = [
+            "The quarterly report shows revenue growth.",
+            "Whisper transcribes the lecture audio.",
+            "FAISS searches the chunk embeddings.",
+            "short",
+        ]
+        
+        reference = load_embedding_model(model_name, "torch").encode(
+            sentences, normalize_embeddings=True
+        )
+        candidate = load_embedding_model(model_name, "onnx", quantize=quantize).encode(
+            sentences, normalize_embeddings=True
+        )
+        
+        cosines = np.sum(reference * candidate, axis=1)
+        assert cosines.min() >= min_cosine
+    
+    def test_length_buckets_respect_token_budget(self):
+        """Test that buckets are length-sorted and stay within the padded budget."""
+        from app.services.embedding import estimate_tokens, length_buckets
+        
+        texts = [" ".join(["word"] * n) for n in (50, 3, 200, 8, 3, 120, 30)]
+        buckets = length_buckets(texts, token_budget=256, max_batch=4)
+        
+        assert sorted(text for bucket in buckets for text in bucket) == sorted(texts)
+        lengths = [estimate_tokens(text) for bucket in buckets for text in bucket]
+        assert lengths == sorted(lengths)
+        for bucket in buckets:
+            assert len(bucket) <= 4
+            assert len(bucket) == 1 or len(bucket) * estimate_tokens(bucket[-1]) <= 256
+    
+    @pytest.mark.asyncio
+    async def test_embed_texts_restores_order_and_reports_progress(self, monkeypatch):
+        """Test that bucketed encoding returns rows in input order."""
+        from app.services import embedding
+        from app.services.embedding import EmbeddingService
+        
+        monkeypatch.setattr(embedding.settings, "EMBEDDING_CACHE_ENABLED", False)
+        monkeypatch.setattr(embedding.settings, "EMBEDDING_BULK_TOKEN_BUDGET", 64)
+        
+        def fake_batch(texts):
+            return np.array([[float(len(text))] * 8 for text in texts], dtype='float32')
+        
+        texts = [" ".join(["w"] * n) for n in (40, 2, 25, 2, 9, 40)]
+        reports = []
+        
+        async def progress(done, total):
+            reports.append((done, total))
+        
+        service = EmbeddingService()
+        with patch.object(service, '_embed_batch_sync', side_effect=fake_batch) as encode:
+            result = await service.embed_texts(texts, progress=progress)
+        
+        assert encode.call_count > 1
+        assert result.shape == (6, 8) and result.dtype == np.float32
+        assert result[:, 0].tolist() == [float(len(text)) for text in texts]
+        assert reports[-1] == (6, 6)
+        assert [done for done, _ in reports] == sorted(done for done, _ in reports)
+    
+    def test_embedding_cache_respects_memory_budget(self):
+        """Test that the in-process LRU stays within its byte budget."""
+        import asyncio
+        from app.services.embedding_cache import EmbeddingCache
+        
+        cache = EmbeddingCache(max_bytes=3 * 384 * 2, dtype="float16")
+        vectors = np.random.rand(5, 384).astype('float32')
+        asyncio.run(cache.put_many([f"text {i}" for i in range(5)], vectors))
+        
+        assert cache.resident_bytes <= cache.max_bytes
+        assert len(cache.entries) == 3
+        
+        cached = asyncio.run(cache.get_many(["text 4", "text 0"]))
+        assert np.allclose(cached[0], vectors[4], atol=1e-3)
+        assert cached[1] is None
+    
+    def test_embedding_cache_key_covers_model_variant(self, monkeypatch):
+        """Test that backend and quantisation changes miss old entries."""
+        from app.services import embedding_cache
+        from app.services.embedding_cache import EmbeddingCache
+        
+        cache = EmbeddingCache()
+        monkeypatch.setattr(embedding_cache.settings, "EMBEDDING_BACKEND", "torch")
+        keys = {cache.key("same text")}
+        
+        monkeypatch.setattr(embedding_cache.settings, "EMBEDDING_BACKEND", "onnx")
+        monkeypatch.setattr(embedding_cache.settings, "EMBEDDING_ONNX_QUANTIZE", False)
+        keys.add(cache.key("same text"))
+        
+        monkeypatch.setattr(embedding_cache.settings, "EMBEDDING_ONNX_QUANTIZE", True)
+        for config in ("avx2", "avx512_vnni"):
+            monkeypatch.setattr(embedding_cache.settings, "EMBEDDING_ONNX_QUANTIZATION_CONFIG", config)
+            keys.add(cache.key("same text"))
+        
+        keys.add(EmbeddingCache(dtype="float32").key("same text"))
+        assert len(keys) == 5
+    
+    def test_worker_loop_gets_its_own_redis_client(self, mock_redis):
+        """Test that an upload's own event loop reaches the Redis tier."""
+        import asyncio
+        from app.db import redis as redis_module
+        
+        worker_client = MagicMock()
+        worker_client.mget = AsyncMock(return_value=[b"cached"])
+        worker_client.close = AsyncMock()
+        
+        async def ingest():
+            outside = await redis_module.cache_get_many_bytes(["key"])
+            async with redis_module.loop_redis():
+                inside = await redis_module.cache_get_many_bytes(["key"])
+            return outside, inside
+        
+        with patch.object(redis_module.redis, "from_url", return_value=worker_client):
+            outside, inside = asyncio.run(ingest())
+        
+        assert outside == [None]
+        assert inside == [b"cached"]
+        worker_client.close.assert_awaited_once()
+        assert not redis_module._loop_clients
     
     @pytest.mark.asyncio
     async def test_compute_similarity(self):
@@ -111,6 +315,28 @@ class TestPDFProcessor:
         assert len(chunks) > 1
         for chunk in chunks:
             assert len(chunk["text"]) <= 600  # chunk_size + some buffer
+    
+    def test_assign_pages(self):
+        """Test that chunks are tagged with the pages they span."""
+        from app.services.pdf_processor import PDFProcessor
+        
+        processor = PDFProcessor()
+        pages = [
+            {"page_number": 1, "text": "  First page. " * 20},
+            {"page_number": 2, "text": "Second page. " * 20},
+            {"page_number": 3, "text": "Third page. " * 20}
+        ]
+        text = "\n\n".join(page["text"] for page in pages).strip()
+        
+        chunks = processor.chunk_text(text, chunk_size=200, overlap=20)
+        processor.assign_pages(chunks, text, pages)
+        
+        assert chunks[0]["page_start"] == 1
+        assert chunks[-1]["page_end"] == 3
+        for chunk in chunks:
+            assert chunk["page_start"] <= chunk["page_end"]
+            if chunk["page_start"] == chunk["page_end"] == 2:
+                assert "Second" in chunk["text"]
 
 
 class TestTranscriptionService:
@@ -141,7 +367,7 @@ class TestVectorStore:
     """Tests for FAISS vector store."""
     
     @pytest.mark.asyncio
-    async def test_create_and_search(self):
+    async def test_create_and_search(self, faiss_index_dir):
         """Test creating index and searching."""
         from app.services.vector_store import VectorStore
         import numpy as np
@@ -172,7 +398,7 @@ class TestVectorStore:
         assert "score" in results[0]
     
     @pytest.mark.asyncio
-    async def test_delete_index(self):
+    async def test_delete_index(self, faiss_index_dir):
         """Test deleting an index."""
         from app.services.vector_store import VectorStore
         import numpy as np
@@ -239,6 +465,168 @@ class TestLLMService:
         
         assert len(summary.split()) <= 15  # Some buffer for sentence completion
     
+    @pytest.mark.asyncio
+    async def test_requests_share_pooled_client(self, monkeypatch):
+        """Test that LLM calls reuse the application's pooled connection."""
+        from app.services import llm_client, llm_service
+        from app.services.llm_service import LLMService
+        from benchmarks.llm_stub import StubLLMServer
+        
+        async with StubLLMServer() as server:
+            monkeypatch.setattr(llm_service.settings, "HUGGINGFACE_API_URL", server.base_url)
+            await llm_client.open_llm_client()
+            try:
+                for question in ("First?", "Second?", "Third?"):
+                    answer, _ = await LLMService().generate_response(question, [{"text": "Context"}])
+                    assert answer == server.completion
+                stats = llm_client.llm_client_stats()
+            finally:
+                await llm_client.close_llm_client()
+        
+        assert server.requests == 3
+        assert server.connections == 1
+        assert stats["open"] is True
+        assert stats["connections"] == 1
+        assert stats["idle"] == 1
+        assert llm_client.llm_client_stats()["open"] is False
+    
+    @pytest.mark.asyncio
+    async def test_stream_forwards_tokens_as_generated(self, monkeypatch):
+        """Test that the first token arrives long before generation finishes."""
+        import time
+        from app.services import llm_client, llm_service
+        from app.services.llm_service import LLMService
+        from benchmarks.llm_stub import StubLLMServer
+        
+        completion = "Line one,\n  line two and   spaced words at the end."
+        async with StubLLMServer(completion=completion, token_delay=0.05) as server:
+            monkeypatch.setattr(llm_service.settings, "HUGGINGFACE_API_URL", server.base_url)
+            await llm_client.open_llm_client()
+            try:
+                service = LLMService()
+                started = time.perf_counter()
+                first_token = None
+                tokens = []
+                async for token in service.generate_response_stream("Question?", [{"text": "Context"}]):
+                    first_token = first_token or time.perf_counter() - started
+                    tokens.append(token)
+                total = time.perf_counter() - started
+            finally:
+                await llm_client.close_llm_client()
+        
+        assert len(tokens) == 10
+        assert "".join(tokens) == completion
+        assert service.used_fallback is False
+        assert first_token < total / 3
+        assert total >= 0.45
+    
+    @pytest.mark.asyncio
+    async def test_stream_cancels_backend_when_consumer_leaves(self, monkeypatch):
+        """Test that closing the stream early aborts the backend generation."""
+        import asyncio
+        from app.services import llm_client, llm_service
+        from app.services.llm_service import LLMService
+        from benchmarks.llm_stub import StubLLMServer
+        
+        async with StubLLMServer(token_delay=0.02) as server:
+            monkeypatch.setattr(llm_service.settings, "HUGGINGFACE_API_URL", server.base_url)
+            await llm_client.open_llm_client()
+            try:
+                stream = LLMService().generate_response_stream("Question?", [{"text": "Context"}])
+                assert await stream.__anext__() == "The"
+                await stream.aclose()
+                await asyncio.sleep(0.1)
+            finally:
+                await llm_client.close_llm_client()
+        
+        assert server.aborted == 1
+    
+    @pytest.mark.asyncio
+    async def test_stream_falls_back_when_backend_fails(self, monkeypatch):
+        """Test that an unreachable backend yields the fallback answer once."""
+        from app.services import llm_service
+        from app.services.llm_service import LLMService
+        
+        monkeypatch.setattr(llm_service.settings, "HUGGINGFACE_API_URL", "http://127.0.0.1:9/models")
+        service = LLMService()
+        
+        tokens = [
+            token async for token in service.generate_response_stream(
+                "Question?", [{"text": "Document content here"}]
+            )
+        ]
+        
+        assert tokens == ["Based on the document: Document content here"]
+        assert service.used_fallback is True
+    
+    @pytest.mark.asyncio
+    async def test_response_cache_is_opt_in_and_versioned(self, monkeypatch):
+        """Test that cached responses replay per prompt and index version."""
+        import zlib
+        from app.services import llm_cache, llm_client, llm_service
+        from app.services.llm_cache import LLMResponseCache
+        from app.services.llm_service import LLMService
+        from benchmarks.llm_stub import StubLLMServer
+        
+        stored = {}
+        
+        async def fake_get(keys):
+            return [stored.get(key) for key in keys]
+        
+        async def fake_set(items, expire_seconds=3600):
+            stored.update(items)
+            return True
+        
+        monkeypatch.setattr(llm_cache, "cache_get_many_bytes", fake_get)
+        monkeypatch.setattr(llm_cache, "cache_set_many_bytes", fake_set)
+        cache = LLMResponseCache(ttl_seconds=60)
+        monkeypatch.setattr(llm_service, "llm_cache", cache)
+        
+        chunks = [{"text": "The warranty lasts two years."}]
+        async with StubLLMServer() as server:
+            monkeypatch.setattr(llm_service.settings, "HUGGINGFACE_API_URL", server.base_url)
+            await llm_client.open_llm_client()
+            try:
+                for _ in range(2):
+                    await LLMService(cache_scope="doc@1").generate_response("How long?", chunks)
+                assert server.requests == 2
+                
+                first, _ = await LLMService("doc@1", allow_cached=True).generate_response("How long?", chunks)
+                replay = LLMService("doc@1", allow_cached=True)
+                second, _ = await replay.generate_response("How long?", chunks)
+                assert server.requests == 3
+                assert replay.cache_hit is True
+                assert first == second == server.completion
+                
+                streamed = LLMService("doc@1", allow_cached=True).generate_response_stream("How long?", chunks)
+                assert [token async for token in streamed] == [server.completion]
+                
+                rebuilt = LLMService("doc@2", allow_cached=True)
+                await rebuilt.generate_response("How long?", chunks)
+                assert rebuilt.cache_hit is False
+                assert server.requests == 4
+            finally:
+                await llm_client.close_llm_client()
+        
+        assert len(stored) == 2
+        assert all(key.startswith("llm:doc@") for key in stored)
+        assert server.completion in zlib.decompress(next(iter(stored.values()))).decode()
+        stats = cache.stats()
+        assert (stats["hits"], stats["misses"], stats["stores"]) == (2, 2, 2)
+        assert stats["saved_llm_seconds"] > 0
+    
+    @pytest.mark.asyncio
+    async def test_response_cache_counts_only_confirmed_stores(self):
+        """Test that writes skipped without Redis are not reported as stored."""
+        from app.services.llm_cache import LLMResponseCache
+        
+        cache = LLMResponseCache(ttl_seconds=60)
+        await cache.put(cache.key("model", "prompt", {}), "answer", 1.5)
+        
+        stats = cache.stats()
+        assert stats["stores"] == 0
+        assert stats["compression_ratio"] == 0.0
+    
     def test_fallback_response(self):
         """Test fallback response generation."""
         from app.services.llm_service import LLMService
@@ -255,3 +643,211 @@ class TestLLMService:
         # Without context
         response = service._generate_fallback_response("What is this?", [])
         assert "couldn't find" in response.lower()
+
+
+class TestInferenceExecutors:
+    """Tests for the named inference executors."""
+    
+    @pytest.mark.asyncio
+    async def test_executor_reports_queue_depth_and_wait(self):
+        """Test that queued work is visible in the executor stats."""
+        import asyncio
+        import threading
+        from app.utils.executors import InstrumentedExecutor
+        
+        executor = InstrumentedExecutor("test", workers=1)
+        release = threading.Event()
+        
+        try:
+            tasks = [
+                asyncio.ensure_future(executor.run(release.wait, 5))
+                for _ in range(3)
+            ]
+            await asyncio.sleep(0.05)
+            
+            stats = executor.stats()
+            assert stats["in_flight"] == 3
+            assert stats["queue_depth"] == 2
+            
+            release.set()
+            assert await asyncio.gather(*tasks) == [True, True, True]
+        finally:
+            executor.shutdown()
+        
+        stats = executor.stats()
+        assert stats["completed"] == 3
+        assert stats["queue_depth"] == 0
+        assert stats["max_wait_ms"] >= 40
+    
+    @pytest.mark.asyncio
+    async def test_executor_counts_failures(self):
+        """Test that a failing task is re-raised and counted."""
+        from app.utils.executors import InstrumentedExecutor
+        
+        executor = InstrumentedExecutor("test", workers=1)
+        
+        try:
+            with pytest.raises(ZeroDivisionError):
+                await executor.run(divmod, 1, 0)
+        finally:
+            executor.shutdown()
+        
+        assert executor.stats()["failed"] == 1
+        assert executor.stats()["in_flight"] == 0
+    
+    @pytest.mark.asyncio
+    async def test_process_pool_executor(self):
+        """Test that picklable work runs in a process pool."""
+        from app.utils.executors import InstrumentedExecutor
+        
+        executor = InstrumentedExecutor("test", workers=1, use_processes=True)
+        
+        try:
+            assert await executor.run(pow, 2, 10) == 1024
+        finally:
+            executor.shutdown()
+        
+        assert executor.stats()["kind"] == "process"
+
+
+class TestWarmup:
+    """Tests for startup warm-up and readiness."""
+    
+    @pytest.mark.asyncio
+    async def test_readiness_follows_warmup(self, monkeypatch):
+        """Test that /ready is 503 until every component has warmed up."""
+        from app import main
+        from app.services import warmup
+        
+        state = warmup.Readiness()
+        monkeypatch.setattr(warmup, "readiness", state)
+        monkeypatch.setattr(main, "readiness", state)
+        monkeypatch.setattr(warmup.settings, "WARMUP_MODELS", ["embedding", "whisper"])
+        monkeypatch.setattr(warmup.settings, "WARMUP_PREFETCH_INDEXES", 0)
+        monkeypatch.setattr(warmup, "_warm_embedding", lambda: None)
+        
+        warmup.register_warmup()
+        assert (await main.readiness_check()).status_code == 503
+        assert set(state.components) == {"faiss", "embedding", "whisper"}
+        
+        def broken_whisper():
+            raise RuntimeError("no model")
+        
+        monkeypatch.setattr(warmup, "_warm_whisper", broken_whisper)
+        await warmup.warm_up()
+        
+        assert state.components["faiss"]["ready"]
+        assert state.components["embedding"]["seconds"] is not None
+        assert state.components["whisper"]["error"] == "no model"
+        assert (await main.readiness_check()).status_code == 503
+        
+        monkeypatch.setattr(warmup, "_warm_whisper", lambda: None)
+        await warmup.warm_up()
+        assert (await main.readiness_check()).status_code == 200
+    
+    def test_unknown_warmup_model_is_rejected(self, monkeypatch):
+        """Test that a typo in WARMUP_MODELS fails at startup."""
+        from app.services import warmup
+        
+        monkeypatch.setattr(warmup.settings, "WARMUP_MODELS", ["embeddings"])
+        
+        with pytest.raises(ValueError):
+            warmup.register_warmup()
+    
+    @pytest.mark.asyncio
+    async def test_prefetch_loads_recently_used_indexes(self, faiss_index_dir, monkeypatch):
+        """Test that the hottest indexes are made resident."""
+        from app.services import warmup
+        from app.services.vector_store import VectorStore
+        
+        store = VectorStore()
+        embeddings = np.random.rand(4, 8).astype('float32')
+        await store.create_index("doc_hot", [{"text": f"c{i}"} for i in range(4)], embeddings)
+        store._drop_resident("doc_hot")
+        
+        class History:
+            def __init__(self, entries):
+                self.entries = entries
+            
+            def find(self, *args):
+                return self
+            
+            def sort(self, *args):
+                return self
+            
+            def limit(self, count):
+                self.entries = self.entries[:count]
+                return self
+            
+            def __aiter__(self):
+                async def iterate():
+                    for entry in self.entries:
+                        yield entry
+                return iterate()
+        
+        history = History([
+            {"document_id": "doc_hot", "user_id": "u1"},
+            {"document_id": "doc_gone", "user_id": "u1"}
+        ])
+        monkeypatch.setattr(warmup, "vector_store", store)
+        monkeypatch.setattr(warmup, "get_collection", lambda name: history)
+        
+        assert await warmup.prefetch_hot_indexes(5) == 1
+        assert "doc_hot" in store.indexes
+
+
+class TestAnswerCache:
+    """Tests for the semantic answer cache."""
+    
+    def _unit(self, *values):
+        vector = np.array(values, dtype='float32')
+        return vector / np.linalg.norm(vector)
+    
+    def test_near_duplicate_question_hits(self):
+        """Test that a similar question reuses the stored answer."""
+        from app.services.answer_cache import SemanticAnswerCache, answer_scope
+        
+        cache = SemanticAnswerCache(max_documents=10, max_entries=4, threshold=0.95, ttl_seconds=60)
+        scope = answer_scope(retrieval_mode="dense", filters=None)
+        cache.store("doc1", 3, scope, self._unit(1, 0, 0), "Answer", [{"text": "s"}], 2.5)
+        
+        hit = cache.lookup("doc1", 3, scope, self._unit(1, 0.1, 0))
+        assert hit["answer"] == "Answer"
+        assert hit["sources"] == [{"text": "s"}]
+        
+        assert cache.lookup("doc1", 3, scope, self._unit(0, 1, 0)) is None
+        assert cache.lookup("doc1", 3, answer_scope(retrieval_mode="lexical", filters=None), self._unit(1, 0, 0)) is None
+        
+        stats = cache.stats()
+        assert stats["hits"] == 1 and stats["misses"] == 2
+        assert stats["saved_llm_seconds"] == 2.5
+    
+    def test_index_version_change_invalidates(self):
+        """Test that answers are dropped once the document's index changes."""
+        from app.services.answer_cache import SemanticAnswerCache
+        
+        cache = SemanticAnswerCache(max_documents=10, max_entries=4, threshold=0.9, ttl_seconds=60)
+        cache.store("doc1", 1, "s", self._unit(1, 0), "Old", [], 1.0)
+        
+        assert cache.lookup("doc1", 2, "s", self._unit(1, 0)) is None
+        assert cache.stats()["invalidations"] == 1
+        assert cache.stats()["documents"] == 0
+    
+    def test_expired_and_overwritten_answers_are_not_served(self, monkeypatch):
+        """Test TTL expiry and the per-document entry cap."""
+        from app.services import answer_cache
+        from app.services.answer_cache import SemanticAnswerCache
+        
+        clock = {"now": 100.0}
+        monkeypatch.setattr(answer_cache.time, "monotonic", lambda: clock["now"])
+        
+        cache = SemanticAnswerCache(max_documents=10, max_entries=2, threshold=0.9, ttl_seconds=60)
+        cache.store("doc1", 1, "s", self._unit(1, 0, 0), "First", [], 1.0)
+        cache.store("doc1", 1, "s", self._unit(0, 1, 0), "Second", [], 1.0)
+        cache.store("doc1", 1, "s", self._unit(0, 0, 1), "Third", [], 1.0)
+        
+        assert cache.lookup("doc1", 1, "s", self._unit(1, 0, 0)) is None
+        assert cache.lookup("doc1", 1, "s", self._unit(0, 0, 1))["answer"] == "Third"
+        
+        clock["now"] += 61
+        assert cache.lookup("doc1", 1, "s", self._unit(0, 0, 1)) is None
@@ -28,6 +28,84 @@ class TestRAGPipeline:
                 assert len(results) == 2
                 assert results[0]["score"] > results[1]["score"]
     
+    @pytest.mark.asyncio
+    async def test_hybrid_retrieval_fuses_rankings(self, mock_embedding):
+        """Test that hybrid mode fuses dense and lexical rankings."""
+        from app.services.rag_pipeline import RAGPipeline
+        from app.services.vector_store import vector_store
+        
+        pipeline = RAGPipeline()
+        
+        dense = [
+            {"text": "Dense only", "chunk_id": 1, "score": 0.9},
+            {"text": "Both", "chunk_id": 2, "score": 0.8}
+        ]
+        lexical = [
+            {"text": "Both", "chunk_id": 2, "score": 7.5},
+            {"text": "Lexical only", "chunk_id": 3, "score": 3.1}
+        ]
+        
+        with patch.object(pipeline.embedding_service, 'embed_text',
+                         return_value=np.random.rand(384).tolist()):
+            with patch.object(vector_store, 'search', return_value=dense), \
+                 patch.object(vector_store, 'search_lexical', return_value=lexical):
+                results = await pipeline.retrieve_context(
+                    "doc_id", "part AB-1234", top_k=3, retrieval_mode="hybrid"
+                )
+        
+        assert [r["chunk_id"] for r in results] == [2, 1, 3]
+        assert results[0]["score"] > results[1]["score"]
+    
+    @pytest.mark.asyncio
+    async def test_lexical_retrieval_skips_embedding(self):
+        """Test that lexical mode does not embed the query."""
+        from app.services.rag_pipeline import RAGPipeline
+        from app.services.vector_store import vector_store
+        
+        pipeline = RAGPipeline()
+        
+        with patch.object(pipeline.embedding_service, 'embed_text') as embed, \
+             patch.object(vector_store, 'search_lexical', return_value=[]) as search:
+            await pipeline.retrieve_context("doc_id", "AB-1234", retrieval_mode="lexical")
+        
+        embed.assert_not_called()
+        search.assert_called_once()
+    
+    @pytest.mark.asyncio
+    async def test_retrieve_context_many_merges_global_top_k(self, monkeypatch):
+        """Test fan-out across documents with one embedding and a capped fan-out."""
+        import asyncio
+        from app.services import rag_pipeline
+        from app.services.rag_pipeline import RAGPipeline
+        from app.services.vector_store import vector_store
+        
+        monkeypatch.setattr(rag_pipeline.settings, "MULTI_DOC_SEARCH_CONCURRENCY", 2)
+        pipeline = RAGPipeline()
+        active = {"now": 0, "peak": 0}
+        
+        async def fake_search(document_id, query_embedding, top_k, **kwargs):
+            active["now"] += 1
+            active["peak"] = max(active["peak"], active["now"])
+            await asyncio.sleep(0.01)
+            active["now"] -= 1
+            base = int(document_id[-1]) / 10
+            return [
+                {"text": f"{document_id}-{i}", "chunk_id": i, "score": base - i / 100}
+                for i in range(top_k)
+            ]
+        
+        with patch.object(pipeline.embedding_service, 'embed_text',
+                         return_value=[0.1] * 384) as embed, \
+             patch.object(vector_store, 'search', side_effect=fake_search):
+            results = await pipeline.retrieve_context_many(
+                ["doc1", "doc2", "doc3", "doc4"], "question", top_k=3
+            )
+        
+        embed.assert_called_once()
+        assert active["peak"] == 2
+        assert [r["text"] for r in results] == ["doc4-0", "doc4-1", "doc4-2"]
+        assert all(r["document_id"] == "doc4" for r in results)
+    
     @pytest.mark.asyncio
     async def test_find_relevant_timestamps(self, mock_embedding):
         """Test timestamp relevance ranking."""
@@ -57,6 +135,37 @@ class TestRAGPipeline:
                     # Should be sorted by relevance
                     assert results[0]["relevance_score"] >= results[1]["relevance_score"]
     
+    @pytest.mark.asyncio
+    async def test_timestamps_use_stored_topics_and_shared_query(self, faiss_index_dir):
+        """Test that topic embeddings come from ingest and the query is embedded once."""
+        from app.services.rag_pipeline import RAGPipeline
+        from app.services.vector_store import vector_store
+        
+        topics = [
+            {"start": 0, "end": 30, "text": "Introduction"},
+            {"start": 30, "end": 60, "text": "Variables"},
+            {"start": 60, "end": 90, "text": "Control flow"}
+        ]
+        topic_vectors = np.eye(3, 8, dtype='float32')
+        
+        ingest = RAGPipeline()
+        with patch.object(ingest.embedding_service, 'embed_texts', return_value=topic_vectors):
+            await ingest.index_topics("doc_topics", topics)
+        
+        pipeline = RAGPipeline()
+        query = np.array([0, 1, 0, 0, 0, 0, 0, 0], dtype='float32')
+        with patch.object(pipeline.embedding_service, 'embed_text', return_value=query) as embed, \
+             patch.object(pipeline.embedding_service, 'embed_texts') as embed_many, \
+             patch.object(vector_store, 'search', return_value=[]):
+            await pipeline.retrieve_context("doc_topics", "What are variables?")
+            results = await pipeline.find_relevant_timestamps(
+                "What are variables?", topics, top_k=1, document_id="doc_topics"
+            )
+        
+        assert results[0]["text"] == "Variables"
+        embed.assert_called_once()
+        embed_many.assert_not_called()
+    
     @pytest.mark.asyncio
     async def test_find_timestamps_empty(self):
         """Test timestamp search with empty list."""
@@ -107,3 +216,168 @@ class TestRAGIntegration:
         # Verify services are properly initialized
         assert pipeline.embedding_service is not None
         assert llm.api_url is not None
+
+
+class TestReranker:
+    """Tests for the cross-encoder rerank stage."""
+    
+    @pytest.mark.asyncio
+    async def test_rerank_reorders_candidates(self):
+        """Test that candidates are reordered by cross-encoder score."""
+        from app.services.reranker import Reranker
+        
+        chunks = [{"text": f"chunk {i}", "score": 1 - i / 10} for i in range(4)]
+        
+        def fake_score(pairs):
+            return np.array([float(text[-1]) for _, text in pairs], dtype='float32')
+        
+        reranker = Reranker()
+        with patch.object(Reranker, '_score_sync', side_effect=fake_score):
+            results, fallback = await reranker.rerank("question", chunks, top_k=2)
+        
+        assert fallback is False
+        assert [r["text"] for r in results] == ["chunk 3", "chunk 2"]
+        assert results[0]["rerank_score"] == 3.0
+        assert "rerank_score" not in chunks[3]
+    
+    @pytest.mark.asyncio
+    async def test_rerank_falls_back_when_over_budget(self, monkeypatch):
+        """Test that an exhausted time budget keeps the dense order."""
+        import time
+        from app.services import reranker as reranker_module
+        from app.services.reranker import Reranker
+        from app.utils.executors import get_executor
+        
+        monkeypatch.setattr(reranker_module.settings, "RERANK_BUDGET_MS", 20)
+        chunks = [{"text": f"chunk {i}", "score": 1 - i / 10} for i in range(4)]
+        
+        def slow_score(pairs):
+            time.sleep(0.2)
+            return np.arange(len(pairs), dtype='float32')
+        
+        reranker = Reranker()
+        interactive = get_executor("interactive").submitted
+        with patch.object(Reranker, '_score_sync', side_effect=slow_score):
+            results, fallback = await reranker.rerank("question", chunks, top_k=2)
+        
+        assert fallback is True
+        assert [r["text"] for r in results] == ["chunk 0", "chunk 1"]
+        assert reranker.stats()["fallbacks"] == 1
+        
+        # The abandoned batch keeps running, but not on a worker that query
+        # embeddings and searches need.
+        assert get_executor("reranker").submitted >= 1
+        assert get_executor("interactive").submitted == interactive
+    
+    @pytest.mark.asyncio
+    async def test_pipeline_widens_candidates_and_records_timings(self, monkeypatch):
+        """Test that reranking retrieves the wider candidate set and times each stage."""
+        from app.services import rag_pipeline
+        from app.services.rag_pipeline import RAGPipeline
+        from app.services.reranker import reranker
+        from app.services.vector_store import vector_store
+        
+        monkeypatch.setattr(rag_pipeline.settings, "RERANK_CANDIDATES", 12)
+        pipeline = RAGPipeline()
+        candidates = [{"text": f"chunk {i}", "score": 1 - i / 100} for i in range(12)]
+        
+        with patch.object(pipeline.embedding_service, 'embed_text',
+                         return_value=np.zeros(8, dtype='float32')), \
+             patch.object(vector_store, 'search', return_value=candidates) as search, \
+             patch.object(reranker, 'rerank',
+                          return_value=(candidates[::-1][:3], False)) as rerank:
+            results = await pipeline.retrieve_context("doc_id", "question", top_k=3, rerank=True)
+        
+        assert search.call_args.kwargs["top_k"] == 12
+        rerank.assert_called_once_with("question", candidates, 3)
+        assert [r["text"] for r in results] == ["chunk 11", "chunk 10", "chunk 9"]
+        assert set(pipeline.timings) == {"embed", "search", "rerank"}
+        assert "rerank;dur=" in pipeline.server_timing()
+
+
+class TestContextPacker:
+    """Tests for overlap-aware context packing."""
+    
+    TEXT = " ".join(
+        f"Sentence number {i} describes part {i} of the manual." for i in range(30)
+    )
+    
+    def test_overlapping_chunks_merge_without_repeats(self, monkeypatch):
+        """Test that overlapping chunks collapse into one span of the original text."""
+        from app.services.context_packer import ContextPacker, context_packer
+        from app.services.pdf_processor import PDFProcessor
+        
+        monkeypatch.setattr(ContextPacker, "_tokenizer", False)
+        chunks = PDFProcessor().chunk_text(self.TEXT, chunk_size=200, overlap=50)
+        assert len(chunks) > 3
+        
+        relevance_order = chunks[2:4] + chunks[0:2]
+        packed = context_packer.pack(relevance_order, token_budget=10000)
+        
+        assert len(packed) == 1
+        assert packed[0]["text"] == self.TEXT[:chunks[3]["end"]].strip()
+        assert packed[0]["start"] == 0
+    
+    def test_budget_keeps_most_relevant_spans(self, monkeypatch):
+        """Test that packing stops at the token budget in relevance order."""
+        from app.services.context_packer import ContextPacker, context_packer
+        
+        monkeypatch.setattr(ContextPacker, "_tokenizer", False)
+        chunks = [
+            {"text": "alpha " * 40, "start": 0, "end": 240, "score": 0.9},
+            {"text": "beta " * 40, "start": 1000, "end": 1200, "score": 0.8},
+            {"text": "gamma " * 5, "start": 2000, "end": 2030, "score": 0.7},
+            {"text": "alpha " * 40, "score": 0.6}
+        ]
+        
+        packed = context_packer.pack(chunks, token_budget=70)
+        
+        assert [span["score"] for span in packed] == [0.9, 0.7]
+        assert all("rank" not in span for span in packed)
+        
+        # The most relevant chunk is kept even when it alone is over budget.
+        assert len(context_packer.pack(chunks, token_budget=1)) == 1
+    
+    def test_prompt_does_not_repeat_overlap(self, monkeypatch):
+        """Test that the prompt carries overlapping text once."""
+        from app.services.context_packer import ContextPacker
+        from app.services.llm_service import LLMService
+        
+        monkeypatch.setattr(ContextPacker, "_tokenizer", False)
+        chunks = [
+            {"text": "The warranty lasts two years.", "start": 0, "end": 29},
+            {"text": "two years. Claims need a receipt.", "start": 19, "end": 52}
+        ]
+        
+        prompt = LLMService()._build_prompt("How long is the warranty?", chunks, "pdf")
+        
+        assert prompt.count("two years") == 1
+        assert "The warranty lasts two years. Claims need a receipt." in prompt
+    
+    def test_prompts_never_download_the_tokenizer(self, monkeypatch):
+        """Test that prompts load the tokenizer from disk only and warm-up fetches it."""
+        from app.services.context_packer import ContextPacker, context_packer
+        
+        class WordTokenizer:
+            def encode(self, text, add_special_tokens=False):
+                return text.split()
+        
+        calls = []
+        
+        def load(local_files_only):
+            calls.append(local_files_only)
+            if local_files_only:
+                raise OSError("not in the local cache")
+            return WordTokenizer()
+        
+        monkeypatch.setattr(ContextPacker, "_tokenizer", None)
+        monkeypatch.setattr(ContextPacker, "_load_tokenizer", staticmethod(load))
+        
+        # A local miss falls back to the estimate and is not retried.
+        context_packer.count_tokens("one two three")
+        context_packer.count_tokens("one two three")
+        assert calls == [True]
+        
+        ContextPacker.preload_tokenizer()
+        assert calls == [True, False]
+        assert context_packer.count_tokens("one two three") == 3
@@ -0,0 +1,816 @@
+"""Tests for vector store residency and index management."""
+import pytest
+import numpy as np
+from typing import Optional
+
+
+def _random_embeddings(count: int, dimension: int = 32, seed: Optional[int] = None):
+    # Normalised like sentence embeddings, so every vector is its own best match.
+    embeddings = np.random.default_rng(seed).random((count, dimension), dtype='float32')
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings.tolist()
+
+
+def _random_chunks(count: int, dimension: int = 32, seed: Optional[int] = None):
+    chunks = [{"text": f"Chunk {i}", "index": i} for i in range(count)]
+    return chunks, _random_embeddings(count, dimension, seed)
+
+
+class TestIndexResidency:
+    """Tests for the residency bookkeeping."""
+    
+    def test_lru_evicts_least_recently_used(self):
+        """Test LRU eviction order."""
+        from app.services.index_residency import IndexResidency
+        
+        residency = IndexResidency(max_bytes=250, policy="lru")
+        residency.admit("a", 100)
+        residency.admit("b", 100)
+        residency.hit("a")
+        
+        evicted = residency.admit("c", 100)
+        
+        assert evicted == ["b"]
+        assert residency.resident_bytes == 200
+        assert residency.stats()["evictions"] == 1
+    
+    def test_lfu_evicts_least_frequently_used(self):
+        """Test LFU eviction order."""
+        from app.services.index_residency import IndexResidency
+        
+        residency = IndexResidency(max_bytes=250, policy="lfu")
+        residency.admit("a", 100)
+        residency.admit("b", 100)
+        residency.hit("a")
+        residency.hit("b")
+        residency.hit("b")
+        
+        evicted = residency.admit("c", 100)
+        
+        assert evicted == ["a"]
+    
+    def test_pinned_entry_is_not_evicted(self):
+        """Test that a pinned entry survives until it is unpinned."""
+        from app.services.index_residency import IndexResidency
+        
+        residency = IndexResidency(max_bytes=150)
+        residency.admit("a", 100)
+        residency.pin("a")
+        
+        assert residency.admit("b", 100) == []
+        assert "a" in residency
+        
+        residency.unpin("a")
+        assert residency.admit("c", 100) == ["a", "b"]
+    
+    def test_oversized_entry_stays_resident(self):
+        """Test that a single entry larger than the budget is kept."""
+        from app.services.index_residency import IndexResidency
+        
+        residency = IndexResidency(max_bytes=50)
+        
+        assert residency.admit("a", 100) == []
+        assert "a" in residency
+
+
+class TestVectorStoreResidency:
+    """Tests for bounded VectorStore residency."""
+    
+    @pytest.mark.asyncio
+    async def test_evicted_index_reloads_on_search(self, faiss_index_dir):
+        """Test that an evicted index is reloaded from disk."""
+        from app.services.vector_store import VectorStore
+        
+        store = VectorStore()
+        
+        chunks, embeddings = _random_chunks(10, seed=0)
+        await store.create_index("doc_a", chunks, embeddings)
+        store.residency.max_bytes = store.residency.resident_bytes
+        
+        await store.create_index("doc_b", *_random_chunks(10, seed=1))
+        
+        assert "doc_a" not in store.indexes
+        assert "doc_b" in store.indexes
+        
+        results = await store.search("doc_a", embeddings[0], top_k=1)
+        
+        assert results[0]["text"] == "Chunk 0"
+        assert "doc_a" in store.indexes
+        assert "doc_b" not in store.indexes
+        
+        stats = store.stats()
+        assert stats["misses"] == 1
+        assert stats["evictions"] == 2
+        assert stats["resident_bytes"] <= stats["max_bytes"]
+    
+    def test_hnsw_is_sized_without_serialising(self, monkeypatch):
+        """Test that HNSW residency size is estimated from its arrays."""
+        import faiss
+        from app.services import index_builder
+        from app.services.vector_store import VectorStore
+        
+        monkeypatch.setattr(index_builder.settings, "FAISS_FLAT_MAX_VECTORS", 50)
+        vectors = np.array(_random_embeddings(500, seed=0), dtype='float32')
+        spec = index_builder.select_index_spec(500, 32)
+        index = index_builder.build_index(vectors, spec, np.arange(500, dtype=np.int64))
+        expected = faiss.serialize_index(faiss.downcast_index(index.index)).nbytes + 500 * 8 * 3
+        
+        def refuse(index):
+            raise AssertionError("serialize_index called")
+        
+        monkeypatch.setattr(faiss, "serialize_index", refuse)
+        
+        assert VectorStore()._index_nbytes(index) == pytest.approx(expected, rel=0.05)
+
+
+class TestIndexSelection:
+    """Tests for automatic index-type selection."""
+    
+    def test_small_documents_use_flat(self):
+        """Test that small documents get an exact flat index."""
+        from app.services.index_builder import select_index_spec
+        
+        spec = select_index_spec(20, 384)
+        
+        assert spec["index_type"] == "flat"
+        assert spec["factory"] == "Flat"
+    
+    def test_large_documents_use_configured_type(self, monkeypatch):
+        """Test that large documents switch to an approximate index."""
+        from app.services import index_builder
+        
+        monkeypatch.setattr(index_builder.settings, "FAISS_FLAT_MAX_VECTORS", 100)
+        monkeypatch.setattr(index_builder.settings, "FAISS_LARGE_INDEX_TYPE", "ivfpq")
+        
+        spec = index_builder.select_index_spec(20000, 384)
+        assert spec["index_type"] == "ivfpq"
+        assert 384 % spec["params"]["pq_m"] == 0
+        
+        # Too few vectors to train PQ codebooks falls back to HNSW
+        spec = index_builder.select_index_spec(500, 384)
+        assert spec["index_type"] == "hnsw"
+    
+    @pytest.mark.asyncio
+    async def test_hnsw_index_persists_spec(self, faiss_index_dir, monkeypatch):
+        """Test that the chosen index type is saved and reloaded."""
+        import json
+        from app.services import index_builder
+        from app.services.vector_store import VectorStore
+        
+        monkeypatch.setattr(index_builder.settings, "FAISS_FLAT_MAX_VECTORS", 50)
+        
+        store = VectorStore()
+        chunks, embeddings = _random_chunks(200)
+        await store.create_index("doc_hnsw", chunks, embeddings)
+        
+        with open(faiss_index_dir / "doc_hnsw.meta.json") as f:
+            meta = json.load(f)
+        assert meta["index_type"] == "hnsw"
+        assert meta["count"] == 200
+        
+        reloaded = VectorStore()
+        results = await reloaded.search("doc_hnsw", embeddings[7], top_k=3, ef_search=128)
+        
+        assert reloaded.specs["doc_hnsw"]["index_type"] == "hnsw"
+        assert len(results) == 3
+
+
+class TestChunkStore:
+    """Tests for the memory-mapped columnar chunk store."""
+    
+    def test_round_trip(self, tmp_path):
+        """Test that chunks survive a write/open cycle."""
+        from app.services.chunk_store import ChunkStore
+        
+        chunks = [
+            {"text": "Première partie", "start": 0, "end": 15, "index": 0, "start_time": 1.5},
+            {"text": "Second", "start": 10, "end": 16, "index": 1, "speaker": "B"}
+        ]
+        path = str(tmp_path / "doc.chunks")
+        ChunkStore.write(path, chunks)
+        
+        store = ChunkStore(path)
+        
+        assert len(store) == 2
+        assert store[0] == chunks[0]
+        assert store[1] == chunks[1]
+        assert store.column("start").tolist() == [0, 10]
+        assert not (tmp_path / "doc.chunks.tmp").exists()
+    
+    @pytest.mark.asyncio
+    async def test_legacy_pickle_is_migrated(self, faiss_index_dir):
+        """Test that pickled chunk lists from older indexes still load."""
+        import pickle
+        import faiss
+        from app.services.vector_store import VectorStore
+        
+        chunks, embeddings = _random_chunks(3)
+        index = faiss.IndexFlatIP(32)
+        index.add(np.array(embeddings, dtype='float32'))
+        faiss.write_index(index, str(faiss_index_dir / "legacy.index"))
+        with open(faiss_index_dir / "legacy.pkl", "wb") as f:
+            pickle.dump(chunks, f)
+        
+        store = VectorStore()
+        results = await store.search("legacy", embeddings[2], top_k=1)
+        
+        assert results[0]["text"] == "Chunk 2"
+        assert (faiss_index_dir / "legacy.chunks").exists()
+        assert not (faiss_index_dir / "legacy.pkl").exists()
+
+
+class TestQuantizedStorage:
+    """Tests for quantized embedding storage modes."""
+    
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("mode", ["sq8", "binary"])
+    async def test_quantized_modes_find_exact_match(self, faiss_index_dir, monkeypatch, mode):
+        """Test that quantized indexes still rank an exact match first."""
+        import json
+        from app.services import index_builder
+        from app.services.vector_store import VectorStore
+        
+        monkeypatch.setattr(index_builder.settings, "FAISS_STORAGE_MODE", mode)
+        
+        chunks, _ = _random_chunks(100, dimension=64)
+        vectors = np.random.rand(100, 64) - 0.5
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        
+        store = VectorStore()
+        await store.create_index("doc_q", chunks, vectors.tolist())
+        
+        with open(faiss_index_dir / "doc_q.meta.json") as f:
+            assert json.load(f)["storage"] == mode
+        
+        reloaded = VectorStore()
+        results = await reloaded.search("doc_q", vectors[42].tolist(), top_k=3)
+        
+        assert results[0]["text"] == "Chunk 42"
+        assert results[0]["score"] == pytest.approx(1.0, abs=0.05)
+    
+    def test_pq_falls_back_without_enough_training_data(self, monkeypatch):
+        """Test that PQ storage degrades to SQ8 for small documents."""
+        from app.services import index_builder
+        
+        monkeypatch.setattr(index_builder.settings, "FAISS_STORAGE_MODE", "pq")
+        
+        assert index_builder.select_index_spec(500, 384)["storage"] == "sq8"
+        assert index_builder.select_index_spec(20000, 384)["factory"].endswith("PQ48")
+    
+    @pytest.mark.asyncio
+    async def test_flat_pq_honours_tombstones_and_filters(self, faiss_index_dir, monkeypatch):
+        """Test that a flat PQ index, which takes no selector, still excludes chunks."""
+        from app.services import index_builder
+        from app.services import vector_store as vector_store_module
+        from app.services.vector_store import VectorStore
+        
+        monkeypatch.setattr(index_builder.settings, "FAISS_STORAGE_MODE", "pq")
+        monkeypatch.setattr(index_builder.settings, "FAISS_PQ_SUBQUANTIZERS", 1)
+        monkeypatch.setattr(index_builder, "PQ_TRAINING_POINTS", 256)
+        monkeypatch.setattr(vector_store_module.settings, "VECTOR_FILTER_EXACT_MAX", 0)
+        
+        store = VectorStore()
+        chunks, embeddings = _random_chunks(400, dimension=8, seed=0)
+        await store.create_index("doc_pq", chunks, embeddings)
+        assert store.specs["doc_pq"]["factory"].startswith("PQ")
+        
+        await store.remove_chunks("doc_pq", [0, 1, 2])
+        results = await store.search("doc_pq", embeddings[0], top_k=10)
+        assert len(results) == 10
+        assert not {r["index"] for r in results} & {0, 1, 2}
+        
+        results = await store.search("doc_pq", embeddings[0], top_k=10, filters={"index": (200, None)})
+        assert len(results) == 10
+        assert all(r["index"] >= 200 for r in results)
+
+
+class TestIncrementalUpdates:
+    """Tests for append/remove with stable chunk IDs."""
+    
+    @pytest.mark.asyncio
+    async def test_append_and_remove_chunks(self, faiss_index_dir):
+        """Test appending and removing chunks without a rebuild."""
+        from app.services.vector_store import VectorStore
+        
+        store = VectorStore()
+        chunks, embeddings = _random_chunks(5)
+        await store.create_index("doc_inc", chunks, embeddings)
+        
+        new_chunks = [{"text": "Appended 0"}, {"text": "Appended 1"}]
+        new_embeddings = _random_embeddings(2)
+        ids = await store.append_chunks("doc_inc", new_chunks, new_embeddings)
+        
+        assert ids == [5, 6]
+        assert (faiss_index_dir / "doc_inc.d1.chunks").exists()
+        
+        results = await store.search("doc_inc", new_embeddings[1], top_k=1)
+        assert results[0]["text"] == "Appended 1"
+        assert results[0]["chunk_id"] == 6
+        
+        removed = await store.remove_chunks("doc_inc", [6, 42])
+        assert removed == 1
+        
+        results = await store.search("doc_inc", new_embeddings[1], top_k=10)
+        assert len(results) == 6
+        assert all(result["chunk_id"] != 6 for result in results)
+        
+        # A cold load replays deltas and tombstones from disk
+        reloaded = VectorStore()
+        results = await reloaded.search("doc_inc", new_embeddings[0], top_k=10)
+        assert [r["chunk_id"] for r in results if r["text"] == "Appended 0"] == [5]
+        assert all(result["chunk_id"] != 6 for result in results)
+    
+    @pytest.mark.asyncio
+    async def test_compaction_preserves_chunk_ids(self, faiss_index_dir):
+        """Test that compaction folds deltas and tombstones into a new base."""
+        from app.services.vector_store import VectorStore
+        
+        store = VectorStore()
+        chunks, embeddings = _random_chunks(4)
+        await store.create_index("doc_cmp", chunks, embeddings)
+        extra_embeddings = _random_embeddings(3)
+        await store.append_chunks("doc_cmp", [{"text": f"Extra {i}"} for i in range(3)], extra_embeddings)
+        await store.remove_chunks("doc_cmp", [0])
+        
+        await store.compact("doc_cmp")
+        
+        manifest = store.specs["doc_cmp"]
+        assert manifest["generation"] == 1
+        assert manifest["deltas"] == []
+        assert not (faiss_index_dir / "doc_cmp.d1.chunks").exists()
+        assert not (faiss_index_dir / "doc_cmp.index").exists()
+        
+        reloaded = VectorStore()
+        results = await reloaded.search("doc_cmp", extra_embeddings[2], top_k=10)
+        
+        assert len(results) == 6
+        assert results[0]["text"] == "Extra 2"
+        assert results[0]["chunk_id"] == 6
+        assert 0 not in [result["chunk_id"] for result in results]
+    
+    
+    @pytest.mark.asyncio
+    async def test_append_survives_concurrent_cold_load(self, faiss_index_dir):
+        """Test that a document being appended to is not evicted mid-write."""
+        import asyncio
+        from app.services.vector_store import VectorStore
+        
+        store = VectorStore()
+        await store.create_index("doc_pin_a", *_random_chunks(5))
+        await store.create_index("doc_pin_b", *_random_chunks(5))
+        store.residency.max_bytes = 1
+        
+        for round_number in range(5):
+            new_embeddings = _random_embeddings(2)
+            ids, _ = await asyncio.gather(
+                store.append_chunks(
+                    "doc_pin_a",
+                    [{"text": f"Round {round_number} {i}"} for i in range(2)],
+                    new_embeddings
+                ),
+                store.search("doc_pin_b", new_embeddings[0], top_k=1)
+            )
+            assert ids == [5 + 2 * round_number, 6 + 2 * round_number]
+        
+        assert store.residency.pinned == {}
+        reloaded = VectorStore()
+        results = await reloaded.search("doc_pin_a", new_embeddings[0], top_k=20)
+        assert len(results) == 15
+
+
+class TestBatchedSearch:
+    """Tests for multi-query search and request coalescing."""
+    
+    @pytest.mark.asyncio
+    async def test_search_many_matches_single_search(self, faiss_index_dir):
+        """Test that each row of a batch matches the single-query result."""
+        from app.services.vector_store import VectorStore
+        
+        store = VectorStore()
+        chunks, embeddings = _random_chunks(50)
+        await store.create_index("doc_many", chunks, embeddings)
+        
+        batched = await store.search_many("doc_many", embeddings[:4], top_k=3)
+        
+        assert len(batched) == 4
+        for query, results in zip(embeddings[:4], batched):
+            single = await store.search("doc_many", query, top_k=3)
+            assert [r["chunk_id"] for r in results] == [r["chunk_id"] for r in single]
+    
+    @pytest.mark.asyncio
+    async def test_search_many_missing_document(self, faiss_index_dir):
+        """Test that an unknown document yields one empty list per query."""
+        from app.services.vector_store import VectorStore
+        
+        store = VectorStore()
+        results = await store.search_many("missing", np.zeros((3, 32)), top_k=3)
+        
+        assert results == [[], [], []]
+    
+    @pytest.mark.asyncio
+    async def test_concurrent_searches_are_coalesced(self, faiss_index_dir, monkeypatch):
+        """Test that concurrent searches run as one batch and fan back out."""
+        import asyncio
+        from app.services import vector_store as vector_store_module
+        from app.services.vector_store import VectorStore
+        
+        monkeypatch.setattr(vector_store_module.settings, "VECTOR_SEARCH_COALESCE", True)
+        
+        store = VectorStore()
+        chunks, embeddings = _random_chunks(50)
+        await store.create_index("doc_batch", chunks, embeddings)
+        
+        results = await asyncio.gather(*[
+            store.search("doc_batch", embeddings[i], top_k=1)
+            for i in range(8)
+        ])
+        
+        expected = await store.search_many("doc_batch", embeddings[:8], top_k=1)
+        assert [r[0]["chunk_id"] for r in results] == [r[0]["chunk_id"] for r in expected]
+        coalescing = store.stats()["coalescing"]
+        assert coalescing["batches"] == 1
+        assert coalescing["items"] == 8
+
+
+class TestIndexLoading:
+    """Tests for single-flight loads and the negative-lookup cache."""
+    
+    @pytest.mark.asyncio
+    async def test_concurrent_cold_searches_share_one_load(self, faiss_index_dir):
+        """Test that concurrent misses await a single load."""
+        import asyncio
+        from app.services.vector_store import VectorStore
+        
+        chunks, embeddings = _random_chunks(20)
+        await VectorStore().create_index("doc_cold", chunks, embeddings)
+        
+        store = VectorStore()
+        results = await asyncio.gather(*[
+            store.search("doc_cold", embeddings[i], top_k=2)
+            for i in range(8)
+        ])
+        
+        assert all(len(result) == 2 for result in results)
+        assert store.load_stats["loads"] == 1
+        assert store.load_stats["joined"] == 7
+    
+    @pytest.mark.asyncio
+    async def test_missing_documents_are_cached(self, faiss_index_dir):
+        """Test that repeated lookups of a missing index skip the disk."""
+        from app.services.vector_store import VectorStore
+        
+        store = VectorStore()
+        assert await store.search("doc_absent", [0.0] * 32) == []
+        assert await store.search("doc_absent", [0.0] * 32) == []
+        
+        assert store.load_stats["loads"] == 1
+        assert store.load_stats["negative_hits"] == 1
+        
+        # Creating the index clears the cached miss
+        chunks, embeddings = _random_chunks(3)
+        await store.create_index("doc_absent", chunks, embeddings)
+        assert len(await store.search("doc_absent", embeddings[0], top_k=3)) == 3
+
+
+class TestIndexLocking:
+    """Tests for the per-index reader-writer lock."""
+    
+    @pytest.mark.asyncio
+    async def test_searches_on_one_index_run_concurrently(self, faiss_index_dir, monkeypatch):
+        """Test that two searches can be inside FAISS at the same time."""
+        import asyncio
+        import threading
+        from app.services import vector_store
+        from app.services.vector_store import VectorStore
+        
+        chunks, embeddings = _random_chunks(10, seed=0)
+        store = VectorStore()
+        await store.create_index("doc_hot", chunks, embeddings)
+        
+        # Each search waits for the other one inside the lock; serialised
+        # searches would break the barrier instead.
+        barrier = threading.Barrier(2, timeout=5)
+        search_index = vector_store.search_index
+        
+        def meeting_search(*args, **kwargs):
+            barrier.wait()
+            return search_index(*args, **kwargs)
+        
+        monkeypatch.setattr(vector_store, "search_index", meeting_search)
+        results = await asyncio.gather(
+            store.search_many("doc_hot", [embeddings[0]], top_k=1),
+            store.search_many("doc_hot", [embeddings[1]], top_k=1)
+        )
+        
+        assert [result[0][0]["index"] for result in results] == [0, 1]
+    
+    def test_writer_waits_for_readers(self):
+        """Test that a write blocks until active reads finish."""
+        import threading
+        from app.utils.locks import ReadWriteLock
+        
+        lock = ReadWriteLock()
+        events = []
+        
+        def write():
+            with lock.write():
+                events.append("write")
+        
+        with lock.read():
+            writer = threading.Thread(target=write)
+            writer.start()
+            writer.join(timeout=0.1)
+            events.append("read done")
+        writer.join(timeout=5)
+        
+        assert events == ["read done", "write"]
+
+
+class TestLexicalSearch:
+    """Tests for the BM25 inverted index."""
+    
+    def test_tokenize_keeps_identifiers(self):
+        """Test that compound identifiers match whole and by part."""
+        from app.services.lexical_index import tokenize
+        
+        assert tokenize("Replace part AB-1234.") == ["replace", "part", "ab-1234", "ab", "1234"]
+    
+    def test_index_round_trip(self, tmp_path):
+        """Test that postings survive a save and load."""
+        from app.services.lexical_index import LexicalIndex, LexicalSegments
+        
+        texts = ["the pump housing", "pump seal kit XR-7", "the the the"]
+        index = LexicalIndex.build(texts, np.array([10, 11, 12]))
+        index.save(str(tmp_path / "doc.lexical.npz"))
+        
+        loaded = LexicalSegments([LexicalIndex.load(str(tmp_path / "doc.lexical.npz"))])
+        scores, ids = loaded.search("pump xr-7", top_k=5)
+        
+        assert ids.tolist() == [11, 10]
+        assert scores[0] > scores[1] > 0
+    
+    @pytest.mark.asyncio
+    async def test_search_lexical_covers_deltas_and_tombstones(self, faiss_index_dir):
+        """Test lexical search across appended chunks and removals."""
+        from app.services.vector_store import VectorStore
+        
+        store = VectorStore()
+        chunks, embeddings = _random_chunks(5)
+        await store.create_index("doc_lex", chunks, embeddings)
+        await store.append_chunks("doc_lex", [{"text": "Serial number QX-99812"}], _random_embeddings(1))
+        
+        results = await store.search_lexical("doc_lex", "qx-99812", top_k=3)
+        assert [r["chunk_id"] for r in results] == [5]
+        
+        reloaded = VectorStore()
+        assert len(await reloaded.search_lexical("doc_lex", "chunk 3", top_k=10)) == 5
+        
+        await reloaded.remove_chunks("doc_lex", [5])
+        assert await reloaded.search_lexical("doc_lex", "qx-99812", top_k=3) == []
+
+
+class TestFilteredSearch:
+    """Tests for metadata-filtered search."""
+    
+    def _timed_chunks(self, count: int):
+        chunks = [
+            {"text": f"Chunk {i}", "index": i, "start_time": 10.0 * i, "end_time": 10.0 * i + 10}
+            for i in range(count)
+        ]
+        return chunks, _random_embeddings(count)
+    
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("exact_max", [0, 2048])
+    async def test_time_window_restricts_results(self, faiss_index_dir, monkeypatch, exact_max):
+        """Test that only chunks overlapping the window are returned."""
+        from app.services import vector_store as vector_store_module
+        from app.services.vector_store import VectorStore
+        
+        monkeypatch.setattr(vector_store_module.settings, "VECTOR_FILTER_EXACT_MAX", exact_max)
+        
+        store = VectorStore()
+        chunks, embeddings = self._timed_chunks(30)
+        await store.create_index("doc_time", chunks, embeddings)
+        await store.remove_chunks("doc_time", [22])
+        
+        results = await store.search(
+            "doc_time", embeddings[0], top_k=10, filters={"time": (205.0, 245.0)}
+        )
+        
+        assert sorted(r["index"] for r in results) == [20, 21, 23, 24]
+    
+    @pytest.mark.asyncio
+    async def test_filters_on_missing_metadata_match_nothing(self, faiss_index_dir):
+        """Test that filtering on an absent column returns no chunks."""
+        from app.services.vector_store import VectorStore
+        
+        store = VectorStore()
+        chunks, embeddings = _random_chunks(10)
+        await store.create_index("doc_plain", chunks, embeddings)
+        
+        assert await store.search("doc_plain", embeddings[0], filters={"page": (1, 2)}) == []
+        
+        results = await store.search_lexical("doc_plain", "chunk", top_k=10, filters={"index": (None, 2)})
+        assert sorted(r["index"] for r in results) == [0, 1, 2]
+    
+    @pytest.mark.asyncio
+    async def test_time_window_matches_chunks_spanning_segments(self, faiss_index_dir):
+        """Test that a chunk covers the times of every segment it overlaps."""
+        from app.services.pdf_processor import PDFProcessor
+        from app.services.transcription import TranscriptionService
+        from app.services.vector_store import VectorStore
+        
+        segments = [
+            {"start": 10.0 * i, "end": 10.0 * i + 10, "text": f"Segment number {i} of the recording."}
+            for i in range(12)
+        ]
+        text = " " + " ".join(segment["text"] for segment in segments)
+        chunks = PDFProcessor().chunk_text(text, chunk_size=90, overlap=20)
+        TranscriptionService().assign_times(chunks, text, segments)
+        
+        assert all("start_time" in chunk for chunk in chunks)
+        spanning = chunks[1]
+        assert spanning["end_time"] - spanning["start_time"] > 10
+        
+        store = VectorStore()
+        embeddings = _random_embeddings(len(chunks), seed=0)
+        await store.create_index("doc_audio", chunks, embeddings)
+        
+        # A window inside the chunk's later segment still finds the chunk.
+        window = (spanning["end_time"] - 5, spanning["end_time"] - 1)
+        results = await store.search("doc_audio", embeddings[0], top_k=len(chunks), filters={"time": window})
+        assert spanning["index"] in {r["index"] for r in results}
+        assert all(r["start_time"] <= window[1] and r["end_time"] >= window[0] for r in results)
+    
+    @pytest.mark.asyncio
+    async def test_chunk_range_matches_short_document(self, faiss_index_dir):
+        """Test that a document chunked into a single piece is chunk 0."""
+        from app.services.pdf_processor import PDFProcessor
+        from app.services.vector_store import VectorStore
+        
+        chunks = PDFProcessor().chunk_text("A short note.", chunk_size=1000)
+        embeddings = _random_embeddings(len(chunks), seed=0)
+        
+        store = VectorStore()
+        await store.create_index("doc_short", chunks, embeddings)
+        
+        results = await store.search("doc_short", embeddings[0], filters={"index": (0, 0)})
+        assert [r["text"] for r in results] == ["A short note."]
+        assert await store.search("doc_short", embeddings[0], filters={"index": (1, None)}) == []
+    
+    def test_unknown_filter_is_rejected(self):
+        """Test that unsupported filter names raise."""
+        from app.services.chunk_store import ChunkSegments
+        
+        with pytest.raises(ValueError):
+            ChunkSegments([]).matching({"color": (1, 2)})
+
+
+class TestUserLayout:
+    """Tests for the per-user consolidated index layout."""
+    
+    @pytest.mark.asyncio
+    async def test_documents_share_one_shard(self, faiss_index_dir, monkeypatch):
+        """Test that a user's documents live in one index and stay separable."""
+        from app.services import vector_store as vector_store_module
+        from app.services.vector_store import VectorStore
+        
+        monkeypatch.setattr(vector_store_module.settings, "VECTOR_STORE_LAYOUT", "user")
+        
+        store = VectorStore()
+        chunks_a, embeddings_a = _random_chunks(6)
+        chunks_b, embeddings_b = _random_chunks(4)
+        await store.create_index("doc_a", chunks_a, embeddings_a, user_id="u1")
+        await store.create_index("doc_b", chunks_b, embeddings_b, user_id="u1")
+        
+        assert not list(faiss_index_dir.glob("doc_*"))
+        assert store.specs["user_u1"]["documents"] == {"doc_a": 0, "doc_b": 1}
+        
+        reloaded = VectorStore()
+        results = await reloaded.search("doc_b", embeddings_a[0], top_k=10, user_id="u1")
+        assert len(results) == 4
+        assert all(result["doc_ordinal"] == 1 for result in results)
+        
+        lexical = await reloaded.search_lexical("doc_a", "chunk", top_k=10, user_id="u1")
+        assert len(lexical) == 6
+    
+    @pytest.mark.asyncio
+    async def test_deleted_document_is_tombstoned_and_compacted(self, faiss_index_dir, monkeypatch):
+        """Test that deleting a document removes it from its user's shard."""
+        from app.services import vector_store as vector_store_module
+        from app.services.vector_store import VectorStore
+        
+        monkeypatch.setattr(vector_store_module.settings, "VECTOR_STORE_LAYOUT", "user")
+        
+        store = VectorStore()
+        chunks, embeddings = _random_chunks(5)
+        await store.create_index("doc_keep", chunks, embeddings, user_id="u2")
+        await store.create_index("doc_drop", chunks, embeddings, user_id="u2")
+        
+        await store.delete_index("doc_drop", user_id="u2")
+        
+        assert await store.search("doc_drop", embeddings[0], user_id="u2") == []
+        assert len(await store.search("doc_keep", embeddings[0], top_k=10, user_id="u2")) == 5
+        
+        await store.compact("user_u2")
+        assert len(store.documents["user_u2"]) == 5
+        assert store.specs["user_u2"]["documents"] == {"doc_keep": 0}
+    
+    @pytest.mark.asyncio
+    async def test_reindexing_replaces_previous_chunks(self, faiss_index_dir, monkeypatch):
+        """Test that indexing a document again replaces its chunks."""
+        from app.services import vector_store as vector_store_module
+        from app.services.vector_store import VectorStore
+        
+        monkeypatch.setattr(vector_store_module.settings, "VECTOR_STORE_LAYOUT", "user")
+        
+        store = VectorStore()
+        await store.create_index("doc_re", *_random_chunks(5), user_id="u3")
+        chunks, embeddings = _random_chunks(3)
+        await store.create_index("doc_re", chunks, embeddings, user_id="u3")
+        
+        results = await store.search("doc_re", embeddings[0], top_k=10, user_id="u3")
+        assert len(results) == 3
+        
+        # Compaction ran before the write returned, inside the temp directory.
+        assert store._compactions == {}
+        assert (faiss_index_dir / "user_u3.g1.index").exists()
+    
+    def test_concurrent_uploads_on_separate_loops(self, faiss_index_dir, monkeypatch):
+        """Test that uploads running on their own loops in threads both land."""
+        import asyncio
+        import threading
+        from app.services import vector_store as vector_store_module
+        from app.services.vector_store import VectorStore
+        
+        monkeypatch.setattr(vector_store_module.settings, "VECTOR_STORE_LAYOUT", "user")
+        
+        store = VectorStore()
+        documents = {f"doc_t{i}": _random_chunks(4, seed=i) for i in range(2)}
+        barrier = threading.Barrier(len(documents))
+        errors = []
+        
+        # Mirrors process_document_sync: asyncio.run in a threadpool thread.
+        def upload(document_id):
+            barrier.wait()
+            try:
+                asyncio.run(store.create_index(document_id, *documents[document_id], user_id="u1"))
+            except Exception as e:
+                errors.append(e)
+        
+        threads = [threading.Thread(target=upload, args=(document_id,)) for document_id in documents]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=10)
+        
+        assert not any(thread.is_alive() for thread in threads)
+        assert errors == []
+        
+        async def search_all():
+            reloaded = VectorStore()
+            return [
+                await reloaded.search(document_id, embeddings[0], top_k=10, user_id="u1")
+                for document_id, (_, embeddings) in documents.items()
+            ]
+        
+        assert [len(results) for results in asyncio.run(search_all())] == [4, 4]
+    
+    def test_compaction_runs_on_the_app_loop(self, faiss_index_dir, monkeypatch):
+        """Test that compactions triggered by uploads finish and lose nothing."""
+        import asyncio
+        import threading
+        from concurrent.futures import ThreadPoolExecutor
+        from app.services import vector_store as vector_store_module
+        from app.services.vector_store import VectorStore
+        
+        monkeypatch.setattr(vector_store_module.settings, "VECTOR_STORE_LAYOUT", "user")
+        monkeypatch.setattr(vector_store_module.settings, "VECTOR_STORE_COMPACT_MAX_DELTAS", 3)
+        
+        app_loop = asyncio.new_event_loop()
+        threading.Thread(target=app_loop.run_forever, daemon=True).start()
+        store = VectorStore()
+        store.loop = app_loop
+        
+        documents = [_random_chunks(3, seed=i) for i in range(14)]
+        try:
+            with ThreadPoolExecutor(max_workers=1) as uploads:
+                for i, (chunks, embeddings) in enumerate(documents):
+                    uploads.submit(
+                        asyncio.run,
+                        store.create_index(f"doc_{i}", chunks, embeddings, user_id="u1")
+                    ).result(timeout=10)
+            asyncio.run_coroutine_threadsafe(store.close(), app_loop).result(timeout=10)
+        finally:
+            app_loop.call_soon_threadsafe(app_loop.stop)
+        
+        assert not list(faiss_index_dir.glob("*.tmp"))
+        
+        async def search_all():
+            reloaded = VectorStore()
+            return [
+                await reloaded.search(f"doc_{i}", embeddings[0], top_k=10, user_id="u1")
+                for i, (_, embeddings) in enumerate(documents)
+            ]
+        
+        assert [len(results) for results in asyncio.run(search_all())] == [3] * 14